@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+@file    aggregate.py
+@author  Nicole Ronald
+@date    2014-03-17
+@version
+
+Aggregates the results of many runs per scenario and config: the mean and
+percentiles of wait time, excess time, trips/VKT and the shared and
+deadhead proportions over all people or vehicles, and a confidence interval
+of the mean over runs. Runs are read from their *-results.npz files
+(drt.py --output-format npz), or from their CSV outputs.
+
+python aggregate.py [options] <folder> [<folder> ...]
+
+SUMOoD (SUMO on Demand); see http://imod-au.info/sumood
+Copyright (C) 2014 iMoD
+SUMO, Simulation of Urban MObility; see http://sumo.sourceforge.net/
+Copyright (C) 2008-2012 DLR (http://www.dlr.de/) and contributors
+All rights reserved
+"""
+
+
+import os, re, csv
+from optparse import OptionParser
+import numpy
+from resultArrays import loadRun, RESULTS_SUFFIX, SUFFIXES
+
+RUN_FILE = re.compile(r"^(.+)-(\d+[A-Za-z]+)-(\d+)(%s|%s)$" %
+                      (re.escape(RESULTS_SUFFIX),
+                       re.escape(SUFFIXES["summary"])))
+# (name, table, column); values that are NaN, such as the wait time of
+# people never picked up, are left out
+METRICS = [("waitTime", "person", "waitTime"),
+           ("excessTime", "person", "excessTime"),
+           ("tripsPerVKT", "vehicle", "trips/VKT"),
+           ("sharedProp", "vehicle", "sharedProp"),
+           ("deadheadProp", "vehicle", "deadheadProp")]
+PERCENTILES = [50, 90, 95]
+COLUMNS = ["runs", "count", "mean", "std"] + \
+          ["p%d" % p for p in PERCENTILES] + ["runMean", "ciLow", "ciHigh"]
+# two-sided 95% quantiles of Student's t by degrees of freedom, the normal
+# quantile beyond
+T95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262,
+       2.228, 2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093,
+       2.086, 2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045,
+       2.042]
+Z95 = 1.960
+
+
+def findRuns(folders):
+    """ return the output prefix of each run under folders, by scenario and
+    config
+    (string[]) -> {(string, string): string[]}"""
+    groups = {}
+    prefixes = set()
+    for folder in folders:
+        for (path, dirs, files) in os.walk(folder):
+            for filename in sorted(files):
+                match = RUN_FILE.match(filename)
+                if match == None:
+                    continue
+                prefix = os.path.join(path, filename[:-len(match.group(4))])
+                if prefix in prefixes:
+                    continue
+                prefixes.add(prefix)
+                groups.setdefault((match.group(1), match.group(2)),
+                                  []).append(prefix)
+    return groups
+
+
+def getT95(runs):
+    """ return the t quantile of a 95% interval over a number of runs
+    (int) -> float"""
+    if runs - 1 <= len(T95):
+        return T95[runs - 2]
+    return Z95
+
+
+def summarize(values):
+    """ return the pooled statistics of a metric and the interval of its
+    mean over runs, given its values per run
+    (numpy.ndarray[]) -> dict"""
+    values = [v[~numpy.isnan(v)] for v in values]
+    pooled = numpy.concatenate(values + [numpy.zeros(0)])
+    runMeans = numpy.array([v.mean() for v in values if len(v) > 0])
+    stats = {"runs": len(runMeans), "count": len(pooled)}
+    if len(pooled) == 0:
+        return stats
+    stats["mean"] = pooled.mean()
+    stats["std"] = pooled.std(ddof=1) if len(pooled) > 1 else 0.0
+    for (p, value) in zip(PERCENTILES, numpy.percentile(pooled,
+                                                        PERCENTILES)):
+        stats["p%d" % p] = value
+    stats["runMean"] = runMeans.mean()
+    if len(runMeans) > 1:
+        half = getT95(len(runMeans)) * runMeans.std(ddof=1) / \
+               numpy.sqrt(len(runMeans))
+        stats["ciLow"] = stats["runMean"] - half
+        stats["ciHigh"] = stats["runMean"] + half
+    return stats
+
+
+def aggregate(groups):
+    """ return rows of statistics per scenario, config and metric
+    ({(string, string): string[]}) -> list[]"""
+    rows = []
+    for (scenario, config) in sorted(groups):
+        runs = [loadRun(prefix) for prefix in sorted(groups[(scenario,
+                                                              config)])]
+        runs = [run for run in runs if run != None]
+        for (name, table, column) in METRICS:
+            stats = summarize([run[table][column] for run in runs])
+            rows.append([scenario, config, name] +
+                        [stats.get(c, "") for c in COLUMNS])
+    return rows
+
+
+if __name__ == "__main__":
+
+    parser = OptionParser(usage="%prog [options] <folder> [<folder> ...]")
+    parser.add_option("--output", default="./output/aggregate.csv",
+                      help="statistics file [default: %default]")
+    (options, args) = parser.parse_args()
+    if len(args) == 0:
+        parser.error("result folder required")
+
+    groups = findRuns(args)
+    rows = aggregate(groups)
+    with open(options.output, 'wb') as csvfile:
+        writer = csv.writer(csvfile, delimiter=',')
+        writer.writerow(["scenario", "config", "metric"] + COLUMNS)
+        writer.writerows(rows)
+    for row in rows:
+        stats = dict(zip(COLUMNS, row[3:]))
+        if stats["count"] == 0:
+            continue
+        print "%-4s %-4s %-13s mean %9.3f  p50 %9.3f  p95 %9.3f  " \
+              "runs %2d  95%% CI %s" % \
+              (row[0], row[1], row[2], stats["mean"], stats["p50"],
+               stats["p95"], stats["runs"],
+               "[%.3f, %.3f]" % (stats["ciLow"], stats["ciHigh"])
+               if stats["ciLow"] != "" else "-")
+    print "%d runs in %d groups, statistics written to %s" % \
+          (sum(len(p) for p in groups.itervalues()), len(groups),
+           options.output)
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+@file    batch.py
+@author  Nicole Ronald
+@date    2014-03-17
+@version
+
+Runs a grid of experiments (scenario, config, run) on all cores. Each run
+gets its own TraCI port, SUMO configuration and output folder; runs whose
+results exist are skipped, and the vehicle summaries are collected into
+one file.
+
+python batch.py [options]
+
+SUMOoD (SUMO on Demand); see http://imod-au.info/sumood
+Copyright (C) 2014 iMoD
+SUMO, Simulation of Urban MObility; see http://sumo.sourceforge.net/
+Copyright (C) 2008-2012 DLR (http://www.dlr.de/) and contributors
+All rights reserved
+"""
+
+
+import subprocess, sys, os, re, csv, time
+import multiprocessing
+from optparse import OptionParser
+from resultArrays import loadRun, COLUMNS, RESULTS_SUFFIX
+
+REQUEST_ROOT = "SampleInput/Requests"
+SUMO_FOLDER = "SampleInput/SUMO"
+OUTPUT_ROOT = "./output/batch"
+BASE_PORT = 8813
+# street network of each scenario, see SampleInput/SUMO/notes.md
+NETWORKS = {"1a": "grid-t.net.xml", "1b": "grid-t.net.xml",
+            "1c": "grid-t.net.xml", "2": "grid2-t.net.xml"}
+ROUTES = "taxi%d.rou.xml" # % number of vehicles
+REQUEST_FILE = re.compile(r"^sumo-(.+)-(\d+)([A-Za-z]+)-(\d+)-people\.csv$")
+SUMOCFG = """<configuration>
+    <input>
+        <net-file value="%s"/>
+        <route-files value="%s"/>
+    </input>
+    <time>
+        <begin value="0"/>
+        <end value="3660"/>
+    </time>
+    <traci_server>
+        <remote-port value="%d"/>
+    </traci_server>
+</configuration>
+"""
+
+
+class Job:
+    """ one run of the dispatcher against its own SUMO instance """
+
+    def __init__(self, scenario, vehicles, demand, run, port):
+        self.scenario = scenario
+        self.vehicles = vehicles
+        self.demand = demand
+        self.run = run
+        self.port = port
+        self.config = "%d%s" % (vehicles, demand)
+        self.runId = "%s-%s-%02d" % (scenario, self.config, run)
+        self.folder = os.path.join(OUTPUT_ROOT, self.runId, "")
+        self.meso = False # run on the stand-in instead of SUMO
+        self.outputFormat = "csv" # see drt.py --output-format
+        self.fast = False # see drt.py --fast
+
+    def getSummaryFile(self):
+        """ return the vehicle summary written at the end of the run, or
+        the results file holding it
+        () -> string"""
+        if self.outputFormat == "npz":
+            return self.folder + self.runId + RESULTS_SUFFIX
+        return self.folder + self.runId + "-vehicle-summary.out.csv"
+
+    def getSummaryRows(self):
+        """ return the header and rows of the vehicle summary of the run
+        () -> list[]"""
+        if self.outputFormat == "npz":
+            summary = loadRun(self.folder + self.runId)["summary"]
+            names = [name for (name, kind) in COLUMNS["summary"]]
+            return [names] + [list(row) for row in
+                              zip(*[summary[name] for name in names])]
+        with open(self.getSummaryFile(), 'rb') as summaryFile:
+            return list(csv.reader(summaryFile, delimiter=','))
+
+    def isDone(self):
+        """ return whether the run's results exist
+        () -> bool"""
+        return os.path.exists(self.getSummaryFile())
+
+    def writeConfig(self):
+        """ write the SUMO configuration for the run, return its name
+        () -> string"""
+        sumoFolder = os.path.abspath(SUMO_FOLDER)
+        filename = self.folder + "grid.sumocfg"
+        with open(filename, 'w') as cfg:
+            cfg.write(SUMOCFG % (
+                os.path.join(sumoFolder, NETWORKS[self.scenario]),
+                os.path.join(sumoFolder, ROUTES % self.vehicles),
+                self.port))
+        return filename
+
+    def getCommand(self, sumoConfig):
+        """ return the dispatcher command line for the run
+        (string) -> string[]"""
+        command = [sys.executable, "drt.py", "--scenario", self.scenario,
+                   "--port", str(self.port), "--sumo-config", sumoConfig,
+                   "--output", self.folder, self.config, str(self.run)]
+        if self.meso:
+            command.append("--meso")
+        if self.outputFormat != "csv":
+            command += ["--output-format", self.outputFormat]
+        if self.fast:
+            command.append("--fast")
+        return command
+
+
+def findJobs(scenarios=None, configs=None, runs=None):
+    """ return a job for each request file matching the selected scenarios,
+    configs and runs (None selects all), with a port each
+    (string[], string[], int[]) -> Job[]"""
+    jobs = []
+    for scenario in sorted(os.listdir(REQUEST_ROOT)):
+        folder = os.path.join(REQUEST_ROOT, scenario)
+        if not os.path.isdir(folder) or scenario not in NETWORKS or \
+           (scenarios != None and scenario not in scenarios):
+            continue
+        for filename in sorted(os.listdir(folder)):
+            match = REQUEST_FILE.match(filename)
+            if match == None or match.group(1) != scenario:
+                continue
+            vehicles = int(match.group(2))
+            demand = match.group(3)
+            run = int(match.group(4))
+            if (configs != None and "%d%s" % (vehicles, demand) not in configs)\
+               or (runs != None and run not in runs):
+                continue
+            jobs.append(Job(scenario, vehicles, demand, run,
+                            BASE_PORT + len(jobs)))
+    return jobs
+
+
+def runJob(job):
+    """ run a job, with output to a log in its folder; return (runId,
+    exit code, seconds taken)
+    (Job) -> (string, int, float)"""
+    start = time.time()
+    if not os.path.isdir(job.folder):
+        os.makedirs(job.folder)
+    sumoConfig = job.writeConfig()
+    with open(job.folder + "run.log", 'w') as log:
+        code = subprocess.call(job.getCommand(sumoConfig), stdout=log,
+                               stderr=subprocess.STDOUT)
+    return (job.runId, code, time.time() - start)
+
+
+def collectSummaries(jobs, filename):
+    """ write the vehicle summaries of all finished jobs to one file
+    (Job[], string)"""
+    with open(filename, 'wb') as csvfile:
+        writer = csv.writer(csvfile, delimiter=',')
+        header = None
+        for job in jobs:
+            if not job.isDone():
+                continue
+            rows = job.getSummaryRows()
+            if header == None:
+                header = rows[0]
+                writer.writerow(["runId", "scenario", "config", "run"] +
+                                header)
+            for row in rows[1:]:
+                writer.writerow([job.runId, job.scenario, job.config,
+                                 job.run] + row)
+
+
+def runBatch(jobs, processes):
+    """ run all jobs that have no results yet, reporting progress
+    (Job[], int) -> int"""
+    pending = [job for job in jobs if not job.isDone()]
+    print "%d runs, %d done, %d to run on %d processes" % \
+          (len(jobs), len(jobs) - len(pending), len(pending), processes)
+    failed = 0
+    if len(pending) > 0:
+        pool = multiprocessing.Pool(processes)
+        done = 0
+        for (runId, code, seconds) in pool.imap_unordered(runJob, pending):
+            done += 1
+            if code != 0:
+                failed += 1
+            print "[%d/%d] %s %s in %.1fs" % \
+                  (done, len(pending), runId,
+                   "ok" if code == 0 else "failed (%d)" % code, seconds)
+            sys.stdout.flush()
+        pool.close()
+        pool.join()
+    return failed
+
+
+if __name__ == "__main__":
+
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option("--scenarios", help="comma-separated scenarios "
+                      "[default: all]")
+    parser.add_option("--configs", help="comma-separated configs, e.g. 3S,10L "
+                      "[default: all]")
+    parser.add_option("--runs", help="comma-separated runs [default: all]")
+    parser.add_option("-j", "--processes", type="int",
+                      default=multiprocessing.cpu_count(),
+                      help="runs at once [default: %default]")
+    parser.add_option("--summary", default=os.path.join(OUTPUT_ROOT,
+                                                        "summary.csv"),
+                      help="collected vehicle summaries [default: %default]")
+    parser.add_option("--meso", action="store_true", default=False,
+                      help="simulate with the mesoscopic stand-in, "
+                      "without SUMO")
+    parser.add_option("--output-format", dest="outputFormat",
+                      choices=["csv", "npz"], default="csv",
+                      help="output of the runs, see drt.py "
+                      "[default: %default]")
+    parser.add_option("--fast", action="store_true", default=False,
+                      help="run with the faster modes, see drt.py")
+    (options, args) = parser.parse_args()
+
+    def split(value):
+        if value == None:
+            return None
+        return value.split(",")
+
+    runs = split(options.runs)
+    if runs != None:
+        runs = [int(r) for r in runs]
+    jobs = findJobs(split(options.scenarios), split(options.configs), runs)
+    for job in jobs:
+        job.meso = options.meso
+        job.outputFormat = options.outputFormat
+        job.fast = options.fast
+    failed = runBatch(jobs, options.processes)
+    collectSummaries(jobs, options.summary)
+    print "Summaries written to", options.summary
+    if failed > 0:
+        print failed, "runs failed, see run.log in their folders"
+        sys.exit(1)
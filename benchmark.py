@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""
+@file    benchmark.py
+@author  Nicole Ronald
+@date    2014-03-17
+@version
+
+Measures dispatcher throughput on synthetic demand: for each case (network,
+vehicles, requests) a request file and fleet are generated, the dispatcher
+runs on the mesoscopic stand-in, and requests dispatched per second, step
+latency percentiles and peak memory are saved as JSON, optionally compared
+with the results of an earlier version.
+
+python benchmark.py [options]
+
+SUMOoD (SUMO on Demand); see http://imod-au.info/sumood
+Copyright (C) 2014 iMoD
+SUMO, Simulation of Urban MObility; see http://sumo.sourceforge.net/
+Copyright (C) 2008-2012 DLR (http://www.dlr.de/) and contributors
+All rights reserved
+"""
+
+
+import subprocess, sys, os, time, json, resource
+import multiprocessing
+from optparse import OptionParser
+
+# the stand-in is simulated in process, so SUMO does not add to the timings
+import mesoTraci
+mesoTraci.install()
+import drt
+from requestGenerator import RequestGenerator
+from person import PersonState
+from vehicleCollection import vehicleCollection
+
+SUMO_FOLDER = "SampleInput/SUMO"
+OUTPUT_ROOT = "./output/benchmark"
+NETWORKS = {"grid": "grid-t.net.xml", "grid2": "grid2-t.net.xml"}
+# (vehicles, requests) per case
+PRESETS = {"samples": [(3, 20), (5, 40), (10, 60)],
+           "scale": [(10, 500), (50, 2500), (100, 5000), (200, 10000),
+                     (500, 25000)]}
+PERCENTILES = [50, 90, 99]
+END = 3660
+SUMOCFG = """<configuration>
+    <input>
+        <net-file value="%s"/>
+        <route-files value="%s"/>
+    </input>
+    <time>
+        <begin value="0"/>
+        <end value="%d"/>
+    </time>
+</configuration>
+"""
+ROUTES_HEADER = """<routes>
+    <vType id="taxi" accel="0.8" decel="4.5" sigma="0.5" length="5"
+maxSpeed="70" color="1,0,0"/>
+"""
+ROUTES_VEHICLE = """    <vehicle id="taxi%d" depart="60.00" type="taxi">
+        <route edges="out"/>
+    </vehicle>
+"""
+
+
+def percentiles(values, ps=PERCENTILES):
+    """ return nearest-rank percentiles of values, with the maximum, in
+    milliseconds, keyed p50, p90, ... and max
+    (float[], int[]) -> {string: float}"""
+    result = {}
+    if len(values) == 0:
+        return result
+    values = sorted(values)
+    for p in ps:
+        rank = max(0, int(round(p / 100.0 * len(values))) - 1)
+        result["p%d" % p] = values[rank] * 1000
+    result["max"] = values[-1] * 1000
+    return result
+
+
+class Timer:
+    """ wraps a function, recording the duration of each call """
+
+    def __init__(self, function):
+        self.function = function
+        self.durations = []
+
+    def __call__(self, *args):
+        start = time.time()
+        result = self.function(*args)
+        self.durations.append(time.time() - start)
+        return result
+
+    def getTotal(self):
+        return sum(self.durations)
+
+
+class Case:
+    """ one benchmark run: a generated fleet and demand on a network """
+
+    def __init__(self, network, vehicles, requests, seed):
+        self.network = network
+        self.vehicles = vehicles
+        self.requests = requests
+        self.seed = seed
+        self.caseId = "%s-%dv-%dr" % (network, vehicles, requests)
+        self.folder = os.path.join(OUTPUT_ROOT, self.caseId, "")
+
+    def writeInput(self):
+        """ write the request file, routes and SUMO configuration of the
+        case, return the configuration's name
+        () -> string"""
+        if not os.path.isdir(self.folder):
+            os.makedirs(self.folder)
+        netFile = os.path.abspath(os.path.join(SUMO_FOLDER,
+                                               NETWORKS[self.network]))
+        generator = RequestGenerator(netFile, self.seed)
+        generator.write(self.folder + "sumo-%s-people.csv" % self.caseId,
+                        self.requests)
+        with open(self.folder + "taxi.rou.xml", 'w') as routes:
+            routes.write(ROUTES_HEADER)
+            for i in range(1, self.vehicles + 1):
+                routes.write(ROUTES_VEHICLE % i)
+            routes.write("</routes>\n")
+        filename = self.folder + "bench.sumocfg"
+        with open(filename, 'w') as cfg:
+            cfg.write(SUMOCFG % (netFile, "taxi.rou.xml", END))
+        return filename
+
+
+def runCase(case):
+    """ run a case with its calls timed, return its results
+    (Case) -> dict"""
+    sumoConfig = case.writeInput()
+    drt.SUMO_CONFIG = sumoConfig
+    drt.REQUEST_FOLDER = case.folder
+    drt.OUTPUT_FOLDER = case.folder
+    drt.LOG_LEVEL = "warning"
+    steps = Timer(drt.doStep)
+    drt.doStep = steps
+    dispatches = Timer(vehicleCollection.addBookingToOptimumItinerary)
+    vehicleCollection.addBookingToOptimumItinerary = dispatches
+    updates = Timer(vehicleCollection.update)
+    vehicleCollection.update = updates
+
+    stdout = sys.stdout
+    start = time.time()
+    with open(case.folder + "run.log", 'w') as log:
+        sys.stdout = log
+        try:
+            drt.run(case.caseId)
+        finally:
+            sys.stdout = stdout
+    wall = time.time() - start
+
+    people = drt.peopleCollection.getList()
+    rejected = len([p for p in people
+                    if p.state == PersonState.UNSUCCESSFUL])
+    dispatchTime = dispatches.getTotal()
+    return {"case": case.caseId, "network": case.network,
+            "vehicles": case.vehicles, "requests": case.requests,
+            "seed": case.seed, "rejected": rejected,
+            "dispatchSeconds": dispatchTime,
+            "requestsPerSecond": len(dispatches.durations) / dispatchTime
+                                 if dispatchTime > 0 else None,
+            "dispatchLatencyMs": percentiles(dispatches.durations),
+            "steps": len(steps.durations),
+            "stepLatencyMs": percentiles(steps.durations),
+            "updateSeconds": updates.getTotal(),
+            "vehicleUpdates": vehicleCollection.scheduler.updated,
+            "wallSeconds": wall,
+            # kilobytes on Linux
+            "peakMemoryMB": resource.getrusage(
+                resource.RUSAGE_SELF).ru_maxrss / 1024.0}
+
+
+def runIsolated(case):
+    """ run a case in a fresh process, so that state and peak memory are
+    its own
+    (Case) -> dict"""
+    pool = multiprocessing.Pool(1)
+    try:
+        return pool.apply(runCase, (case,))
+    finally:
+        pool.close()
+        pool.join()
+
+
+def getVersion():
+    """ return the commit of the working copy, None outside git
+    () -> string"""
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short",
+                                        "HEAD"]).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    """ print the throughput and tail latency of results relative to
+    earlier results, for the cases in both
+    (dict, dict)"""
+    old = dict((c["case"], c) for c in baseline["cases"])
+    print "Compared with %s:" % baseline.get("version")
+    for c in results["cases"]:
+        if c["case"] not in old:
+            continue
+        o = old[c["case"]]
+        if c["requestsPerSecond"] and o["requestsPerSecond"]:
+            speedup = c["requestsPerSecond"] / o["requestsPerSecond"]
+        else:
+            speedup = float("nan")
+        print "  %-20s %6.2fx requests/s, step p99 %.2f -> %.2f ms, " \
+              "memory %.0f -> %.0f MB" % \
+              (c["case"], speedup, o["stepLatencyMs"].get("p99", 0),
+               c["stepLatencyMs"].get("p99", 0), o["peakMemoryMB"],
+               c["peakMemoryMB"])
+
+
+if __name__ == "__main__":
+
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option("--networks", default="grid,grid2",
+                      help="comma-separated networks [default: %default]")
+    parser.add_option("--preset", default="samples",
+                      help="cases, one of %s [default: %%default]" %
+                      ", ".join(sorted(PRESETS)))
+    parser.add_option("--cases", help="comma-separated vehicles:requests, "
+                      "e.g. 100:5000, instead of a preset")
+    parser.add_option("--seed", type="int", default=1,
+                      help="random seed of the demand [default: %default]")
+    parser.add_option("--output", default=os.path.join(OUTPUT_ROOT,
+                                                       "results.json"),
+                      help="results file [default: %default]")
+    parser.add_option("--compare", help="results of an earlier version")
+    parser.add_option("--window", type="int", default=drt.REQUEST_WINDOW,
+                      help="stream requests with this window, see drt.py "
+                      "[default: %default]")
+    parser.add_option("--fast", action="store_true", default=False,
+                      help="run with the faster modes, see drt.py")
+    (options, args) = parser.parse_args()
+    drt.REQUEST_WINDOW = options.window
+    if options.fast:
+        for name in drt.FAST_MODES:
+            setattr(drt, name, True)
+
+    if options.cases != None:
+        sizes = [tuple(int(n) for n in c.split(":"))
+                 for c in options.cases.split(",")]
+    elif options.preset in PRESETS:
+        sizes = PRESETS[options.preset]
+    else:
+        parser.error("unknown preset %s" % options.preset)
+    cases = [Case(network, vehicles, requests, options.seed)
+             for network in options.networks.split(",")
+             for (vehicles, requests) in sizes]
+
+    flags = dict((name, getattr(drt, name)) for name in
+                 ["MATRIX", "CACHE_SIZE", "VECTORIZED", "WORKERS", "PRUNE",
+                  "ODOMETER", "BATCHED", "EVENT_DRIVEN", "SELECTIVE",
+                  "REQUEST_WINDOW"])
+    results = {"version": getVersion(), "python": sys.version.split()[0],
+               "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+               "flags": flags, "cases": []}
+    for case in cases:
+        result = runIsolated(case)
+        results["cases"].append(result)
+        print "%-20s %8.1f requests/s, step p50/p99 %.2f/%.2f ms, " \
+              "%.0f MB, %.1fs" % \
+              (case.caseId, result["requestsPerSecond"] or 0,
+               result["stepLatencyMs"].get("p50", 0),
+               result["stepLatencyMs"].get("p99", 0),
+               result["peakMemoryMB"], result["wallSeconds"])
+        sys.stdout.flush()
+
+    folder = os.path.dirname(options.output)
+    if folder != "" and not os.path.isdir(folder):
+        os.makedirs(folder)
+    with open(options.output, 'w') as out:
+        json.dump(results, out, indent=2, sort_keys=True)
+    print "Results written to", options.output
+    if options.compare != None:
+        with open(options.compare) as baselineFile:
+            compare(results, json.load(baselineFile))
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+@file    commandBuffer.py
+@author  Nicole Ronald
+@date    2014-03-17
+@version
+
+Defines a buffer of vehicle control commands, sent to SUMO one by one or,
+when batching, as one TraCI message before the next simulation step.
+
+SUMOoD (SUMO on Demand); see http://imod-au.info/sumood
+Copyright (C) 2014 iMoD
+SUMO, Simulation of Urban MObility; see http://sumo.sourceforge.net/
+Copyright (C) 2008-2012 DLR (http://www.dlr.de/) and contributors
+All rights reserved
+"""
+
+
+import subprocess, random, sys, os, struct
+SUMO_HOME = os.path.realpath(
+    os.environ.get("SUMO_HOME",
+                   os.path.join(os.path.dirname(__file__),
+                                "..", "..", "..", "..")))
+sys.path.append(os.path.join(SUMO_HOME, "tools"))
+
+import traci
+import traci.constants as tc
+
+CHANGETARGET = 0
+SETSTOP = 1
+COMMAND_NAMES = ["changeTarget", "setStop"] # by kind
+# private parts of the traci module that batching builds messages with and
+# sends them through
+MESSAGE_ACCESS = ["_beginMessage", "_message", "_socket", "_recvExact"]
+
+
+def canBatch():
+    """ return whether the traci module gives the message access needed to
+    batch commands, which older and other implementations lack
+    () -> bool"""
+    return all(hasattr(traci, name) for name in MESSAGE_ACCESS) and \
+           hasattr(traci._message, "string") and \
+           hasattr(traci._message, "queue")
+
+
+class CommandError(Exception):
+    """ commands that SUMO rejected, as (vehicleID, command, message) """
+
+    def __init__(self, errors):
+        Exception.__init__(self, "; ".join(
+            ["%s %s: %s" % (v, c, m) for (v, c, m) in errors]))
+        self.errors = errors
+
+
+class CommandBuffer:
+    """ queues changeTarget/setStop commands in the order they are issued,
+    which keeps the order per vehicle, and sends them together """
+
+    def __init__(self):
+        self.commands = [] # (vehicleID, kind, args)
+        self.batched = False # True sends the commands of a step together
+        self.messages = 0
+        self.sent = 0
+
+    def reset(self):
+        """ drop queued commands and statistics, before another run """
+        self.commands = []
+        self.messages = 0
+        self.sent = 0
+
+    def changeTarget(self, vehicleID, link):
+        """ queue a change of target
+        (string, string)"""
+        self.add(vehicleID, CHANGETARGET, (link,))
+
+    def setStop(self, vehicleID, link, pos, laneIndex, duration):
+        """ queue setting (or lifting, with duration 0) a stop
+        (string, string, float, int, int)"""
+        self.add(vehicleID, SETSTOP, (link, pos, laneIndex, duration))
+
+    def add(self, vehicleID, kind, args):
+        """ queue a command, or send it if not batching
+        (string, int, tuple)"""
+        self.commands.append((vehicleID, kind, args))
+        if not self.batched:
+            self.flush()
+
+    def flush(self):
+        """ send all queued commands, in one message if batching; if SUMO
+        rejects any, raise CommandError without resending, as SUMO has
+        carried out the commands around the rejected one """
+        if len(self.commands) == 0:
+            return
+        commands = self.commands
+        self.commands = []
+        self.sent += len(commands)
+        if self.batched and canBatch():
+            self.sendBatch(commands)
+        else:
+            self.sendEach(commands)
+
+    def sendBatch(self, commands):
+        """ send commands in one message, as traci._sendExact does, but read
+        the status of every command, which SUMO answers in the order of the
+        message; raise CommandError naming the commands whose status is an
+        error
+        ((string, int, tuple)[])"""
+        for (vehicleID, kind, args) in commands:
+            self.append(vehicleID, kind, args)
+        self.messages += 1
+        message = traci._message
+        length = struct.pack("!i", len(message.string) + 4)
+        traci._socket.send(length + message.string)
+        message.string = ""
+        message.queue = []
+        result = traci._recvExact()
+        if not result:
+            raise traci.FatalTraCIError("connection closed by SUMO")
+        errors = []
+        for (vehicleID, kind, args) in commands:
+            (length, command, status) = result.read("!BBB")
+            description = result.readString()
+            if command != tc.CMD_SET_VEHICLE_VARIABLE:
+                raise traci.FatalTraCIError(
+                    "Received answer %s for command %s." %
+                    (command, tc.CMD_SET_VEHICLE_VARIABLE))
+            if status or description:
+                errors.append((vehicleID, COMMAND_NAMES[kind], description))
+        if len(errors) > 0:
+            raise CommandError(errors)
+
+    def append(self, vehicleID, kind, args):
+        """ append a command to the TraCI message without sending it, as
+        traci.vehicle.changeTarget and traci.vehicle.setStop do
+        (string, int, tuple)"""
+        if kind == CHANGETARGET:
+            (link,) = args
+            traci._beginMessage(tc.CMD_SET_VEHICLE_VARIABLE,
+                                tc.CMD_CHANGETARGET, vehicleID,
+                                1+4+len(link))
+            traci._message.string += struct.pack("!Bi", tc.TYPE_STRING,
+                                                 len(link)) + link
+        else:
+            (link, pos, laneIndex, duration) = args
+            traci._beginMessage(tc.CMD_SET_VEHICLE_VARIABLE, tc.CMD_STOP,
+                                vehicleID, 1+4+1+4+len(link)+1+8+1+1+1+4)
+            traci._message.string += struct.pack("!Bi", tc.TYPE_COMPOUND, 4)
+            traci._message.string += struct.pack("!Bi", tc.TYPE_STRING,
+                                                 len(link)) + link
+            traci._message.string += struct.pack("!BdBBBi", tc.TYPE_DOUBLE,
+                                                 pos, tc.TYPE_BYTE, laneIndex,
+                                                 tc.TYPE_INTEGER, duration)
+
+    def sendEach(self, commands):
+        """ send commands one by one, raise CommandError naming the vehicles
+        whose commands failed
+        ((string, int, tuple)[])"""
+        errors = []
+        for (vehicleID, kind, args) in commands:
+            self.messages += 1
+            try:
+                if kind == CHANGETARGET:
+                    traci.vehicle.changeTarget(vehicleID, *args)
+                else:
+                    traci.vehicle.setStop(vehicleID, *args)
+            except traci.TraCIException, e:
+                errors.append((vehicleID, COMMAND_NAMES[kind], str(e)))
+        if len(errors) > 0:
+            raise CommandError(errors)
+
+    def printStats(self):
+        """ print how many commands were sent in how many messages """
+        print "Control commands: %d sent in %d messages" % (self.sent,
+                                                            self.messages)
+
+commandBuffer = CommandBuffer()
@@ -18,22 +18,65 @@ All rights reserved
 
 
 import subprocess, random, sys, os
+from optparse import OptionParser
 
 
 PORT = 8813
+MATRIX = False # precompute stop-to-stop times and distances
+CACHE_SIZE = 100000 # cached network queries, 0 to disable
+VECTORIZED = False # evaluate the fleet in one NumPy pass, needs MATRIX
+WORKERS = 0 # evaluate vehicles on this many processes, implies MATRIX
+PRUNE = False # skip vehicles that cannot beat the best by a lower bound
+ODOMETER = False # charge distances from the odometer, not routing queries
+BATCHED = False # send each step's control commands in one TraCI message
+EVENT_DRIVEN = False # jump to the next step where anything can happen
+SELECTIVE = False # update only vehicles that may have reached a stop
+# EVENT_DRIVEN and SELECTIVE skip updates, so they need ODOMETER
+# modes turned on by --fast, each leaving the results as they are;
+# ODOMETER and BATCHED fall back where TraCI lacks what they need
+FAST_MODES = ["MATRIX", "VECTORIZED", "ODOMETER", "BATCHED", "EVENT_DRIVEN",
+              "SELECTIVE"]
+LOG_LEVEL = "info" # debug, info, warning or off
+LOG_MODULES = {} # level per module (vehicle, dispatch), overrides LOG_LEVEL
+TRACE = False # write events to a JSONL trace in the output folder
+PROFILE = False # time TraCI calls and step phases, see profiler.py
+REQUEST_WINDOW = 0 # requests read ahead of their call time, 0 reads all
+REQUEST_CACHE = None # folder of preprocessed requests, see requestCache.py
+STREAM_OUTPUT = False # write people and vehicles as they finish
+FLUSH_INTERVAL = 300 # steps between flushes of streamed output
+OUTPUT_FORMAT = "csv" # csv, or npz for typed columns, see resultArrays.py
+SUMO_CONFIG = "./SampleInput/SUMO/grid.sumocfg"
+SCENARIO = "1a"
+REQUEST_FOLDER = "SampleInput/Requests/%s/" # % scenario
+OUTPUT_FOLDER = "./output/sumo-output%s/" # % scenario
 SUMO_HOME = os.path.realpath(
     os.environ.get("SUMO_HOME",
                    os.path.join(os.path.dirname(__file__),
                                 "..", "..", "..", "..","..","..")))
 sys.path.append(os.path.join(SUMO_HOME, "tools"))
 
+if "--meso" in sys.argv:
+    # run on the pure-Python stand-in instead of SUMO
+    import mesoTraci
+    mesoTraci.install()
 import traci
 import traci.constants as tc
-from vehicle import Vehicle
+from vehicle import Vehicle, DEPOT_LINK, DEPOT_POS, MILLISECONDS, \
+     SUBSCRIPTION, ODOMETER_SUBSCRIPTION, VAR_DISTANCE
 from vehicleCollection import VehicleCollection, vehicleCollection
 from stop import Stop, StopType
 from person import Person
-from peopleCollection import PeopleCollection, peopleCollection
+from peopleCollection import PeopleCollection, peopleCollection, \
+     readStops, isSorted, sortRequestFile, getCachedStops
+from requestCache import requestCache
+from network import network
+from commandBuffer import CommandBuffer, commandBuffer, canBatch
+from fleetEvaluator import FleetEvaluator
+from parallelEvaluator import ParallelEvaluator
+from eventLog import EventLog, eventLog, LEVELS, INFO
+from simulationContext import Simulation
+from profiler import profiler
+from resultArrays import RunResults, RESULTS_SUFFIX, numpy
 
 try:
     from sumolib import checkBinary
@@ -44,79 +87,298 @@ NETCONVERT = checkBinary("netconvert")
 SUMO = checkBinary("sumo")
 SUMOGUI = checkBinary("sumo-gui")
 
-step=0
-persons = []
+simulation = Simulation(PORT, SUMO)
 
 def run(runId):
-    """starts simulation, reads people file, runs sim, outputs results"""
-    global peopleCollection, persons
-    traci.init(PORT)
+    """starts simulation, reads people file, runs sim, outputs results;
+    SUMO is loaded with SUMO_CONFIG, and kept running for the next run"""
+    requestFolder = os.path.join(REQUEST_FOLDER.replace("%s", SCENARIO), "")
+    outputFolder = os.path.join(OUTPUT_FOLDER.replace("%s", SCENARIO), "")
+    simulation.reset()
+    simulation.load(SUMO_CONFIG)
+    if network.cacheSize != CACHE_SIZE:
+        network.enableCache(CACHE_SIZE)
+    commandBuffer.batched = BATCHED
+    if BATCHED and not canBatch():
+        print "TraCI has no message access, sending commands one by one"
+    if ODOMETER and ODOMETER_SUBSCRIPTION == None:
+        print "TraCI has no VAR_DISTANCE, charging distances from routing " \
+              "queries"
+    # distances over skipped updates come from the odometer: one routing
+    # query over them misses detours, and drops what it cannot route
+    odometer = ODOMETER and ODOMETER_SUBSCRIPTION != None
+    if (EVENT_DRIVEN or SELECTIVE) and not odometer:
+        print "no odometer, updating every vehicle every step"
+    simulation.eventDriven = EVENT_DRIVEN and odometer
+    vehicleCollection.selective = SELECTIVE and odometer
+    vehicleCollection.prune = PRUNE
+    if PRUNE or simulation.eventDriven or vehicleCollection.selective:
+        # straight lines to pickups and stops, for bounds without routing
+        network.loadGeometry(simulation.netFile)
+    eventLog.setLevel(LEVELS[LOG_LEVEL])
+    for module, level in LOG_MODULES.iteritems():
+        eventLog.setLevel(LEVELS[level], module)
+    if TRACE:
+        eventLog.openTrace(outputFolder + '%s-trace.jsonl' % (runId))
+    if PROFILE:
+        profiler.start(outputFolder + '%s-steps.out.csv' % (runId))
+    results = None
+    if OUTPUT_FORMAT == "npz":
+        if numpy is None:
+            print "numpy not available, writing CSV output"
+        else:
+            results = RunResults()
+            peopleCollection.table = results.tables["person"]
+            vehicleCollection.table = results.tables["vehicle"]
+            vehicleCollection.summaryTable = results.tables["summary"]
+    if STREAM_OUTPUT:
+        peopleCollection.openOutput(outputFolder, runId, FLUSH_INTERVAL)
+        vehicleCollection.openOutput(outputFolder, runId, FLUSH_INTERVAL)
     print "Init"
-    traci.simulation.subscribe([tc.VAR_DEPARTED_VEHICLES_IDS,
-                                tc.VAR_ARRIVED_VEHICLES_IDS])
 
-    filename = 'SampleInput/Requests/1a/sumo-%s-people.csv' % (runId)
-    peopleCollection.readFile(filename)
-    persons = peopleCollection.getList()
-    persons.sort()
-    
+    filename = requestFolder + 'sumo-%s-people.csv' % (runId)
+    # workers take all travel times between stops from the matrix
+    matrix = MATRIX or WORKERS > 0
+    depot = Stop(-1, DEPOT_LINK, DEPOT_POS, StopType.DEPOT)
+    cached = None
+    if REQUEST_CACHE != None:
+        requestCache.folder = REQUEST_CACHE
+        cached = requestCache.load(filename, simulation.netFile)
+        if cached == None:
+            # direct metrics in one batch, from the matrix if built
+            if matrix:
+                network.buildMatrix(readStops(filename) + [depot])
+            cached = requestCache.build(filename, simulation.netFile)
+    if cached != None:
+        stops = getCachedStops(cached[1])
+    elif REQUEST_WINDOW > 0:
+        # streamed in call time order, so sorted first if need be
+        if not isSorted(filename):
+            sortedName = outputFolder + '%s-people.sorted.csv' % (runId)
+            sortRequestFile(filename, sortedName)
+            filename = sortedName
+        stops = readStops(filename)
+    else:
+        peopleCollection.readFile(filename)
+        stops = peopleCollection.getStops()
+    if matrix:
+        network.buildMatrix(stops + [depot])
+    if WORKERS > 0 and network.timeMatrix is None:
+        print "no matrix, evaluating vehicles in this process"
+    elif WORKERS > 0:
+        vehicleCollection.evaluator = ParallelEvaluator(WORKERS)
+    elif VECTORIZED:
+        vehicleCollection.evaluator = FleetEvaluator()
+    if cached != None:
+        (people, cachedStops) = cached
+        if REQUEST_WINDOW > 0:
+            simulation.requests.setSource(
+                peopleCollection.streamCache(people, cachedStops),
+                REQUEST_WINDOW)
+        else:
+            peopleCollection.readCache(people, cachedStops)
+            for p in peopleCollection.getList():
+                simulation.requests.push(p)
+    elif REQUEST_WINDOW > 0:
+        simulation.requests.setSource(peopleCollection.streamFile(filename),
+                                      REQUEST_WINDOW)
+    else:
+        for p in peopleCollection.getList():
+            simulation.requests.push(p)
+    profiler.mark("setup")
 
     while traci.simulation.getMinExpectedNumber() > 0:
         #traci.simulationStep()
-        doStep()
+        doStep(nextEventStep())
 
-    peopleCollection.output('./output/sumo-output1a/', runId)
-    vehicleCollection.output('./output/sumo-output1a/', runId)
-    traci.close()
+    peopleCollection.output(outputFolder, runId)
+    vehicleCollection.output(outputFolder, runId)
+    if results != None:
+        results.save(outputFolder + runId + RESULTS_SUFFIX)
+    profiler.mark("output")
+    if PROFILE:
+        profiler.stop()
+        profiler.output(outputFolder, runId)
+        profiler.printStats()
+    network.printCacheStats()
+    if PRUNE:
+        vehicleCollection.printPruningStats()
+    vehicleCollection.printCommandStats()
+    commandBuffer.printStats()
+    vehicleCollection.scheduler.printStats()
+    if REQUEST_CACHE != None:
+        requestCache.printStats()
+    eventLog.close()
+    if isinstance(vehicleCollection.evaluator, FleetEvaluator):
+        vehicleCollection.evaluator.printStats()
+    elif isinstance(vehicleCollection.evaluator, ParallelEvaluator):
+        vehicleCollection.evaluator.close()
 
 
-def doStep():
-    """ executes one step of simulation """
-    global step
-    step += 1
-    traci.simulationStep()
+def nextEventStep():
+    """ return the next step that needs attention: a request released, a
+    vehicle departing, reaching a stop, leaving a parking position or
+    arriving; steps in between need no update, so SUMO can skip them
+    () -> int"""
+    step = simulation.step
+    if not simulation.eventDriven:
+        return step + 1
+    events = [vehicleCollection.getNextEventStep(step),
+              simulation.requests.nextCallTime()]
+    if simulation.departed < len(simulation.departures):
+        # a departure delayed by SUMO is waited for step by step
+        events.append(simulation.departures[simulation.departed])
+    events = [e for e in events if e != None]
+    if len(events) == 0:
+        return step + 1
+    return max(step + 1, min(events))
+
+
+def doStep(target=None):
+    """ executes simulation up to the target step, by default one step
+    (int)"""
+    if target == None:
+        target = simulation.step + 1
+    profiler.beginStep(target)
+    # control commands from the previous step, in one message
+    commandBuffer.flush()
+    profiler.mark("commands")
+    if target == simulation.step + 1:
+        traci.simulationStep()
+    else:
+        traci.simulationStep(target * MILLISECONDS)
+    simulation.step = step = target
+    profiler.mark("simulationStep")
 
     moveNodes = []  
     for veh, subs in traci.vehicle.getSubscriptionResults().iteritems():
-        moveNodes.append((veh, subs[tc.VAR_ROAD_ID], subs[tc.VAR_LANEPOSITION]))
+        moveNodes.append((veh, subs[tc.VAR_ROAD_ID], subs[tc.VAR_LANEPOSITION],
+                          subs.get(VAR_DISTANCE)))
 
-    departed = traci.simulation.getSubscriptionResults()[tc.VAR_DEPARTED_VEHICLES_IDS]
-    for v in departed:
+    departedIDs = traci.simulation.getSubscriptionResults()[tc.VAR_DEPARTED_VEHICLES_IDS]
+    simulation.departed += len(departedIDs)
+    for v in departedIDs:
         if traci.vehicle.getTypeID(v) == "taxi":
-            traci.vehicle.subscribe(v)
+            if ODOMETER and ODOMETER_SUBSCRIPTION != None:
+                traci.vehicle.subscribe(v, ODOMETER_SUBSCRIPTION)
+            else:
+                traci.vehicle.subscribe(v, SUBSCRIPTION)
             subs = traci.vehicle.getSubscriptionResults(v)
             moveNodes.append((v, subs[tc.VAR_ROAD_ID],
-                              subs[tc.VAR_LANEPOSITION]))
-            vehicleCollection.addVehicle(Vehicle(v))
-    for vehicleID, edge, pos in moveNodes:
-        #print traci.vehicle.getPersonNumber(vehicleID)
-        vehicleCollection.getVehicle(vehicleID).update(step)
+                              subs[tc.VAR_LANEPOSITION],
+                              subs.get(VAR_DISTANCE)))
+            vehicleCollection.addVehicle(Vehicle(v, subs[tc.VAR_ROAD_ID],
+                                                 subs[tc.VAR_LANEPOSITION],
+                                                 subs.get(VAR_DISTANCE)))
+    profiler.mark("departures")
+    vehicleCollection.update(step, moveNodes)
+    profiler.mark("vehicleUpdates")
 
     # remove vehicles from active list if they have left SUMO
     arrived = traci.simulation.getSubscriptionResults()[tc.VAR_ARRIVED_VEHICLES_IDS]
     for v in arrived:
         vehicleCollection.stopVehicle(v, step)
+    profiler.mark("arrivals")
 
     # check for new requests
-    newRequests = [p for p in persons if p.getCallTime() == step]
-    for p in newRequests:
+    due = simulation.requests.popDue(step)
+    for p in due:
+        p.setDirectMetrics()
+    profiler.mark("release")
+    for p in due:
         success = vehicleCollection.addBookingToOptimumItinerary(p, step)
         if success == -1:
-            p.rejected()
-            print str(p.personID) + " rejected"
-        persons.remove(p)         
-        
+            peopleCollection.rejectPerson(p.personID)
+            if eventLog.isEnabled("dispatch", INFO):
+                eventLog.write("dispatch", INFO, "rejected",
+                               step=step, person=p.personID)
+    profiler.mark("dispatch")
+    peopleCollection.evictFinished(step)
+    vehicleCollection.flushOutput(step)
+    profiler.mark("output")
+    profiler.endStep()
+
+
+def addRequest(person):
+    """ add a request during a run, released at its call time or at the
+    next step if that has passed
+    (Person)"""
+    peopleCollection.addPerson(person)
+    simulation.requests.push(person)
+
 
 
 if __name__ == "__main__":
 
-    sumoExe = SUMO
-    sumoConfig = "./SampleInput/SUMO/grid.sumocfg"
-    sumoProcess = subprocess.Popen([sumoExe, sumoConfig], stdout=sys.stdout,
-                                   stderr=sys.stderr)
+    parser = OptionParser(usage="%prog [options] <config> <run> [<run> ...]")
+    parser.add_option("--scenario", default=SCENARIO,
+                      help="scenario of the request file [default: %default]")
+    parser.add_option("--port", type="int", default=PORT,
+                      help="TraCI port [default: %default]")
+    parser.add_option("--sumo-config", dest="sumoConfig",
+                      default=SUMO_CONFIG,
+                      help="SUMO configuration [default: %default]")
+    parser.add_option("--requests", dest="requestFolder",
+                      default=REQUEST_FOLDER,
+                      help="folder of request files, %s for the scenario "
+                      "[default: %default]")
+    parser.add_option("--output", dest="outputFolder", default=OUTPUT_FOLDER,
+                      help="folder for results, %s for the scenario "
+                      "[default: %default]")
+    parser.add_option("--meso", action="store_true", default=False,
+                      help="simulate with the mesoscopic stand-in, "
+                      "without SUMO")
+    parser.add_option("--window", type="int", default=REQUEST_WINDOW,
+                      help="stream requests, keeping this many ahead of "
+                      "their call time in memory, 0 reads the request file "
+                      "up front [default: %default]")
+    parser.add_option("--request-cache", dest="requestCache",
+                      default=REQUEST_CACHE,
+                      help="load request files preprocessed in this folder, "
+                      "preprocessing them on first use")
+    parser.add_option("--stream-output", dest="streamOutput",
+                      action="store_true", default=STREAM_OUTPUT,
+                      help="write people and vehicles as they finish, "
+                      "dropping finished people from memory")
+    parser.add_option("--output-format", dest="outputFormat",
+                      choices=["csv", "npz"], default=OUTPUT_FORMAT,
+                      help="csv, or npz for the results of a run as NumPy "
+                      "arrays in one file [default: %default]")
+    parser.add_option("--workers", type="int", default=WORKERS,
+                      help="evaluate vehicles on this many processes, 0 in "
+                      "this one; builds the stop matrix, as the workers "
+                      "take all travel times between stops from it "
+                      "[default: %default]")
+    parser.add_option("--fast", action="store_true", default=False,
+                      help="turn on the faster modes: %s" %
+                      ", ".join(FAST_MODES))
+    parser.add_option("--profile", action="store_true", default=PROFILE,
+                      help="time TraCI calls and step phases, written to "
+                      "the output folder")
+    (options, args) = parser.parse_args()
+    if len(args) < 2:
+        parser.error("config and run required")
+    SCENARIO = options.scenario
+    PORT = options.port
+    SUMO_CONFIG = options.sumoConfig
+    REQUEST_FOLDER = options.requestFolder
+    OUTPUT_FOLDER = options.outputFolder
+    PROFILE = options.profile
+    REQUEST_WINDOW = options.window
+    REQUEST_CACHE = options.requestCache
+    STREAM_OUTPUT = options.streamOutput
+    OUTPUT_FORMAT = options.outputFormat
+    WORKERS = options.workers
+    if options.fast:
+        for name in FAST_MODES:
+            globals()[name] = True
+
+    simulation.port = PORT
 
-    
-    runId = "1a-%s-%02d" % (sys.argv[1], int(sys.argv[2]))
-    print runId
-    run(runId)
-    sumoProcess.wait()
+    # consecutive runs share one SUMO instance
+    for r in args[1:]:
+        runId = "%s-%s-%02d" % (SCENARIO, args[0], int(r))
+        print runId
+        run(runId)
+    simulation.printStats()
+    simulation.close()
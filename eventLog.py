@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+@file    eventLog.py
+@author  Nicole Ronald
+@date    2014-03-17
+@version
+
+Defines a leveled log of simulation events, printed or written as a JSONL
+trace.
+
+SUMOoD (SUMO on Demand); see http://imod-au.info/sumood
+Copyright (C) 2014 iMoD
+SUMO, Simulation of Urban MObility; see http://sumo.sourceforge.net/
+Copyright (C) 2008-2012 DLR (http://www.dlr.de/) and contributors
+All rights reserved
+"""
+
+
+import json
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+OFF = 100
+LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "off": OFF}
+LEVEL_NAMES = dict((level, name) for (name, level) in LEVELS.iteritems())
+
+
+class EventLog:
+    """ log of events by module and level; callers check isEnabled before
+    building an event, so a disabled event costs one lookup and no
+    formatting or computation of its fields """
+
+    def __init__(self):
+        self.level = INFO
+        self.modules = {} # module -> level, overrides level
+        self.trace = None # JSONL file, None prints events
+        self.written = 0
+
+    def setLevel(self, level, module=None):
+        """ set the lowest level logged, for one module or by default
+        (int, string)"""
+        if module == None:
+            self.level = level
+        else:
+            self.modules[module] = level
+
+    def isEnabled(self, module, level):
+        """ return whether events of a module at a level are logged
+        (string, int) -> bool"""
+        return level >= self.modules.get(module, self.level)
+
+    def openTrace(self, filename):
+        """ write events to a JSONL file, one object per line, instead of
+        printing them
+        (string)"""
+        self.close()
+        self.trace = open(filename, 'w')
+
+    def close(self):
+        """ close the trace file, if any """
+        if self.trace != None:
+            self.trace.close()
+            self.trace = None
+
+    def write(self, module, level, event, **fields):
+        """ log an event; only call if isEnabled(module, level)
+        (string, int, string, ...)"""
+        self.written += 1
+        if self.trace != None:
+            fields["module"] = module
+            fields["level"] = LEVEL_NAMES.get(level, level)
+            fields["event"] = event
+            self.trace.write(json.dumps(fields, separators=(",", ":")) + "\n")
+        else:
+            print module, event, " ".join(["%s=%s" % (k, fields[k])
+                                           for k in sorted(fields)])
+
+eventLog = EventLog()
@@ -0,0 +1,359 @@
+# -*- coding: utf-8 -*-
+"""
+@file    fleetEvaluator.py
+@author  Nicole Ronald
+@date    2014-03-17
+@version
+
+Evaluates the insertion of a request into the plans of the whole fleet at
+once, using NumPy and the network's travel time matrix.
+
+SUMOoD (SUMO on Demand); see http://imod-au.info/sumood
+Copyright (C) 2014 iMoD
+SUMO, Simulation of Urban MObility; see http://sumo.sourceforge.net/
+Copyright (C) 2008-2012 DLR (http://www.dlr.de/) and contributors
+All rights reserved
+"""
+
+
+from stop import Stop, StopType
+from peopleCollection import PeopleCollection, peopleCollection
+from network import network, Network, UNREACHABLE
+from schedule import Schedule, INFPENALTY, TOLERANCE
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def truncate(time):
+    """ return a travel time truncated to seconds as Schedule.travelTime,
+    infinite if unreachable
+    (float) -> float"""
+    if time >= UNREACHABLE:
+        return numpy.inf
+    return int(time)
+
+
+class PackedPlan:
+    """ the parts of a vehicle's plan (without its current position) that
+    hold until the plan changes, as arrays over its stops: matrix indices,
+    service times (-inf if none), load changes, call and direct times of
+    dropoffs, and the truncated travel times between consecutive stops;
+    index is None if a stop is outside the matrix """
+
+    def __init__(self, plan):
+        index = [network.getIndex(s) for s in plan]
+        self.index = None
+        if None in index:
+            return
+        m = len(plan)
+        self.index = numpy.array(index, dtype=int)
+        self.service = numpy.empty(m)
+        self.delta = numpy.zeros(m)
+        self.dropoff = numpy.zeros(m, dtype=bool)
+        self.call = numpy.zeros(m)
+        self.direct = numpy.ones(m)
+        for k in range(m):
+            stop = plan[k]
+            self.service[k] = -numpy.inf
+            if stop.serviceTime != None:
+                self.service[k] = stop.serviceTime
+            if stop.stopType == StopType.PICKUP:
+                self.delta[k] = 1
+            elif stop.stopType == StopType.DROPOFF:
+                self.delta[k] = -1
+                self.dropoff[k] = True
+                self.call[k] = peopleCollection.getCallTime(stop.personID)
+                self.direct[k] = \
+                    peopleCollection.getDirectTime(stop.personID)
+        legs = numpy.trunc(network.timeMatrix[self.index[:-1],
+                                              self.index[1:]])
+        legs[legs >= UNREACHABLE] = numpy.inf
+        self.legs = legs
+
+
+class FleetEvaluator:
+    """ evaluates all (vehicle, pickup position, dropoff position)
+    insertions of a request in one pass over padded arrays of the vehicles'
+    plans, whose schedules are computed in the same pass from the packed
+    plans kept on the vehicles; vehicles that cannot be packed (stops
+    outside the matrix, infeasible plans, waiting that changes delays) are
+    evaluated one by one """
+
+    def __init__(self):
+        self.vectorized = 0 # vehicles evaluated in the array pass
+        self.serial = 0 # vehicles evaluated one by one
+        self.packs = 0 # plans packed, once per plan change
+
+    def getPacked(self, vehicle):
+        """ return the packed plan of a vehicle, packed again only once
+        the plan has changed
+        (Vehicle) -> PackedPlan"""
+        if vehicle.packed is None:
+            vehicle.packed = PackedPlan(vehicle.plan)
+            self.packs += 1
+        return vehicle.packed
+
+    def evaluate(self, vehicles, puStop, doStop, step):
+        """ return (pickup position, dropoff position, penalty) for each
+        vehicle, as Vehicle.calcTentativeItineraryPenalty would
+        (Vehicle[], Stop, Stop, int) -> (int, int, float)[]"""
+        results = [None] * len(vehicles)
+        packed = []
+        pu = network.getIndex(puStop)
+        do = network.getIndex(doStop)
+        if numpy != None and pu != None and do != None:
+            for r in range(len(vehicles)):
+                plan = self.getPacked(vehicles[r])
+                if plan.index is not None:
+                    packed.append((r, vehicles[r], plan))
+        if len(packed) > 0:
+            # infinite times of unreachable stops are rejected by the
+            # feasibility checks, whatever the scores computed from them
+            with numpy.errstate(over='ignore', invalid='ignore'):
+                best = self.evaluatePacked(packed, puStop, doStop, pu, do,
+                                           step)
+            for (r, vehicle, plan), result in zip(packed, best):
+                results[r] = result
+        for r in range(len(vehicles)):
+            if results[r] == None:
+                self.serial += 1
+                results[r] = vehicles[r].calcTentativeItineraryPenalty(
+                    puStop, doStop, step)
+            else:
+                self.vectorized += 1
+        return results
+
+    def printStats(self):
+        """ print how many vehicle evaluations were vectorized """
+        print "Fleet evaluator: %d vectorized, %d serial, %d plans " \
+              "packed" % (self.vectorized, self.serial, self.packs)
+
+    def evaluatePacked(self, packed, puStop, doStop, pu, do, step):
+        """ score all insertions for the packed plans, return the best
+        insertion of each, None where it must be evaluated one by one
+        ((int, Vehicle, PackedPlan)[], Stop, Stop, int, int, int)
+        -> (int, int, float)[]"""
+        V = len(packed)
+        # the current position, then the stops of each plan
+        n = numpy.array([len(plan.index) + 1 for (r, vehicle, plan)
+                         in packed])
+        L = int(n.max())
+        T = network.timeMatrix
+        rows = numpy.arange(V)
+        col = numpy.arange(L)[None, :]
+        inside = (col >= 1) & (col < n[:, None]) # stops of the plans
+        last = n - 1
+
+        index = numpy.zeros((V, L), dtype=int)
+        service = numpy.empty((V, L))
+        service.fill(-numpy.inf)
+        delta = numpy.zeros((V, L))
+        dropoff = numpy.zeros((V, L), dtype=bool)
+        call = numpy.zeros((V, L))
+        direct = numpy.ones((V, L))
+        leg = numpy.zeros((V, L)) # travel time from the stop before
+        end = numpy.zeros((V, 1, 1))
+        capacity = numpy.zeros((V, 1, 1))
+        timeToPU = numpy.zeros((V, L))
+        arrival = numpy.zeros((V, L))
+        departure = numpy.zeros((V, L))
+        load = numpy.zeros((V, L))
+        for v in range(V):
+            (r, vehicle, plan) = packed[v]
+            k = n[v]
+            index[v, 1:k] = plan.index
+            service[v, 1:k] = plan.service
+            delta[v, 1:k] = plan.delta
+            dropoff[v, 1:k] = plan.dropoff
+            call[v, 1:k] = plan.call
+            direct[v, 1:k] = plan.direct
+            leg[v, 2:k] = plan.legs
+            # the current position is not in the matrix
+            current = vehicle.getCurrentPos()
+            leg[v, 1] = truncate(network.getTime(current, vehicle.plan[0]))
+            timeToPU[v, 0] = truncate(network.getTime(current, puStop))
+            end[v] = vehicle.end
+            capacity[v] = vehicle.capacity
+            load[v, 0] = vehicle.countPassengers
+        arrival[:, 0] = step
+        departure[:, 0] = step
+
+        # the schedules, as Schedule, one stop position at a time
+        feasible = numpy.zeros((V, L), dtype=bool)
+        feasible[:, 0] = True
+        penalty = numpy.zeros((V, L))
+        term = numpy.zeros((V, L)) # penalty of each stop
+        for k in range(1, L):
+            arrival[:, k] = departure[:, k-1] + leg[:, k]
+            departure[:, k] = numpy.maximum(arrival[:, k], service[:, k])
+            load[:, k] = load[:, k-1] + delta[:, k]
+            term[:, k] = numpy.where(dropoff[:, k], (departure[:, k] -
+                                                     call[:, k]) /
+                                     direct[:, k], 0.0)
+            penalty[:, k] = penalty[:, k-1] + term[:, k]
+            feasible[:, k] = feasible[:, k-1] & \
+                             (departure[:, k] <= end[:, 0, 0]) & \
+                             (load[:, k] <= capacity[:, 0, 0])
+        feasible &= inside | (col == 0)
+        # an infeasible plan is evaluated exactly, one by one
+        planFeasible = feasible[rows, last]
+        surplus = numpy.where(inside & (service > -numpy.inf),
+                              arrival - service, numpy.inf) # of each stop
+        rate = numpy.where(inside & dropoff, 1.0 / direct, 0.0)
+
+        # suffix values over the stops k..n-2, as Schedule
+        suffixSurplus = numpy.empty((V, L))
+        suffixSurplus.fill(numpy.inf)
+        suffixDeparture = numpy.empty((V, L))
+        suffixDeparture.fill(-numpy.inf)
+        suffixLoad = numpy.empty((V, L))
+        suffixLoad.fill(-numpy.inf)
+        suffixLoad[rows, last] = load[rows, last]
+        suffixPenalty = numpy.zeros((V, L))
+        suffixRate = numpy.zeros((V, L))
+        for k in range(L-2, 0, -1):
+            active = k <= n - 2
+            suffixSurplus[:, k] = numpy.where(
+                active, numpy.minimum(suffixSurplus[:, k+1], surplus[:, k]),
+                numpy.inf)
+            suffixDeparture[:, k] = numpy.where(
+                active, numpy.maximum(suffixDeparture[:, k+1],
+                                      departure[:, k]), -numpy.inf)
+            suffixLoad[:, k] = numpy.where(
+                active, numpy.maximum(suffixLoad[:, k+1], load[:, k]),
+                suffixLoad[:, k])
+            suffixPenalty[:, k] = numpy.where(
+                active, suffixPenalty[:, k+1] + term[:, k], 0.0)
+            suffixRate[:, k] = numpy.where(
+                active, suffixRate[:, k+1] + rate[:, k], 0.0)
+        lastArrival = arrival[rows, last][:, None, None]
+        lastService = service[rows, last][:, None, None]
+        lastLoad = load[rows, last][:, None, None]
+        lastCall = numpy.where(dropoff[rows, last], call[rows, last],
+                               0.0)[:, None, None]
+        lastRate = numpy.where(dropoff[rows, last], 1.0 / direct[rows, last],
+                               0.0)[:, None, None]
+
+        timeToPU[:, 1:] = numpy.where(inside[:, 1:],
+                                      numpy.trunc(T[index[:, 1:], pu]), 0.0)
+        timeFromPU = numpy.where(inside, numpy.trunc(T[pu, index]), 0.0)
+        timeToDO = numpy.where(inside, numpy.trunc(T[index, do]), 0.0)
+        timeFromDO = numpy.where(inside, numpy.trunc(T[do, index]), 0.0)
+        for times in [timeToPU, timeFromPU, timeToDO, timeFromDO]:
+            times[times >= UNREACHABLE] = numpy.inf
+        timePUDO = truncate(network.getTime(puStop, doStop))
+        doCall = peopleCollection.getCallTime(doStop.personID)
+        doDirect = float(peopleCollection.getDirectTime(doStop.personID))
+
+        def wait(stop, time):
+            if stop.serviceTime != None:
+                return numpy.maximum(time, stop.serviceTime)
+            return time
+
+        def take(a, k):
+            return a[numpy.arange(V)[:, None, None], k]
+
+        def suffix(k, delay):
+            """ vectorized Schedule.suffix, returns penalty and flags """
+            last = (k == n[:, None, None] - 1)
+            nonlinear = ~last & ((take(suffixSurplus, k) < 0) |
+                                 (take(suffixSurplus, k) + delay < 0))
+            infeasible = ~last & \
+                         ((take(suffixDeparture, k) + delay > end) |
+                          (take(suffixLoad, k) > capacity))
+            rest = numpy.where(last, 0.0, take(suffixPenalty, k) +
+                               delay * take(suffixRate, k))
+            time = numpy.maximum(lastArrival + delay, lastService)
+            infeasible |= (time > end) | (lastLoad > capacity)
+            rest = rest + (time - lastCall) * lastRate
+            return rest, nonlinear, infeasible
+
+        # pickup before stop i, dropoff before stop q; m indexes the stops
+        # between them, all with shape (vehicle, i, q)
+        i = numpy.arange(L)[None, :, None]
+        q = numpy.arange(L)[None, None, :]
+        iPrev = numpy.maximum(i - 1, 0)
+        qPrev = numpy.maximum(q - 1, 0)
+        valid = (i >= 1) & (i <= q) & (q <= n[:, None, None] - 1)
+
+        puTime = wait(puStop, take(departure, iPrev) + take(timeToPU, iPrev))
+        ok = valid & take(feasible, iPrev) & (puTime <= end) & \
+             (take(load, iPrev) + 1 <= capacity)
+        base = take(penalty, iPrev)
+
+        # dropoff directly after pickup
+        doTimeNext = wait(doStop, puTime + timePUDO)
+        restNext, nonlinearNext, infeasibleNext = suffix(
+            i + 0 * q, doTimeNext + take(timeFromDO, i + 0 * q) -
+            take(arrival, i + 0 * q))
+        scoreNext = base + (doTimeNext - doCall) / doDirect + restNext
+        okNext = ok & (q == i) & (doTimeNext <= end) & ~infeasibleNext
+
+        # dropoff after stops i..q-1, which are delayed by the pickup
+        delay = puTime + take(timeFromPU, i + 0 * q) - take(arrival, i + 0 * q)
+        m = numpy.arange(L)[None, None, :]
+        between = (m >= i) & (m <= n[:, None, None] - 2)
+        row = numpy.arange(V)[:, None, None]
+        cumSurplus = numpy.minimum.accumulate(
+            numpy.where(between, surplus[row, m], numpy.inf), axis=2)
+        cumDeparture = numpy.maximum.accumulate(
+            numpy.where(between, departure[row, m], -numpy.inf), axis=2)
+        cumLoad = numpy.maximum.accumulate(
+            numpy.where(between, load[row, m], -numpy.inf), axis=2)
+        cumTerm = numpy.cumsum(numpy.where(between, term[row, m], 0.0),
+                               axis=2)
+        cumRate = numpy.cumsum(numpy.where(between, rate[row, m], 0.0),
+                               axis=2)
+        qm = qPrev + 0 * i
+        middleSurplus = numpy.take_along_axis(cumSurplus, qm + 0 * row,
+                                              axis=2)
+        middleDeparture = numpy.take_along_axis(cumDeparture, qm + 0 * row,
+                                                axis=2)
+        middleLoad = numpy.take_along_axis(cumLoad, qm + 0 * row, axis=2)
+        middle = numpy.take_along_axis(cumTerm, qm + 0 * row, axis=2) + \
+                 delay * numpy.take_along_axis(cumRate, qm + 0 * row, axis=2)
+        nonlinearMiddle = (middleSurplus < 0) | (middleSurplus + delay < 0)
+        doTimeLater = wait(doStop, take(departure, qm) + delay +
+                           take(timeToDO, qm))
+        restLater, nonlinearLater, infeasibleLater = suffix(
+            q + 0 * i, doTimeLater + take(timeFromDO, q + 0 * i) -
+            take(arrival, q + 0 * i))
+        scoreLater = base + middle + (doTimeLater - doCall) / doDirect + \
+                     restLater
+        okLater = ok & (q > i) & (middleDeparture + delay <= end) & \
+                  (middleLoad + 1 <= capacity) & (doTimeLater <= end) & \
+                  ~infeasibleLater
+
+        nonlinear = (ok & (q == i) & nonlinearNext) | \
+                    (ok & (q > i) & (nonlinearMiddle | nonlinearLater))
+        score = numpy.where(okNext, scoreNext,
+                            numpy.where(okLater, scoreLater, INFPENALTY))
+        score[score >= INFPENALTY] = INFPENALTY
+
+        # best insertion per vehicle, near-ties resolved exactly in the
+        # order the serial search generates candidates (row-major in i, q)
+        best = []
+        flat = score.reshape(V, L * L)
+        minimum = flat.min(axis=1)
+        for v in range(V):
+            (r, vehicle, plan) = packed[v]
+            if not planFeasible[v] or nonlinear[v].any():
+                best.append(None)
+                continue
+            result = (None, None, INFPENALTY)
+            if minimum[v] < INFPENALTY:
+                current = [vehicle.getCurrentPos()] + vehicle.plan
+                for c in numpy.flatnonzero(flat[v] <= minimum[v] + TOLERANCE):
+                    (bi, bq) = divmod(int(c), L)
+                    # as Schedule.exact
+                    exact = vehicle.calcItineraryPenalty(
+                        current[:bi] + [puStop] + current[bi:bq] +
+                        [doStop] + current[bq:], step)
+                    if exact < result[2]:
+                        # positions relative to plan without current position
+                        result = (bi - 1, bq, exact)
+            best.append(result)
+        return best
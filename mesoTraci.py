@@ -0,0 +1,451 @@
+# -*- coding: utf-8 -*-
+"""
+@file    mesoTraci.py
+@author  Nicole Ronald
+@date    2014-03-17
+@version
+
+A mesoscopic stand-in for SUMO, simulated in this process: vehicles move
+along fastest paths at the speed limit of each edge (no junctions, no
+interaction between vehicles) and stop for the duration of their stops.
+It implements the part of the TraCI API used by SUMOoD, and is installed
+as the traci module with install(), before anything imports traci.
+
+SUMOoD (SUMO on Demand); see http://imod-au.info/sumood
+Copyright (C) 2014 iMoD
+SUMO, Simulation of Urban MObility; see http://sumo.sourceforge.net/
+Copyright (C) 2008-2012 DLR (http://www.dlr.de/) and contributors
+All rights reserved
+"""
+
+
+import sys, os, math, heapq, imp
+from xml.etree import cElementTree
+
+STEP_LENGTH = 1000 # ms
+UNREACHABLE = sys.float_info.max # as SUMO for positions it cannot route
+
+# constants with the values of traci.constants
+VAR_SPEED = 0x40
+VAR_TYPE = 0x4f
+VAR_ROAD_ID = 0x50
+VAR_LANEPOSITION = 0x56
+VAR_DEPARTED_VEHICLES_IDS = 0x74
+VAR_ARRIVED_VEHICLES_IDS = 0x7a
+VAR_DISTANCE = 0x84
+VAR_TIME_STEP = 0x70
+
+
+class TraCIException(Exception):
+    """ a command SUMO could not carry out """
+
+
+class FatalTraCIError(Exception):
+    """ the connection to SUMO is unusable """
+
+
+class MesoNetwork:
+    """ edges of a SUMO network file and the fastest paths between them """
+
+    def __init__(self, netFile):
+        self.length = {} # edge -> length of its first lane
+        self.speed = {} # edge -> speed limit of its first lane
+        self.lanes = {} # lane -> (length, speed), including internal lanes
+        self.successors = {} # edge -> edges reachable at its end
+        self.trees = {} # edge -> fastest path tree from its end
+        for event, element in cElementTree.iterparse(netFile):
+            if element.tag == "edge":
+                edgeID = element.get("id")
+                for lane in element.findall("lane"):
+                    self.lanes[lane.get("id")] = (float(lane.get("length")),
+                                                  float(lane.get("speed")))
+                    if element.get("function") != "internal" and \
+                       lane.get("index") == "0":
+                        self.length[edgeID] = float(lane.get("length"))
+                        self.speed[edgeID] = float(lane.get("speed"))
+                        self.successors.setdefault(edgeID, set())
+                element.clear()
+            elif element.tag == "connection":
+                fromEdge = element.get("from")
+                if not fromEdge.startswith(":"):
+                    self.successors.setdefault(fromEdge, set()).add(
+                        element.get("to"))
+
+    def getTree(self, edgeID):
+        """ return (time, distance, previous edge) to the end of each edge
+        reachable from the end of an edge, along fastest paths
+        (string) -> {string: (float, float, string)}"""
+        if edgeID in self.trees:
+            return self.trees[edgeID]
+        tree = {}
+        heap = [(0.0, 0.0, edgeID, None)]
+        while len(heap) > 0:
+            (time, distance, e, previous) = heapq.heappop(heap)
+            if e in tree:
+                continue
+            tree[e] = (time, distance, previous)
+            for s in self.successors.get(e, ()):
+                if s not in tree and s in self.length:
+                    heapq.heappush(heap, (time + self.length[s] / self.speed[s],
+                                          distance + self.length[s], s, e))
+        self.trees[edgeID] = tree
+        return tree
+
+    def getRoute(self, fromEdge, toEdge):
+        """ return edges of the fastest path from an edge to another, both
+        included, None if there is none
+        (string, string) -> string[]"""
+        if fromEdge == toEdge:
+            return [fromEdge]
+        tree = self.getTree(fromEdge)
+        if toEdge not in tree:
+            return None
+        route = [toEdge]
+        while route[-1] != fromEdge:
+            route.append(tree[route[-1]][2])
+        route.reverse()
+        return route
+
+    def getBetween(self, edgeID1, pos1, edgeID2, pos2):
+        """ return (time, distance) between two positions along the fastest
+        path, UNREACHABLE for both if backwards on one edge or no path
+        (string, float, string, float) -> (float, float)"""
+        if edgeID1 == edgeID2:
+            if pos1 <= pos2:
+                return ((pos2 - pos1) / self.speed[edgeID1], pos2 - pos1)
+            return (UNREACHABLE, UNREACHABLE)
+        tree = self.getTree(edgeID1)
+        if edgeID2 not in tree:
+            return (UNREACHABLE, UNREACHABLE)
+        (time, distance, previous) = tree[edgeID2]
+        rest1 = self.length[edgeID1] - pos1
+        rest2 = self.length[edgeID2] - pos2
+        return (time + rest1 / self.speed[edgeID1] - rest2 / self.speed[edgeID2],
+                distance + rest1 - rest2)
+
+
+class MesoVehicle:
+    """ a vehicle moving along its route, edge by edge """
+
+    def __init__(self, vehicleID, typeID, maxSpeed, route, depart):
+        self.vehicleID = vehicleID
+        self.typeID = typeID
+        self.maxSpeed = maxSpeed
+        self.route = route
+        self.depart = depart # ms
+        self.index = 0 # of the current edge in the route
+        self.pos = 0.0
+        self.speed = 0.0
+        self.odometer = 0.0
+        self.stops = {} # (edge, pos, lane) -> duration in ms
+        self.stopped = None # stop the vehicle is at
+        self.stoppedUntil = None # ms
+
+    def getRoadID(self):
+        return self.route[self.index]
+
+    def nextStop(self):
+        """ return the nearest stop ahead on the current edge, None if none
+        () -> (string, float, int)"""
+        edgeID = self.route[self.index]
+        ahead = [s for s in self.stops if s[0] == edgeID and s[1] >= self.pos]
+        if len(ahead) == 0:
+            return None
+        return min(ahead, key=lambda s: s[1])
+
+    def move(self, network, time):
+        """ move for one step ending at time, return False once the vehicle
+        reaches the end of its route
+        (MesoNetwork, int) -> bool"""
+        self.speed = 0.0
+        if self.stopped != None:
+            if time - STEP_LENGTH < self.stoppedUntil:
+                return True
+            # stop over, drive on from the start of the step
+            if self.stopped in self.stops:
+                del self.stops[self.stopped]
+            self.stopped = None
+        remaining = STEP_LENGTH / 1000.0
+        while remaining > 0:
+            edgeID = self.route[self.index]
+            speed = min(network.speed[edgeID], self.maxSpeed)
+            stop = self.nextStop()
+            if stop != None:
+                end = min(stop[1], network.length[edgeID])
+            else:
+                end = network.length[edgeID]
+            if self.pos + speed * remaining < end:
+                self.pos += speed * remaining
+                self.odometer += speed * remaining
+                self.speed = speed
+                return True
+            remaining -= (end - self.pos) / speed
+            self.odometer += end - self.pos
+            self.pos = end
+            if stop != None:
+                self.stopped = stop
+                self.stoppedUntil = time + self.stops[stop]
+                return True
+            if self.index + 1 == len(self.route):
+                return False
+            self.index += 1
+            self.pos = 0.0
+        return True
+
+
+class MesoSimulation:
+    """ state of the stand-in simulation; its methods implement the TraCI
+    functions of the same name """
+
+    def __init__(self):
+        self.network = None
+        self.netFile = None
+        self.time = 0 # ms
+        self.end = None # ms
+        self.pending = [] # (depart, order, MesoVehicle) not departed yet
+        self.vehicles = {}
+        self.subscriptions = {} # vehicleID -> variables
+        self.results = {}
+        self.departed = []
+        self.arrived = []
+
+    def load(self, args):
+        """ load the SUMO configuration given with -c in args
+        (string[])"""
+        configFile = args[args.index("-c") + 1]
+        folder = os.path.dirname(configFile)
+        config = cElementTree.parse(configFile).getroot()
+        netFile = os.path.join(folder, config.find("input/net-file").get("value"))
+        if netFile != self.netFile:
+            self.network = MesoNetwork(netFile)
+            self.netFile = netFile
+        self.time = 0
+        self.end = None
+        end = config.find("time/end")
+        if end != None:
+            self.end = int(float(end.get("value")) * 1000)
+        self.pending = []
+        self.vehicles = {}
+        self.subscriptions = {}
+        self.results = {}
+        self.departed = []
+        self.arrived = []
+        routeFiles = config.find("input/route-files")
+        if routeFiles != None:
+            for routeFile in routeFiles.get("value").split(","):
+                self.readRoutes(os.path.join(folder, routeFile.strip()))
+        heapq.heapify(self.pending)
+
+    def readRoutes(self, routeFile):
+        """ add the vehicles of a route file
+        (string)"""
+        root = cElementTree.parse(routeFile).getroot()
+        maxSpeeds = {}
+        routes = {}
+        for vType in root.findall("vType"):
+            maxSpeeds[vType.get("id")] = float(vType.get("maxSpeed", 70))
+        for route in root.findall("route"):
+            routes[route.get("id")] = route.get("edges").split()
+        for v in root.findall("vehicle"):
+            route = v.find("route")
+            if route != None:
+                edges = route.get("edges").split()
+            else:
+                edges = routes[v.get("route")]
+            typeID = v.get("type", "DEFAULT_VEHTYPE")
+            depart = int(math.ceil(float(v.get("depart")))) * 1000
+            self.pending.append((depart, len(self.pending),
+                                 MesoVehicle(v.get("id"), typeID,
+                                             maxSpeeds.get(typeID, 70.0),
+                                             edges, depart)))
+
+    def simulationStep(self, step=0):
+        """ simulate up to time step (ms), one step if 0; results are those
+        of the last step simulated
+        (int)"""
+        if self.network == None:
+            raise FatalTraCIError("no configuration loaded")
+        target = max(step, self.time + STEP_LENGTH)
+        while self.time < target:
+            self.time += STEP_LENGTH
+            self.departed = []
+            self.arrived = []
+            for v in sorted(self.vehicles.values(),
+                            key=lambda v: v.vehicleID):
+                if not v.move(self.network, self.time):
+                    self.remove(v.vehicleID)
+            # inserted vehicles start moving in the next step
+            while len(self.pending) > 0 and self.pending[0][0] <= self.time:
+                v = heapq.heappop(self.pending)[2]
+                self.vehicles[v.vehicleID] = v
+                self.departed.append(v.vehicleID)
+        self.results = {}
+        for vehicleID in self.subscriptions:
+            self.results[vehicleID] = self.getResults(vehicleID)
+
+    def remove(self, vehicleID, reason=None):
+        """ remove a vehicle, which then counts as arrived
+        (string, int)"""
+        if vehicleID not in self.vehicles:
+            raise TraCIException("Vehicle '%s' is not known" % vehicleID)
+        del self.vehicles[vehicleID]
+        if vehicleID in self.subscriptions:
+            del self.subscriptions[vehicleID]
+        self.arrived.append(vehicleID)
+
+    def getMinExpectedNumber(self):
+        if self.end != None and self.time >= self.end:
+            return 0
+        return len(self.vehicles) + len(self.pending)
+
+    def getCurrentTime(self):
+        return self.time
+
+    def getVehicle(self, vehicleID):
+        if vehicleID not in self.vehicles:
+            raise TraCIException("Vehicle '%s' is not known" % vehicleID)
+        return self.vehicles[vehicleID]
+
+    def getResults(self, vehicleID):
+        """ return the subscribed variables of a vehicle
+        (string) -> {int: object}"""
+        v = self.vehicles[vehicleID]
+        values = {VAR_ROAD_ID: v.getRoadID(), VAR_LANEPOSITION: v.pos,
+                  VAR_DISTANCE: v.odometer, VAR_SPEED: v.speed,
+                  VAR_TYPE: v.typeID}
+        return dict((var, values[var]) for var in self.subscriptions[vehicleID]
+                    if var in values)
+
+    def vehicleSubscribe(self, vehicleID, varIDs=(VAR_ROAD_ID,
+                                                 VAR_LANEPOSITION)):
+        self.getVehicle(vehicleID)
+        self.subscriptions[vehicleID] = list(varIDs)
+        self.results[vehicleID] = self.getResults(vehicleID)
+
+    def vehicleSubscriptionResults(self, vehicleID=None):
+        if vehicleID == None:
+            return self.results
+        return self.results.get(vehicleID)
+
+    def simulationSubscribe(self, varIDs=(VAR_DEPARTED_VEHICLES_IDS,), begin=0,
+                            end=2**31-1):
+        pass # departed and arrived vehicles are always reported
+
+    def simulationSubscriptionResults(self, objectID=None):
+        return {VAR_DEPARTED_VEHICLES_IDS: list(self.departed),
+                VAR_ARRIVED_VEHICLES_IDS: list(self.arrived),
+                VAR_TIME_STEP: self.time}
+
+    def getRoadID(self, vehicleID):
+        return self.getVehicle(vehicleID).getRoadID()
+
+    def getLanePosition(self, vehicleID):
+        return self.getVehicle(vehicleID).pos
+
+    def getDistance(self, vehicleID):
+        return self.getVehicle(vehicleID).odometer
+
+    def getSpeed(self, vehicleID):
+        return self.getVehicle(vehicleID).speed
+
+    def getTypeID(self, vehicleID):
+        return self.getVehicle(vehicleID).typeID
+
+    def changeTarget(self, vehicleID, edgeID):
+        """ route the vehicle from its edge to another """
+        v = self.getVehicle(vehicleID)
+        if edgeID not in self.network.length:
+            raise TraCIException("Edge '%s' is not known" % edgeID)
+        route = self.network.getRoute(v.getRoadID(), edgeID)
+        if route == None:
+            raise TraCIException("Route replacement failed for %s" %
+                                 vehicleID)
+        v.route = route
+        v.index = 0
+
+    def setStop(self, vehicleID, edgeID, pos=1.0, laneIndex=0,
+                duration=2**31-1):
+        """ set a stop, or with duration 0 remove it and drive on if the
+        vehicle is stopped there """
+        v = self.getVehicle(vehicleID)
+        if edgeID not in self.network.length:
+            raise TraCIException("Edge '%s' is not known" % edgeID)
+        stop = (edgeID, float(pos), laneIndex)
+        if duration > 0:
+            v.stops[stop] = duration
+            if v.stopped == stop:
+                v.stoppedUntil = self.time + duration
+        else:
+            if stop in v.stops:
+                del v.stops[stop]
+            if v.stopped == stop:
+                v.stopped = None
+
+    def getDistanceRoad(self, edgeID1, pos1, edgeID2, pos2, isDriving=False):
+        return self.network.getBetween(edgeID1, pos1, edgeID2, pos2)[1]
+
+    def getDistanceTime(self, edgeID1, pos1, edgeID2, pos2):
+        return self.network.getBetween(edgeID1, pos1, edgeID2, pos2)[0]
+
+    def laneIDList(self):
+        return self.network.lanes.keys()
+
+    def laneLength(self, laneID):
+        return self.network.lanes[laneID][0]
+
+    def laneMaxSpeed(self, laneID):
+        return self.network.lanes[laneID][1]
+
+
+meso = MesoSimulation()
+
+
+def install():
+    """ install the stand-in as the modules traci, traci.constants,
+    traci.vehicle, traci.simulation and traci.lane, return traci
+    () -> module"""
+    traci = imp.new_module("traci")
+    constants = imp.new_module("traci.constants")
+    for name, value in globals().items():
+        if name.startswith("VAR_"):
+            setattr(constants, name, value)
+    vehicle = imp.new_module("traci.vehicle")
+    vehicle.subscribe = meso.vehicleSubscribe
+    vehicle.getSubscriptionResults = meso.vehicleSubscriptionResults
+    for name in ["getRoadID", "getLanePosition", "getDistance", "getSpeed",
+                 "getTypeID", "changeTarget", "setStop", "remove"]:
+        setattr(vehicle, name, getattr(meso, name))
+    simulation = imp.new_module("traci.simulation")
+    simulation.subscribe = meso.simulationSubscribe
+    simulation.getSubscriptionResults = meso.simulationSubscriptionResults
+    for name in ["getMinExpectedNumber", "getCurrentTime", "getDistanceRoad",
+                 "getDistanceTime"]:
+        setattr(simulation, name, getattr(meso, name))
+    lane = imp.new_module("traci.lane")
+    lane.getIDList = meso.laneIDList
+    lane.getLength = meso.laneLength
+    lane.getMaxSpeed = meso.laneMaxSpeed
+
+    traci.constants = constants
+    traci.vehicle = vehicle
+    traci.simulation = simulation
+    traci.lane = lane
+    traci.TraCIException = TraCIException
+    traci.FatalTraCIError = FatalTraCIError
+    traci.simulationStep = meso.simulationStep
+    traci.load = meso.load
+
+    def init(port=None, numRetries=None, host=None):
+        pass # nothing to connect to
+
+    def close():
+        pass
+    traci.init = init
+    traci.close = close
+    traci.inProcess = True # nothing to start, configurations are loaded
+    sys.modules["traci"] = traci
+    sys.modules["traci.constants"] = constants
+    sys.modules["traci.vehicle"] = vehicle
+    sys.modules["traci.simulation"] = simulation
+    sys.modules["traci.lane"] = lane
+    return traci
@@ -15,7 +15,7 @@ All rights reserved
 """
 
 
-import subprocess, random, sys, os
+import subprocess, random, sys, os, math
 SUMO_HOME = os.path.realpath(
                 os.environ.get("SUMO_HOME",
                 os.path.join(os.path.dirname(__file__), "..", "..", "..", "..",
@@ -24,14 +24,218 @@ sys.path.append(os.path.join(SUMO_HOME, "tools"))
 
 import traci
 import traci.constants as tc
+from collections import OrderedDict
+from xml.etree import cElementTree
+from stop import LINKS, LINK_IDS
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+TIME = 0
+DISTANCE = 1
+UNREACHABLE = sys.float_info.max # as SUMO returns for positions it cannot route
 
 class Network:
     """ Interface between system and network representation """
 
+    def __init__(self):
+        self.stopIndex = {}
+        self.timeMatrix = None
+        self.distanceMatrix = None
+        self.maxSpeed = None
+        self.geometry = {}
+        self.straightRatio = 1.0
+        self.edgeLengths = {}
+        self.enableCache(0)
+
+    def reset(self):
+        """ forget the matrix, cached queries and speeds, once the street
+        network changes """
+        self.stopIndex = {}
+        self.timeMatrix = None
+        self.distanceMatrix = None
+        self.maxSpeed = None
+        self.geometry = {}
+        self.straightRatio = 1.0
+        self.edgeLengths = {}
+        self.enableCache(self.cacheSize)
+
+    def enableCache(self, size):
+        """ keep up to size results of TraCI routing queries in a least
+        recently used cache, 0 disables the cache
+        (int)"""
+        self.cache = OrderedDict()
+        self.cacheSize = size
+        self.cacheHits = 0
+        self.cacheMisses = 0
+        self.cacheEvictions = 0
+
+    def buildMatrix(self, stops):
+        """ precompute travel times and distances between all pairs of
+        stops, so that queries between them are answered from memory;
+        queries involving other positions still go through TraCI; stops
+        already in the matrix from an earlier run are not queried again
+        (Stop[])"""
+        if numpy is None:
+            print "numpy not available, matrix mode disabled"
+            return
+        known = len(self.stopIndex)
+        for s in stops:
+            if s.key not in self.stopIndex:
+                self.stopIndex[s.key] = len(self.stopIndex)
+        n = len(self.stopIndex)
+        if n == known:
+            return
+        timeMatrix = numpy.zeros((n, n))
+        distanceMatrix = numpy.zeros((n, n))
+        if known > 0:
+            timeMatrix[:known, :known] = self.timeMatrix
+            distanceMatrix[:known, :known] = self.distanceMatrix
+        self.timeMatrix = timeMatrix
+        self.distanceMatrix = distanceMatrix
+        for (oLinkID, oPos), o in self.stopIndex.iteritems():
+            oLink = LINKS[oLinkID]
+            for (dLinkID, dPos), d in self.stopIndex.iteritems():
+                if o < known and d < known:
+                    continue
+                dLink = LINKS[dLinkID]
+                self.timeMatrix[o, d] = self.queryTraCI(TIME, oLink, oPos,
+                                                        dLink, dPos)
+                self.distanceMatrix[o, d] = self.queryTraCI(DISTANCE,
+                                                            oLink, oPos,
+                                                            dLink, dPos)
+        print "Matrix built for", n, "stops,", n - known, "new"
+
+    def getStopIndex(self, link, pos):
+        """ return the index of a stop in the matrix, None if not in matrix
+        (string, float) -> int"""
+        if self.timeMatrix is None:
+            return None
+        return self.stopIndex.get((LINK_IDS.get(link), pos))
+
+    def getIndex(self, stop):
+        """ return the index of a stop in the matrix, None if not in matrix
+        (Stop) -> int"""
+        if self.timeMatrix is None:
+            return None
+        return self.stopIndex.get(stop.key)
+
+    def query(self, kind, oLink, oPos, dLink, dPos):
+        """ return time or distance between two positions, from the cache
+        if possible
+        (int, string, float, string, float) -> float"""
+        if self.cacheSize == 0:
+            return self.queryTraCI(kind, oLink, oPos, dLink, dPos)
+        # exact positions, as a nearby position may route differently
+        key = (kind, oLink, oPos, dLink, dPos)
+        value = self.cache.pop(key, None)
+        if value != None:
+            self.cacheHits += 1
+        else:
+            self.cacheMisses += 1
+            value = self.queryTraCI(kind, oLink, oPos, dLink, dPos)
+            if len(self.cache) >= self.cacheSize:
+                self.cache.popitem(last=False)
+                self.cacheEvictions += 1
+        self.cache[key] = value # most recently used at the end
+        return value
+
+    def queryTraCI(self, kind, oLink, oPos, dLink, dPos):
+        """ return time or distance between two positions from SUMO
+        (int, string, float, string, float) -> float"""
+        if kind == TIME:
+            return traci.simulation.getDistanceTime(oLink, oPos, dLink, dPos)
+        return float(traci.simulation.getDistanceRoad(oLink, oPos,
+                                                      dLink, dPos, True))
+
+    def printCacheStats(self):
+        """ print cache usage, to help sizing the cache """
+        queries = self.cacheHits + self.cacheMisses
+        if self.cacheSize == 0 or queries == 0:
+            return
+        print "Network cache: size %d/%d, hit rate %.3f, %d evictions, " \
+              "%d TraCI calls saved" % (len(self.cache), self.cacheSize,
+                                       self.cacheHits / float(queries),
+                                       self.cacheEvictions, self.cacheHits)
+
+    def getMaxSpeed(self):
+        """ return the highest speed limit of any lane
+        () -> float"""
+        if self.maxSpeed == None:
+            self.maxSpeed = max([traci.lane.getMaxSpeed(lane)
+                                 for lane in traci.lane.getIDList()])
+        return self.maxSpeed
+
+    def loadGeometry(self, netFile):
+        """ read the junctions at both ends of each edge from the network
+        file, for straight-line bounds on travel times; straightRatio is the
+        least ratio of an edge's length to the line between its junctions
+        (string)"""
+        if self.geometry:
+            return
+        junctions = {} # junction -> (x, y)
+        edges = {} # edge -> (from, to, length of its first lane)
+        for event, element in cElementTree.iterparse(netFile):
+            if element.tag == "junction":
+                junctions[element.get("id")] = (float(element.get("x")),
+                                                float(element.get("y")))
+                element.clear()
+            elif element.tag == "edge":
+                if element.get("function") != "internal":
+                    for lane in element.findall("lane"):
+                        if lane.get("index") == "0":
+                            edges[element.get("id")] = (
+                                element.get("from"), element.get("to"),
+                                float(lane.get("length")))
+                element.clear()
+        self.straightRatio = 1.0
+        for edgeID, (fromID, toID, length) in edges.iteritems():
+            (x0, y0) = junctions[fromID]
+            (x1, y1) = junctions[toID]
+            self.geometry[edgeID] = (x0, y0, x1 - x0, y1 - y0, length)
+            straight = math.hypot(x1 - x0, y1 - y0)
+            if straight > 0:
+                self.straightRatio = min(self.straightRatio, length / straight)
+
+    def getCoordinates(self, link, pos):
+        """ return a position as a point on the line between the junctions of
+        its edge, None if the edge is not known
+        (string, float) -> (float, float)"""
+        edge = self.geometry.get(link)
+        if edge == None:
+            return None
+        (x, y, dx, dy, length) = edge
+        share = min(max(pos / length, 0.0), 1.0) if length > 0 else 0.0
+        return (x + share * dx, y + share * dy)
+
+    def getStraightDistance(self, oLink, oPos, dLink, dPos):
+        """ return a lower bound on the route distance between two positions,
+        without TraCI: no route is shorter than straightRatio times the
+        straight line; 0 if either edge is not known
+        (string, float, string, float) -> float"""
+        o = self.getCoordinates(oLink, oPos)
+        d = self.getCoordinates(dLink, dPos)
+        if o == None or d == None:
+            return 0.0
+        return self.straightRatio * math.hypot(d[0] - o[0], d[1] - o[1])
+
+    def getStraightTime(self, oLink, oPos, dLink, dPos):
+        """ return a lower bound on the travel time between two positions,
+        as no route is driven faster than the highest speed limit
+        (string, float, string, float) -> float"""
+        return self.getStraightDistance(oLink, oPos, dLink, dPos) / \
+               self.getMaxSpeed()
+
     def getEdgeLength(self, link):
         """ returns length of edge, by measuring lane 0 
         (string) -> float""" 
-        return traci.lane.getLength(link+"_0")
+        length = self.edgeLengths.get(link)
+        if length == None:
+            length = traci.lane.getLength(link+"_0")
+            self.edgeLengths[link] = length
+        return length
 
 
     def getVehicleCurrentEdge(self, vehicleID):
@@ -47,25 +251,33 @@ class Network:
     def getDistance(self, origin, destination):
         """ return the distance between two stops 
         (Stop, Stop) -> float"""
-        return float(traci.simulation.getDistanceRoad(
-            origin.link, origin.pos,
-            destination.link, destination.pos,
-            True))
+        # stops are only indexed while there is a matrix
+        o = self.stopIndex.get(origin.key)
+        d = self.stopIndex.get(destination.key)
+        if o != None and d != None:
+            return self.distanceMatrix.item(o, d)
+        return self.query(DISTANCE, origin.link, origin.pos,
+                          destination.link, destination.pos)
 
     def getDistanceLong(self, oLink, oPos, dLink, dPos):
         """ return the distance between two stops provided as link/pos
         (string, string, string, string) -> float"""
-        return float(traci.simulation.getDistanceRoad(
-            oLink, oPos,
-            dLink, dPos,
-            True))
+        o = self.getStopIndex(oLink, oPos)
+        d = self.getStopIndex(dLink, dPos)
+        if o != None and d != None:
+            return self.distanceMatrix.item(o, d)
+        return self.query(DISTANCE, oLink, oPos, dLink, dPos)
 
     def getTime(self, origin, destination):
         """ return travel time between two stops, based on speed limits 
         (Stop, Stop) -> float"""
-        return traci.simulation.getDistanceTime(
-            origin.link, origin.pos,
-            destination.link, destination.pos)
+        # stops are only indexed while there is a matrix
+        o = self.stopIndex.get(origin.key)
+        d = self.stopIndex.get(destination.key)
+        if o != None and d != None:
+            return self.timeMatrix.item(o, d)
+        return self.query(TIME, origin.link, origin.pos,
+                          destination.link, destination.pos)
 
 network = Network()
         
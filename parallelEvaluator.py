@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+@file    parallelEvaluator.py
+@author  Nicole Ronald
+@date    2014-03-17
+@version
+
+Evaluates the insertion of a request into each vehicle's plan on a pool of
+worker processes. Workers have no TraCI connection: each receives a
+snapshot of a vehicle's plan, and travel times come from the network's
+stop matrix (shared once per worker) plus legs computed by the dispatcher.
+
+SUMOoD (SUMO on Demand); see http://imod-au.info/sumood
+Copyright (C) 2014 iMoD
+SUMO, Simulation of Urban MObility; see http://sumo.sourceforge.net/
+Copyright (C) 2008-2012 DLR (http://www.dlr.de/) and contributors
+All rights reserved
+"""
+
+
+import multiprocessing
+from stop import Stop, StopType, LINKS
+from peopleCollection import PeopleCollection, peopleCollection
+from network import network, Network
+from schedule import Schedule, INFPENALTY
+
+# travel time table shared with the worker processes
+stopIndex = {}
+timeMatrix = None
+
+
+def initWorker(index, matrix):
+    """ store the travel time table in a worker process
+    ({(string, float): int}, numpy.ndarray)"""
+    global stopIndex, timeMatrix
+    stopIndex = index
+    timeMatrix = matrix
+
+
+def evaluateSnapshot(snapshot):
+    """ return (pickup position, dropoff position, penalty) for a snapshot,
+    as Vehicle.calcTentativeItineraryPenalty
+    (dict) -> (int, int, float)"""
+    schedule = SnapshotSchedule(snapshot)
+    (puPosition, doPosition, penalty) = \
+        schedule.bestInsertion(snapshot["pu"], snapshot["do"])
+    if penalty < INFPENALTY:
+        # -1 due to the current position at the start of the plan
+        return (puPosition - 1, doPosition - 1, penalty)
+    return (None, None, INFPENALTY)
+
+
+class SnapshotSchedule(Schedule):
+    """ schedule of a snapshot, using only the shared travel time table,
+    the legs in the snapshot and the people in the snapshot """
+
+    def __init__(self, snapshot):
+        self.legs = snapshot["legs"]
+        self.people = snapshot["people"]
+        Schedule.__init__(self, snapshot["plan"], snapshot["step"],
+                          snapshot["countPassengers"], snapshot["capacity"],
+                          snapshot["end"])
+
+    def travelTime(self, origin, destination):
+        """ return travel time between two stops, truncated to seconds
+        (Stop, Stop) -> int"""
+        key = (origin.link, origin.pos, destination.link, destination.pos)
+        if key in self.legs:
+            return self.legs[key]
+        return int(float(timeMatrix[stopIndex[(origin.link, origin.pos)],
+                                    stopIndex[(destination.link,
+                                               destination.pos)]]))
+
+    def stopPenalty(self, stop, time):
+        """ return penalty incurred at a stop reached at a time, as
+        Person.estimatePenalty
+        (Stop, int) -> float"""
+        if stop.stopType == StopType.DROPOFF:
+            (callTime, directTime) = self.people[stop.personID]
+            return (time - callTime)/float(directTime)
+        return 0.0
+
+    def penaltyRate(self, stop):
+        """ return increase of penalty per second a stop is delayed
+        (Stop) -> float"""
+        if stop.stopType == StopType.DROPOFF:
+            return 1.0 / self.people[stop.personID][1]
+        return 0.0
+
+
+class ParallelEvaluator:
+    """ evaluates the vehicles of a fleet in parallel; results are returned
+    in the order of the vehicles, so reducing them gives the same vehicle
+    and positions (ties included) as the serial evaluation """
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.pool = None
+
+    def start(self):
+        """ start the worker pool, sharing the current stop matrix; its
+        index is keyed by link names, as link ids are numbered per process """
+        index = dict(((LINKS[linkID], pos), i) for ((linkID, pos), i)
+                     in network.stopIndex.iteritems())
+        self.pool = multiprocessing.Pool(self.workers, initWorker,
+                                         (index, network.timeMatrix))
+
+    def close(self):
+        """ stop the worker pool """
+        if self.pool != None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def snapshot(self, vehicle, puStop, doStop, step):
+        """ return a snapshot of a vehicle's plan with the legs and people
+        a worker needs to evaluate inserting a pickup and dropoff
+        (Vehicle, Stop, Stop, int) -> dict"""
+        plan = [vehicle.getCurrentPos()] + vehicle.plan
+        legs = {}
+        pairs = [(puStop, doStop)]
+        for k in range(0, len(plan)):
+            if k > 0:
+                pairs.append((plan[k-1], plan[k]))
+                pairs.append((puStop, plan[k]))
+                pairs.append((doStop, plan[k]))
+            pairs.append((plan[k], puStop))
+            pairs.append((plan[k], doStop))
+        for (o, d) in pairs:
+            if network.getIndex(o) == None or \
+               network.getIndex(d) == None:
+                legs[(o.link, o.pos, d.link, d.pos)] = \
+                    int(network.getTime(o, d))
+        people = {}
+        for s in plan + [doStop]:
+            if s.stopType == StopType.DROPOFF:
+                people[s.personID] = \
+                    (peopleCollection.getCallTime(s.personID),
+                     peopleCollection.getDirectTime(s.personID))
+        return {"plan": plan, "step": step,
+                "countPassengers": vehicle.countPassengers,
+                "capacity": vehicle.capacity, "end": vehicle.end,
+                "legs": legs, "people": people, "pu": puStop, "do": doStop}
+
+    def evaluate(self, vehicles, puStop, doStop, step):
+        """ return (pickup position, dropoff position, penalty) for each
+        vehicle, as Vehicle.calcTentativeItineraryPenalty would
+        (Vehicle[], Stop, Stop, int) -> (int, int, float)[]"""
+        if self.pool == None:
+            self.start()
+        snapshots = [self.snapshot(veh, puStop, doStop, step)
+                     for veh in vehicles]
+        return self.pool.map(evaluateSnapshot, snapshots)
@@ -18,7 +18,124 @@ All rights reserved
 
 from person import Person
 from stop import Stop, StopType
-import csv
+import csv, heapq, tempfile
+from itertools import islice
+
+SORT_CHUNK = 100000 # rows sorted in memory at a time by sortRequestFile
+FLUSH_INTERVAL = 300 # steps between flushes of streamed output
+PERSON_COLUMNS = ["personID","callTime","requestTime","directDistance",
+                  "actualDistance","directTime","waitTime","pickupTime",
+                  "travelTime", "dropoffTime", "excessTravelTime",
+                  "excessTime", "excessDistance","state"]
+
+
+def readRequests(fileName):
+    """ yield people from a request file, in the order of the file
+    format: 
+    id, callTime, requestTime, originLink, originPos, destLink, destPos
+    (string) -> iterator of Person"""
+    with open(fileName, 'rb') as pFile:
+        persons = csv.reader(pFile, delimiter=',')
+        for row in persons:
+            assert len(row) == 7
+            i = row[0]
+            entry = int(row[1])
+            request = int(row[2])
+            originLink = row[3]
+            originPos = float(row[4])
+            destLink = row[5]
+            destPos = float(row[6])
+
+            p = Person(i)
+            p.setCallTime(entry)
+            p.setRequestTime(request)
+            p.setOD(Stop(i, originLink, originPos, StopType.PICKUP,
+                         request),
+                    Stop(i, destLink, destPos, StopType.DROPOFF))
+            yield p
+
+
+def readStops(fileName):
+    """ return the distinct origin and destination stops of a request file,
+    without keeping its people
+    (string) -> Stop[]"""
+    stops = {}
+    for p in readRequests(fileName):
+        for s in (p.getOrigin(), p.getDestination()):
+            if s.key not in stops:
+                stops[s.key] = s
+    return stops.values()
+
+
+def isSorted(fileName):
+    """ return whether a request file is sorted by call time
+    (string) -> bool"""
+    with open(fileName, 'rb') as pFile:
+        last = None
+        for row in csv.reader(pFile, delimiter=','):
+            callTime = int(row[1])
+            if last != None and callTime < last:
+                return False
+            last = callTime
+    return True
+
+
+def sortRequestFile(fileName, sortedName, chunkSize=SORT_CHUNK):
+    """ write a request file sorted by call time, people with the same call
+    time in the order of the file; sorted chunks of chunkSize rows are
+    merged, so the file need not fit in memory
+    (string, string, int)"""
+    chunks = []
+    with open(fileName, 'rb') as pFile:
+        reader = csv.reader(pFile, delimiter=',')
+        while True:
+            rows = list(islice(reader, chunkSize))
+            if len(rows) == 0:
+                break
+            rows.sort(key=lambda row: int(row[1])) # stable
+            chunk = tempfile.TemporaryFile()
+            csv.writer(chunk, delimiter=',').writerows(rows)
+            chunk.seek(0)
+            chunks.append(chunk)
+
+    def keyed(chunk, c):
+        for (r, row) in enumerate(csv.reader(chunk, delimiter=',')):
+            yield (int(row[1]), c, r, row)
+
+    with open(sortedName, 'wb') as sortedFile:
+        writer = csv.writer(sortedFile, delimiter=',')
+        for entry in heapq.merge(*[keyed(chunk, c)
+                                   for (c, chunk) in enumerate(chunks)]):
+            writer.writerow(entry[3])
+    for chunk in chunks:
+        chunk.close()
+
+
+def makePerson(row, stops):
+    """ return a person from a row of the request cache, with the direct
+    metrics of the row; see requestCache.py
+    ((string, int, int, int, int, float, float), (string, float)[])
+    -> Person"""
+    (i, entry, request, origin, destination, directDistance,
+     directTime) = row
+    (originLink, originPos) = stops[origin]
+    (destLink, destPos) = stops[destination]
+    p = Person(i)
+    p.setCallTime(entry)
+    p.setRequestTime(request)
+    p.setOD(Stop(i, originLink, originPos, StopType.PICKUP, request),
+            Stop(i, destLink, destPos, StopType.DROPOFF))
+    p.directDistance = directDistance
+    p.directTime = directTime
+    return p
+
+
+def getCachedStops(stops):
+    """ return the stops of the request cache, for the matrix
+    (numpy.ndarray) -> Stop[]"""
+    return [Stop(-1, link, pos, StopType.PICKUP)
+            for (link, pos) in stops.tolist()]
+
 
 class PeopleCollection:
     """ a collection of persons """
@@ -26,32 +143,100 @@ class PeopleCollection:
 
     def __init__(self):
         self.people = {}
+        self.outputFile = None # streamed output, see openOutput
+        self.writer = None
+        self.finished = [] # people to write and drop at the next eviction
+        self.table = None # ResultTable written instead of CSV, if any
+
+    def reset(self):
+        """ remove all people, before another run """
+        self.people = {}
+        self.closeOutput()
+        self.finished = []
+        self.table = None
+
+    def openOutput(self, folder="./", code="0",
+                   flushInterval=FLUSH_INTERVAL):
+        """ write people to *-person.out.csv once they have arrived or been
+        rejected, dropping them from the collection, rather than all at
+        the end of the run; see evictFinished
+        (string, string, int)"""
+        self.closeOutput()
+        self.writer = self.openWriter(folder, code)
+        self.flushInterval = flushInterval
+        self.lastFlush = 0
+        self.evicted = 0
+
+    def openWriter(self, folder, code):
+        """ return the table if set, otherwise a CSV writer of
+        *-person.out.csv with its header written
+        (string, string) -> csv.writer"""
+        if self.table != None:
+            return self.table
+        self.outputFile = open(folder + code + '-person.out.csv', 'wb')
+        writer = csv.writer(self.outputFile, delimiter=',')
+        writer.writerow(PERSON_COLUMNS)
+        return writer
+
+    def closeOutput(self):
+        """ close the output, if any """
+        if self.outputFile != None:
+            self.outputFile.close()
+            self.outputFile = None
+        self.writer = None
+
+    def finish(self, personID):
+        """ mark a person as finished, to be written and dropped at the next
+        eviction if output is streamed
+        (string)"""
+        if self.writer != None:
+            self.finished.append(personID)
+
+    def evictFinished(self, step):
+        """ write and drop the people finished since the last eviction, and
+        flush the output once per flush interval
+        (int)"""
+        if self.writer == None:
+            return
+        for personID in self.finished:
+            self.writer.writerow(self.people.pop(personID).getOutput())
+        self.evicted += len(self.finished)
+        self.finished = []
+        if step - self.lastFlush >= self.flushInterval and \
+           self.outputFile != None:
+            self.outputFile.flush()
+            self.lastFlush = step
 
     def readFile(self, fileName):
-        """ read people from a file
-        format: 
-        id, callTime, requestTime, originLink, originPos, destLink, destPos
+        """ read people from a file, see readRequests
         (string)"""
-        with open(fileName, 'rb') as pFile:
-            persons = csv.reader(pFile, delimiter=',')
-            for row in persons:
-                assert len(row) == 7
-                i = row[0]
-                entry = int(row[1])
-                request = int(row[2])
-                originLink = row[3]
-                originPos = float(row[4])
-                destLink = row[5]
-                destPos = float(row[6])
-
-                p = Person(i)
-                p.setCallTime(entry)
-                p.setRequestTime(request)
-                p.setOD(Stop(i, originLink, originPos, StopType.PICKUP,
-                             request),
-                        Stop(i, destLink, destPos, StopType.DROPOFF))
-                self.addPerson(p)
-    
+        for p in readRequests(fileName):
+            self.addPerson(p)
+
+    def readCache(self, people, stops):
+        """ add the people of a request cache entry, in the order of their
+        request file
+        (numpy.ndarray, numpy.ndarray)"""
+        stops = stops.tolist()
+        for row in people.tolist():
+            self.addPerson(makePerson(row, stops))
+
+    def streamCache(self, people, stops):
+        """ yield the people of a request cache entry by call time, adding
+        each as it is made; the entry stays memory-mapped
+        (numpy.ndarray, numpy.ndarray) -> iterator of Person"""
+        stops = stops.tolist()
+        for r in people["callTime"].argsort(kind="mergesort"):
+            p = makePerson(people[r].tolist(), stops)
+            self.addPerson(p)
+            yield p
+
+    def streamFile(self, fileName):
+        """ yield people from a file, adding each as it is read
+        (string) -> iterator of Person"""
+        for p in readRequests(fileName):
+            self.addPerson(p)
+            yield p
 
     def addPerson(self, person):
         """ add a person to the collection
@@ -67,6 +252,13 @@ class PeopleCollection:
         """ set a person's dropoff time 
         (string, int)"""
         self.people[personID].setDropoffTime(time)
+        self.finish(personID)
+
+    def rejectPerson(self, personID):
+        """ set a person as unsuccessful
+        (string)"""
+        self.people[personID].rejected()
+        self.finish(personID)
 
     def incrementPersonDistance(self, personID, distance):
         """ increment the distance travelled by a person by the distance
@@ -79,22 +271,33 @@ class PeopleCollection:
         (string) -> int"""
         return self.people[personID].travelTime
 
+    def getCallTime(self, personID):
+        """ return call time of a person
+        (string) -> int"""
+        return self.people[personID].callTime
+
+    def getDirectTime(self, personID):
+        """ return direct travel time of a person
+        (string) -> float"""
+        return self.people[personID].directTime
+
     def output(self, folder="./", code="0"):
-        """ print details for all people, to *-person.out.csv in an optionally
-        specified folder with an optionally specified run code
+        """ print details for all people, to *-person.out.csv (or the table,
+        if set) in an optionally specified folder with an optionally
+        specified run code; if output is streamed, the people not yet
+        written are added to it
         (string ,string)"""
-        with open(folder + code + '-person.out.csv', 'wb') \
-            as csvfile:
-            peopleWriter = csv.writer(csvfile,
-                                      delimiter=',')
-            peopleWriter.writerow(\
-                ["personID","callTime","requestTime","directDistance",\
-                 "actualDistance","directTime","waitTime","pickupTime",\
-                 "travelTime", "dropoffTime", "excessTravelTime", \
-                 "excessTime", "excessDistance","state"])
-        
-            for p in self.people.values():
-                peopleWriter.writerow(p.getOutput())
+        streamed = self.writer != None
+        if streamed:
+            self.evictFinished(self.lastFlush)
+        else:
+            self.writer = self.openWriter(folder, code)
+        for p in self.people.values():
+            self.writer.writerow(p.getOutput())
+        self.closeOutput()
+        if streamed:
+            print "People: %d written as they finished, %d at the end" % \
+                  (self.evicted, len(self.people))
 
     def getList(self):
         """ return a list of people 
@@ -104,6 +307,15 @@ class PeopleCollection:
             persons.append(p)
         return persons
 
+    def getStops(self):
+        """ return the origin and destination stops of all people
+        () -> Stop[]"""
+        stops = []
+        for p in self.people.values():
+            stops.append(p.getOrigin())
+            stops.append(p.getDestination())
+        return stops
+
     def estimatePenalty(self, personID, dropoffTime):
         """ estimate penalty for a person at an estimated dropoff time """
         return self.people[personID].estimatePenalty(dropoffTime)
@@ -78,12 +78,17 @@ class Person:
         self.state = PersonState.ARRIVED
 
     def setOD(self, origin, destination):
-        """ set origin and destination stops
+        """ set origin and destination stops; the direct distance and time
+        are calculated once the person is released, see setDirectMetrics
         (Stop, Stop)"""
         self.origin = origin
         self.destination = destination
-        self.setDirectDistance() # calculate direct distance
-        self.setDirectTime() # calculate direct time
+
+    def setDirectMetrics(self):
+        """ calculate direct distance and time, unless already done """
+        if self.directTime == -1:
+            self.setDirectDistance() # calculate direct distance
+            self.setDirectTime() # calculate direct time
 
     def getOrigin(self):
         """ return origin
@@ -133,6 +138,7 @@ class Person:
 
     def getOutput(self):
         """ print details of a person """
+        self.setDirectMetrics() # if never released
         excessTime = ""
         excessDistance = ""
         excessTravelTime = ""
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+@file    profiler.py
+@author  Nicole Ronald
+@date    2014-03-17
+@version
+
+Defines an opt-in profiler that counts and times TraCI calls by command and
+the phases of each simulation step, written as a per-step CSV and an
+end-of-run summary.
+
+SUMOoD (SUMO on Demand); see http://imod-au.info/sumood
+Copyright (C) 2014 iMoD
+SUMO, Simulation of Urban MObility; see http://sumo.sourceforge.net/
+Copyright (C) 2008-2012 DLR (http://www.dlr.de/) and contributors
+All rights reserved
+"""
+
+
+import csv, time, types
+import traci
+from commandBuffer import commandBuffer, COMMAND_NAMES
+
+# phases of a step, in the order of drt.doStep
+PHASES = ["commands", "simulationStep", "departures", "vehicleUpdates",
+          "arrivals", "release", "dispatch", "output"]
+# TraCI modules whose functions are timed, by prefix of the command name
+DOMAINS = ["vehicle", "simulation", "lane"]
+FUNCTION_TYPES = (types.FunctionType, types.MethodType,
+                  types.BuiltinFunctionType)
+
+
+class Profiler:
+    """ times TraCI calls and step phases while enabled; the marks in
+    drt.doStep return at once when it is not. A TraCI call made by another,
+    such as _sendExact by setStop, is counted with the outer call only, so
+    that calls add up to the time spent in TraCI. A batch of buffered
+    commands is counted as the vehicle commands it carries, which share its
+    time """
+
+    def __init__(self):
+        self.enabled = False
+        self.originals = [] # (module, name, function) replaced by wrappers
+        self.stepsFile = None
+        self.reset()
+
+    def reset(self):
+        """ clear the counts of the last run """
+        self.calls = {} # command -> [calls, seconds]
+        self.phases = {} # phase -> seconds, including setup and output
+        self.steps = 0
+        self.stepPhases = {} # phase -> seconds, of the current step
+        self.depth = 0 # nesting of TraCI calls
+        self.runStart = self.last = time.time()
+        self.runSeconds = 0.0
+
+    def wrap(self, name, function):
+        """ return a function timing calls to a TraCI function
+        (string, function) -> function"""
+        counts = self.calls.setdefault(name, [0, 0.0])
+
+        def timed(*args, **kwargs):
+            if self.depth > 0:
+                return function(*args, **kwargs)
+            self.depth += 1
+            start = time.time()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                counts[0] += 1
+                counts[1] += time.time() - start
+                self.depth -= 1
+        return timed
+
+    def wrapBatch(self, function):
+        """ return a function timing CommandBuffer.sendBatch, charging each
+        command of a batch to its kind
+        (function) -> function"""
+
+        def timed(commands):
+            if self.depth > 0:
+                return function(commands)
+            self.depth += 1
+            start = time.time()
+            try:
+                return function(commands)
+            finally:
+                share = (time.time() - start) / max(len(commands), 1)
+                for (vehicleID, kind, args) in commands:
+                    counts = self.calls.setdefault(
+                        "vehicle." + COMMAND_NAMES[kind], [0, 0.0])
+                    counts[0] += 1
+                    counts[1] += share
+                self.depth -= 1
+        return timed
+
+    def instrument(self):
+        """ replace the TraCI functions, and the sending of batches of
+        commands, by timing wrappers """
+        targets = [(traci, "simulationStep", "simulationStep")]
+        for domain in DOMAINS:
+            module = getattr(traci, domain)
+            for name in dir(module):
+                if not name.startswith("_") and \
+                   isinstance(getattr(module, name), FUNCTION_TYPES):
+                    targets.append((module, name, domain + "." + name))
+        for (module, name, command) in targets:
+            function = getattr(module, name, None)
+            if function != None:
+                self.originals.append((module, name, function))
+                setattr(module, name, self.wrap(command, function))
+        self.originals.append((commandBuffer, "sendBatch",
+                               commandBuffer.sendBatch))
+        commandBuffer.sendBatch = self.wrapBatch(commandBuffer.sendBatch)
+
+    def restore(self):
+        """ put back the TraCI functions """
+        for (module, name, function) in self.originals:
+            setattr(module, name, function)
+        self.originals = []
+
+    def start(self, stepsFile):
+        """ enable profiling for a run, writing step timings to a file
+        (string)"""
+        self.reset()
+        self.enabled = True
+        self.instrument()
+        self.stepsFile = open(stepsFile, 'wb')
+        self.writer = csv.writer(self.stepsFile, delimiter=',')
+        self.writer.writerow(["step", "seconds"] + PHASES +
+                             ["traciCalls", "traciSeconds"])
+
+    def stop(self):
+        """ disable profiling at the end of a run """
+        if not self.enabled:
+            return
+        self.runSeconds = time.time() - self.runStart
+        self.enabled = False
+        self.restore()
+        self.stepsFile.close()
+        self.stepsFile = None
+
+    def getTraciTotals(self):
+        """ return the number of TraCI calls so far and their time
+        () -> (int, float)"""
+        calls = 0
+        seconds = 0.0
+        for (n, s) in self.calls.itervalues():
+            calls += n
+            seconds += s
+        return (calls, seconds)
+
+    def beginStep(self, step):
+        """ start timing a step
+        (int)"""
+        if not self.enabled:
+            return
+        self.step = step
+        self.stepPhases = {}
+        self.stepTraci = self.getTraciTotals()
+        self.stepStart = self.last = time.time()
+
+    def mark(self, phase):
+        """ charge the time since the last mark to a phase
+        (string)"""
+        if not self.enabled:
+            return
+        now = time.time()
+        seconds = now - self.last
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+        self.stepPhases[phase] = self.stepPhases.get(phase, 0.0) + seconds
+        self.last = now
+
+    def endStep(self):
+        """ write the timings of the step """
+        if not self.enabled:
+            return
+        self.steps += 1
+        (calls, seconds) = self.getTraciTotals()
+        self.writer.writerow([self.step,
+                              "%.6f" % (self.last - self.stepStart)] +
+                             ["%.6f" % self.stepPhases.get(p, 0.0)
+                              for p in PHASES] +
+                             [calls - self.stepTraci[0],
+                              "%.6f" % (seconds - self.stepTraci[1])])
+
+    def output(self, folder, code):
+        """ print the run's time by phase and TraCI command, to
+        *-profile.out.csv in an optionally specified folder
+        (string, string)"""
+        with open(folder + code + '-profile.out.csv', 'wb') as csvfile:
+            writer = csv.writer(csvfile, delimiter=',')
+            writer.writerow(["kind", "name", "calls", "seconds", "meanMs",
+                             "share"])
+            total = max(self.runSeconds, 1e-9)
+            for phase in sorted(self.phases, key=self.phases.get,
+                                reverse=True):
+                seconds = self.phases[phase]
+                writer.writerow(["phase", phase, "", "%.6f" % seconds, "",
+                                 "%.4f" % (seconds / total)])
+            other = self.runSeconds - sum(self.phases.itervalues())
+            writer.writerow(["phase", "other", "", "%.6f" % other, "",
+                             "%.4f" % (other / total)])
+            for command in sorted(self.calls, key=lambda c: self.calls[c][1],
+                                  reverse=True):
+                (calls, seconds) = self.calls[command]
+                if calls == 0:
+                    continue
+                writer.writerow(["traci", command, calls, "%.6f" % seconds,
+                                 "%.4f" % (seconds / calls * 1000),
+                                 "%.4f" % (seconds / total)])
+            writer.writerow(["run", "total", self.steps,
+                             "%.6f" % self.runSeconds, "", "1.0000"])
+
+    def printStats(self):
+        """ print where the run's time went """
+        (calls, seconds) = self.getTraciTotals()
+        print "Profile: %.2fs in %d steps, %d TraCI calls taking %.2fs" % \
+              (self.runSeconds, self.steps, calls, seconds)
+        for phase in PHASES:
+            print "  %-15s %8.3fs" % (phase, self.phases.get(phase, 0.0))
+
+profiler = Profiler()
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+@file    requestCache.py
+@author  Nicole Ronald
+@date    2014-03-17
+@version
+
+Defines a cache of preprocessed request files: the people of a request file
+with their direct distance and time, as NumPy structured arrays that are
+memory-mapped when loaded. Entries are keyed by a hash of the request file,
+the network file and the simulator computing the direct metrics, so they
+are rebuilt whenever any of them changes.
+
+python requestCache.py [options] <request-file> [<request-file> ...]
+
+SUMOoD (SUMO on Demand); see http://imod-au.info/sumood
+Copyright (C) 2014 iMoD
+SUMO, Simulation of Urban MObility; see http://sumo.sourceforge.net/
+Copyright (C) 2008-2012 DLR (http://www.dlr.de/) and contributors
+All rights reserved
+"""
+
+
+import sys, os, hashlib
+from optparse import OptionParser
+
+if __name__ == "__main__" and "--meso" in sys.argv:
+    # run on the pure-Python stand-in instead of SUMO
+    import mesoTraci
+    mesoTraci.install()
+import traci
+from peopleCollection import readRequests
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+CACHE_FOLDER = "./output/requests/"
+HASH_BLOCK = 1 << 20 # bytes hashed at a time
+
+
+def hashFiles(fileNames, extra=""):
+    """ return a hex digest of the contents of files and a string
+    (string[], string) -> string"""
+    digest = hashlib.sha1(extra)
+    for fileName in fileNames:
+        with open(fileName, 'rb') as f:
+            block = f.read(HASH_BLOCK)
+            while block:
+                digest.update(block)
+                block = f.read(HASH_BLOCK)
+    return digest.hexdigest()
+
+
+class RequestCache:
+    """ preprocessed request files in a folder; an entry is two arrays,
+    people (in the order of the request file) and their stops """
+
+    def __init__(self, folder=CACHE_FOLDER):
+        self.folder = folder
+        self.hits = 0
+        self.builds = 0
+
+    def getBackend(self):
+        """ return the simulator direct metrics come from, as they may
+        differ between SUMO and the stand-in
+        () -> string"""
+        if getattr(traci, "inProcess", False):
+            return "meso"
+        return "sumo"
+
+    def getPrefix(self, requestFile, netFile):
+        """ return the file name prefix of the entry for a request file
+        (string, string) -> string"""
+        key = hashFiles([requestFile, netFile], self.getBackend())
+        name = os.path.splitext(os.path.basename(requestFile))[0]
+        return os.path.join(self.folder, "%s-%s" % (name, key[:16]))
+
+    def load(self, requestFile, netFile):
+        """ return the memory-mapped people and stops of a request file,
+        None if not cached
+        (string, string) -> (numpy.ndarray, numpy.ndarray)"""
+        if numpy is None:
+            return None
+        prefix = self.getPrefix(requestFile, netFile)
+        if not os.path.exists(prefix + ".people.npy") or \
+           not os.path.exists(prefix + ".stops.npy"):
+            return None
+        self.hits += 1
+        return self.open(prefix)
+
+    def open(self, prefix):
+        """ return the memory-mapped arrays of an entry
+        (string) -> (numpy.ndarray, numpy.ndarray)"""
+        return (numpy.load(prefix + ".people.npy", mmap_mode='r'),
+                numpy.load(prefix + ".stops.npy", mmap_mode='r'))
+
+    def build(self, requestFile, netFile):
+        """ read a request file, computing direct metrics through the
+        network (from its matrix, if built for the file's stops), write its
+        entry and return it as load does; None if NumPy is not available
+        (string, string) -> (numpy.ndarray, numpy.ndarray)"""
+        if numpy is None:
+            print "numpy not available, request cache disabled"
+            return None
+        stopIndex = {}
+        rows = []
+        for p in readRequests(requestFile):
+            p.setDirectMetrics()
+            for s in (p.getOrigin(), p.getDestination()):
+                if s.key not in stopIndex:
+                    stopIndex[s.key] = (len(stopIndex), s.link, s.pos)
+            rows.append((p.personID, p.callTime, p.requestTime,
+                         stopIndex[p.getOrigin().key][0],
+                         stopIndex[p.getDestination().key][0],
+                         p.directDistance, p.directTime))
+        stops = sorted(stopIndex.itervalues())
+        people = numpy.array(rows, dtype=[
+            ("id", "S%d" % max([1] + [len(r[0]) for r in rows])),
+            ("callTime", "i4"), ("requestTime", "i4"),
+            ("origin", "i4"), ("destination", "i4"),
+            ("directDistance", "f8"), ("directTime", "f8")])
+        stopArray = numpy.array([(link, pos) for (i, link, pos) in stops],
+                                dtype=[("link", "S%d" % max(
+                                    [1] + [len(s[1]) for s in stops])),
+                                       ("pos", "f8")])
+        if not os.path.isdir(self.folder):
+            os.makedirs(self.folder)
+        prefix = self.getPrefix(requestFile, netFile)
+        # written under temporary names, so that a partial entry is never
+        # taken for a fresh one, even with runs building it in parallel
+        for (suffix, array) in ((".stops.npy", stopArray),
+                                (".people.npy", people)):
+            temporary = "%s%s.%d.tmp" % (prefix, suffix, os.getpid())
+            with open(temporary, 'wb') as f:
+                numpy.save(f, array)
+            os.rename(temporary, prefix + suffix)
+        self.builds += 1
+        print "Request cache built for", requestFile, "-", len(rows), \
+              "people,", len(stops), "stops"
+        return self.open(prefix)
+
+    def printStats(self):
+        """ print how many request files were loaded and built """
+        print "Request cache: %d loaded, %d built" % (self.hits, self.builds)
+
+requestCache = RequestCache()
+
+
+if __name__ == "__main__":
+
+    from network import network
+    from simulationContext import Simulation
+
+    parser = OptionParser(usage="%prog [options] <request-file> "
+                          "[<request-file> ...]")
+    parser.add_option("--sumo-config", dest="sumoConfig",
+                      default="./SampleInput/SUMO/grid.sumocfg",
+                      help="SUMO configuration with the network "
+                      "[default: %default]")
+    parser.add_option("--cache", default=CACHE_FOLDER,
+                      help="cache folder [default: %default]")
+    parser.add_option("--port", type="int", default=8813,
+                      help="TraCI port [default: %default]")
+    parser.add_option("--meso", action="store_true", default=False,
+                      help="compute direct metrics with the mesoscopic "
+                      "stand-in, for runs with --meso")
+    (options, args) = parser.parse_args()
+    if len(args) == 0:
+        parser.error("request file required")
+
+    requestCache.folder = options.cache
+    simulation = Simulation(options.port)
+    simulation.load(options.sumoConfig)
+    # people sharing an origin and destination are queried once
+    network.enableCache(100000)
+    for requestFile in args:
+        if requestCache.load(requestFile, simulation.netFile) != None:
+            print requestFile, "is cached"
+            continue
+        requestCache.build(requestFile, simulation.netFile)
+    simulation.close()
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+@file    requestGenerator.py
+@author  Nicole Ronald
+@date    2014-03-17
+@version
+
+Generates synthetic request files in the format read by
+PeopleCollection.readFile, with origins and destinations on the links of a
+SUMO network and call times spread uniformly over the simulated period.
+
+python requestGenerator.py [options] <net-file> <requests> <output-file>
+
+SUMOoD (SUMO on Demand); see http://imod-au.info/sumood
+Copyright (C) 2014 iMoD
+SUMO, Simulation of Urban MObility; see http://sumo.sourceforge.net/
+Copyright (C) 2008-2012 DLR (http://www.dlr.de/) and contributors
+All rights reserved
+"""
+
+
+import csv, random
+from optparse import OptionParser
+from xml.etree import cElementTree
+from mesoTraci import MesoNetwork
+
+DEPOT_NODE = "depot"
+FIRST_CALL = 60 # vehicles depart at 60, see taxiN.rou.xml
+LAST_CALL = 3600 # the simulation ends at 3660
+ORIGIN_POS = 130 # positions of the fixed layout, as in scenarios 1a, 1b, 2
+DEST_POS = 30
+MARGIN = 30 # random positions keep this far (m) from both ends of a link
+DEMAND = {"S": 20, "M": 40, "L": 60} # requests per config of the samples
+
+
+def readLinks(netFile):
+    """ return the links of a network that requests may use: all but
+    internal links and those to and from the depot, with their lengths
+    (string) -> {string: float}"""
+    links = {}
+    for event, element in cElementTree.iterparse(netFile):
+        if element.tag == "edge":
+            if element.get("function") != "internal" and \
+               DEPOT_NODE not in (element.get("from"), element.get("to")):
+                lane = element.find("lane")
+                links[element.get("id")] = float(lane.get("length"))
+            element.clear()
+    return links
+
+
+class RequestGenerator:
+    """ draws requests between reachable links of a network; a seed gives
+    the same requests on every run """
+
+    def __init__(self, netFile, seed=None, randomPos=False):
+        self.links = readLinks(netFile)
+        self.linkIDs = sorted(self.links)
+        self.network = MesoNetwork(netFile)
+        self.random = random.Random(seed)
+        self.randomPos = randomPos # as in scenario 1c
+
+    def getPos(self, link, pos):
+        """ return a position on a link, the given one unless positions are
+        random, kept clear of the link's ends
+        (string, float) -> int"""
+        length = int(self.links[link])
+        if self.randomPos:
+            return self.random.randint(MARGIN, length - MARGIN)
+        return max(MARGIN, min(pos, length - MARGIN))
+
+    def getOD(self):
+        """ return a random origin and destination link, different and
+        connected
+        () -> (string, string)"""
+        while True:
+            origin = self.random.choice(self.linkIDs)
+            dest = self.random.choice(self.linkIDs)
+            if origin != dest and \
+               self.network.getRoute(origin, dest) != None:
+                return (origin, dest)
+
+    def generate(self, count, firstCall=FIRST_CALL, lastCall=LAST_CALL):
+        """ return rows of requests, ordered by id, with call times drawn
+        uniformly from [firstCall, lastCall]; requests are for immediate
+        service, so the request time is the call time
+        (int, int, int) -> list[]"""
+        rows = []
+        for i in range(1, count + 1):
+            callTime = self.random.randint(firstCall, lastCall)
+            (origin, dest) = self.getOD()
+            rows.append([i, callTime, callTime,
+                         origin, self.getPos(origin, ORIGIN_POS),
+                         dest, self.getPos(dest, DEST_POS)])
+        return rows
+
+    def write(self, filename, count, firstCall=FIRST_CALL,
+              lastCall=LAST_CALL):
+        """ write a request file
+        (string, int, int, int)"""
+        with open(filename, 'wb') as csvfile:
+            writer = csv.writer(csvfile, delimiter=',')
+            writer.writerows(self.generate(count, firstCall, lastCall))
+
+
+if __name__ == "__main__":
+
+    parser = OptionParser(usage="%prog [options] <net-file> <requests> "
+                          "<output-file>")
+    parser.add_option("--seed", type="int", help="random seed")
+    parser.add_option("--random-pos", dest="randomPos", action="store_true",
+                      default=False,
+                      help="random positions on the links, as in scenario 1c")
+    parser.add_option("--first-call", dest="firstCall", type="int",
+                      default=FIRST_CALL,
+                      help="earliest call time [default: %default]")
+    parser.add_option("--last-call", dest="lastCall", type="int",
+                      default=LAST_CALL,
+                      help="latest call time [default: %default]")
+    (options, args) = parser.parse_args()
+    if len(args) != 3:
+        parser.error("net file, number of requests and output file required")
+    count = DEMAND.get(args[1])
+    if count == None:
+        count = int(args[1])
+    RequestGenerator(args[0], options.seed, options.randomPos).write(
+        args[2], count, options.firstCall, options.lastCall)
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+@file    requestQueue.py
+@author  Nicole Ronald
+@date    2014-03-17
+@version
+
+Defines the queue of requests waiting to be released at their call time,
+either all in memory or read from a stream sorted by call time.
+
+SUMOoD (SUMO on Demand); see http://imod-au.info/sumood
+Copyright (C) 2014 iMoD
+SUMO, Simulation of Urban MObility; see http://sumo.sourceforge.net/
+Copyright (C) 2008-2012 DLR (http://www.dlr.de/) and contributors
+All rights reserved
+"""
+
+
+import heapq
+
+
+class RequestQueue:
+    """ priority queue of people ordered by call time; people with the same
+    call time are released in the order they were added """
+
+    def __init__(self):
+        self.heap = []
+        self.count = 0
+        self.source = None # iterator of people sorted by call time
+        self.window = 0 # people read ahead from the source
+        self.lastRead = None # call time of the last person read
+
+    def setSource(self, source, window):
+        """ release people from an iterator sorted by call time, keeping
+        only window of them in the queue ahead of their call time
+        (iterator of Person, int)"""
+        self.source = source
+        self.window = max(1, window)
+        self.fill()
+
+    def fill(self):
+        """ read people from the source until the window is full """
+        while self.source != None and len(self.heap) < self.window:
+            person = next(self.source, None)
+            if person == None:
+                self.source = None
+                break
+            callTime = person.getCallTime()
+            if self.lastRead != None and callTime < self.lastRead:
+                raise ValueError("requests not sorted by call time at %s" %
+                                 person.personID)
+            self.lastRead = callTime
+            self.push(person)
+
+    def push(self, person):
+        """ add a person, to be released at their call time
+        (Person)"""
+        heapq.heappush(self.heap, (person.getCallTime(), self.count, person))
+        self.count += 1
+
+    def popDue(self, step):
+        """ remove and return all people whose call time has been reached
+        (int) -> Person[]"""
+        due = []
+        while len(self.heap) > 0 and self.heap[0][0] <= step:
+            due.append(heapq.heappop(self.heap)[2])
+            self.fill()
+        return due
+
+    def nextCallTime(self):
+        """ return call time of the next person, None if empty
+        () -> int"""
+        if len(self.heap) > 0:
+            return self.heap[0][0]
+        return None
+
+    def __len__(self):
+        return len(self.heap)
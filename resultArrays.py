@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+@file    resultArrays.py
+@author  Nicole Ronald
+@date    2014-03-17
+@version
+
+Defines the columnar output of a run: the rows of the person, vehicle and
+vehicle summary outputs kept as typed columns and saved as NumPy arrays in
+one *-results.npz file per run, and a reader giving the same columns for
+runs with either that file or the CSV outputs.
+
+SUMOoD (SUMO on Demand); see http://imod-au.info/sumood
+Copyright (C) 2014 iMoD
+SUMO, Simulation of Urban MObility; see http://sumo.sourceforge.net/
+Copyright (C) 2008-2012 DLR (http://www.dlr.de/) and contributors
+All rights reserved
+"""
+
+
+import array, csv, os
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# columns of each table, as in the CSV outputs, with their kinds: s for
+# strings, i for integers and f for floats, NaN where the CSV is empty
+TABLES = ["person", "vehicle", "summary"]
+COLUMNS = {
+    "person": [("personID", "s"), ("callTime", "f"), ("requestTime", "f"),
+               ("directDistance", "f"), ("actualDistance", "f"),
+               ("directTime", "f"), ("waitTime", "f"), ("pickupTime", "f"),
+               ("travelTime", "f"), ("dropoffTime", "f"),
+               ("excessTravelTime", "f"), ("excessTime", "f"),
+               ("excessDistance", "f"), ("state", "i")],
+    "vehicle": [("vehicleID", "s"), ("totalPassengers", "i"),
+                ("totalDistance", "f"), ("avOccupancy", "f"),
+                ("trips/VKT", "f"), ("sharedProp", "f"),
+                ("deadheadProp", "f"), ("shared", "f"), ("deadhead", "f")],
+    "summary": [("numVehicles", "i"), ("passengersCarried", "i"),
+                ("totalDistance", "f"), ("trips/VKT", "f")]}
+SUFFIXES = {"person": "-person.out.csv", "vehicle": "-vehicle.out.csv",
+            "summary": "-vehicle-summary.out.csv"}
+RESULTS_SUFFIX = "-results.npz"
+NAN = float("nan")
+
+
+def convert(value, kind):
+    """ return a CSV value, or one of an output row, as a column's kind
+    (object, string) -> object"""
+    if kind == "s":
+        return str(value)
+    if value == "" or value == None:
+        if kind == "i":
+            return -1
+        return NAN
+    if kind == "i":
+        return int(float(value))
+    return float(value)
+
+
+class ResultTable:
+    """ the rows of an output as typed columns; rows are added with
+    writerow, so that it stands in for a csv.writer """
+
+    def __init__(self, table):
+        self.columns = COLUMNS[table]
+        self.values = []
+        for (name, kind) in self.columns:
+            if kind == "s":
+                self.values.append([])
+            elif kind == "i":
+                self.values.append(array.array('l'))
+            else:
+                self.values.append(array.array('d'))
+
+    def writerow(self, row):
+        """ add an output row
+        (list)"""
+        for (values, (name, kind), value) in zip(self.values, self.columns,
+                                                 row):
+            values.append(convert(value, kind))
+
+    def __len__(self):
+        return len(self.values[0])
+
+    def getArrays(self):
+        """ return the columns as arrays by name
+        () -> {string: numpy.ndarray}"""
+        arrays = {}
+        for (values, (name, kind)) in zip(self.values, self.columns):
+            if kind == "s":
+                arrays[name] = numpy.array(values, dtype=str)
+            elif kind == "i":
+                arrays[name] = numpy.array(values, dtype=numpy.int64)
+            else:
+                arrays[name] = numpy.array(values, dtype=numpy.float64)
+        return arrays
+
+
+class RunResults:
+    """ the tables of a run, saved together """
+
+    def __init__(self):
+        self.tables = dict((table, ResultTable(table)) for table in TABLES)
+
+    def save(self, filename):
+        """ save all columns to a .npz file, named table.column
+        (string)"""
+        arrays = {}
+        for (table, results) in self.tables.iteritems():
+            for (name, values) in results.getArrays().iteritems():
+                arrays["%s.%s" % (table, name)] = values
+        # written under a temporary name, so that batch.py never takes a
+        # partial file for finished results
+        temporary = "%s.%d.tmp" % (filename, os.getpid())
+        with open(temporary, 'wb') as f:
+            numpy.savez(f, **arrays)
+        os.rename(temporary, filename)
+
+
+def readCsv(filename, table):
+    """ return the columns of a CSV output as arrays by name
+    (string, string) -> {string: numpy.ndarray}"""
+    results = ResultTable(table)
+    with open(filename, 'rb') as csvfile:
+        reader = csv.reader(csvfile, delimiter=',')
+        next(reader) # header
+        for row in reader:
+            results.writerow(row)
+    return results.getArrays()
+
+
+def loadRun(prefix):
+    """ return the tables of a run, from its .npz file if there is one,
+    otherwise from its CSV outputs, None if neither exists; prefix is the
+    output folder and run id
+    (string) -> {string: {string: numpy.ndarray}}"""
+    if os.path.exists(prefix + RESULTS_SUFFIX):
+        tables = dict((table, {}) for table in TABLES)
+        with numpy.load(prefix + RESULTS_SUFFIX) as arrays:
+            for key in arrays.files:
+                (table, name) = key.split(".", 1)
+                tables[table][name] = arrays[key]
+        return tables
+    if all(os.path.exists(prefix + SUFFIXES[table]) for table in TABLES):
+        return dict((table, readCsv(prefix + SUFFIXES[table], table))
+                    for table in TABLES)
+    return None
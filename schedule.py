@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+"""
+@file    schedule.py
+@author  Nicole Ronald
+@date    2014-03-17
+@version
+
+Defines the schedule of a vehicle's plan (arrival times, loads and
+penalties at each stop), used to evaluate insertions of new passengers.
+
+SUMOoD (SUMO on Demand); see http://imod-au.info/sumood
+Copyright (C) 2014 iMoD
+SUMO, Simulation of Urban MObility; see http://sumo.sourceforge.net/
+Copyright (C) 2008-2012 DLR (http://www.dlr.de/) and contributors
+All rights reserved
+"""
+
+
+from itertools import chain, islice
+from stop import Stop, StopType
+from peopleCollection import PeopleCollection, peopleCollection
+from network import network, Network
+
+INFPENALTY = 1000000
+TOLERANCE = 1e-6 # penalties closer than this are compared exactly
+NONLINEAR = None # delay cannot be propagated as a constant shift
+
+
+class Schedule:
+    """ schedule of a plan starting at the vehicle's current position;
+    arrival is the time a stop is reached, departure the time after waiting
+    for its service time, load the number of passengers after the stop """
+
+    def __init__(self, plan, step, countPassengers, capacity, end):
+        self.plan = plan
+        self.step = step
+        self.countPassengers = countPassengers
+        self.capacity = capacity
+        self.end = end
+        n = len(plan)
+        self.n = n
+
+        self.arrival = [step] * n
+        self.departure = [step] * n
+        self.load = [countPassengers] * n
+        self.feasible = [True] * n # all stops up to k feasible
+        self.penalty = [0.0] * n # penalty of all stops up to k
+        for k in range(1, n):
+            d = plan[k]
+            self.arrival[k] = self.departure[k-1] + \
+                              self.travelTime(plan[k-1], d)
+            self.departure[k] = self.wait(d, self.arrival[k])
+            self.load[k] = self.load[k-1]
+            if d.stopType == StopType.PICKUP:
+                self.load[k] += 1
+            elif d.stopType == StopType.DROPOFF:
+                self.load[k] -= 1
+            if self.departure[k] > self.end or self.load[k] > self.capacity:
+                # as calcItineraryPenalty, nothing past the first
+                # infeasible stop is evaluated; its times may be those of
+                # an unreachable leg
+                for m in range(k, n):
+                    self.arrival[m] = self.departure[m] = float("inf")
+                    self.feasible[m] = False
+                    self.penalty[m] = INFPENALTY
+                break
+            self.penalty[k] = self.penalty[k-1] + \
+                              self.stopPenalty(d, self.departure[k])
+
+        # suffix values over the stops k..n-2; the last stop is handled
+        # separately, as waiting there does not delay anything else
+        self.surplus = [float("inf")] * n # min (arrival - serviceTime)
+        self.maxDeparture = [float("-inf")] * n
+        self.maxLoad = [float("-inf")] * n # including last stop
+        self.suffixPenalty = [0.0] * n
+        self.rate = [0.0] * n # penalty per second of delay
+        if n > 1:
+            self.maxLoad[n-1] = self.load[n-1]
+        if not self.feasible[n-1]:
+            return # insertions are evaluated exactly, see bestInsertion
+        for k in range(n-2, 0, -1):
+            d = plan[k]
+            self.surplus[k] = self.surplus[k+1]
+            if d.serviceTime != None:
+                self.surplus[k] = min(self.surplus[k],
+                                      self.arrival[k] - d.serviceTime)
+            self.maxDeparture[k] = max(self.maxDeparture[k+1],
+                                       self.departure[k])
+            self.maxLoad[k] = max(self.maxLoad[k+1], self.load[k])
+            self.suffixPenalty[k] = self.suffixPenalty[k+1] + \
+                                    self.stopPenalty(d, self.departure[k])
+            self.rate[k] = self.rate[k+1]
+            self.rate[k] += self.penaltyRate(d)
+
+    def getPenalty(self):
+        """ return penalty of the whole plan, INFPENALTY if infeasible
+        () -> float"""
+        if not self.feasible[self.n-1]:
+            return INFPENALTY
+        return self.penalty[self.n-1]
+
+    def travelTime(self, origin, destination):
+        """ return travel time between two stops, truncated to seconds
+        (Stop, Stop) -> int"""
+        return int(network.getTime(origin, destination))
+
+    def wait(self, stop, time):
+        """ return time after waiting at stop for its service time
+        (Stop, int) -> int"""
+        if stop.serviceTime != None and time < stop.serviceTime:
+            return stop.serviceTime
+        return time
+
+    def stopPenalty(self, stop, time):
+        """ return penalty incurred at a stop reached at a time
+        (Stop, int) -> float"""
+        if stop.stopType == StopType.DROPOFF:
+            return peopleCollection.estimatePenalty(stop.personID, time)
+        return 0.0
+
+    def penaltyRate(self, stop):
+        """ return increase of penalty per second a stop is delayed
+        (Stop) -> float"""
+        if stop.stopType == StopType.DROPOFF:
+            return 1.0 / peopleCollection.getDirectTime(stop.personID)
+        return 0.0
+
+    def suffix(self, k, delay):
+        """ return penalty of the plan from stop k onwards when stop k is
+        reached delay seconds later than scheduled, INFPENALTY if infeasible,
+        NONLINEAR if service times would change the delay on the way
+        (int, int) -> float"""
+        n = self.n
+        penalty = 0.0
+        if k < n-1:
+            if self.surplus[k] < 0 or self.surplus[k] + delay < 0:
+                return NONLINEAR
+            if self.maxDeparture[k] + delay > self.end or \
+               self.maxLoad[k] > self.capacity:
+                return INFPENALTY
+            penalty = self.suffixPenalty[k] + delay * self.rate[k]
+        last = self.plan[n-1]
+        time = self.wait(last, self.arrival[n-1] + delay)
+        if time > self.end or self.load[n-1] > self.capacity:
+            return INFPENALTY
+        return penalty + self.stopPenalty(last, time)
+
+    def tentativePlan(self, puStop, doStop, puPosition, doPosition):
+        """ return the stops of the plan with pickup inserted before stop
+        puPosition and dropoff before stop doPosition of the current plan,
+        iterated over the current plan instead of copying it
+        (Stop, Stop, int, int) -> iterator"""
+        plan = self.plan
+        return chain(islice(plan, puPosition), (puStop,),
+                     islice(plan, puPosition, doPosition), (doStop,),
+                     islice(plan, doPosition, None))
+
+    def bestInsertion(self, puStop, doStop):
+        """ return positions (in the plan with the pickup inserted) and
+        penalty of the best insertion of a pickup and dropoff, identical to
+        evaluating every plan with Vehicle.calcItineraryPenalty; each
+        candidate costs O(1) unless service times force an exact evaluation
+        (Stop, Stop) -> (int, int, float)"""
+        plan = self.plan
+        n = self.n
+        if not self.feasible[n-1]:
+            # delays cannot be propagated past an infeasible stop
+            return self.bestExact(puStop, doStop)
+        candidates = [] # (penalty, pickup index, dropoff index)
+
+        timeToPU = [self.travelTime(plan[k], puStop) for k in range(0, n-1)]
+        timeFromPU = [None] + [self.travelTime(puStop, plan[k])
+                               for k in range(1, n)]
+        timeToDO = [None] + [self.travelTime(plan[k], doStop)
+                             for k in range(1, n-1)]
+        timeFromDO = [None] + [self.travelTime(doStop, plan[k])
+                               for k in range(1, n)]
+        timePUDO = self.travelTime(puStop, doStop)
+
+        for i in range(1, n):
+            if not self.feasible[i-1]:
+                break # all later insertions share this infeasible prefix
+            base = self.penalty[i-1]
+            puTime = self.wait(puStop, self.departure[i-1] + timeToPU[i-1])
+            puLoad = self.load[i-1] + 1
+            if puTime > self.end or puLoad > self.capacity:
+                continue
+            puPenalty = self.stopPenalty(puStop, puTime)
+
+            # dropoff directly after pickup
+            doTime = self.wait(doStop, puTime + timePUDO)
+            if doTime <= self.end:
+                rest = self.suffix(i, doTime + timeFromDO[i] -
+                                   self.arrival[i])
+                if rest == NONLINEAR:
+                    candidates.append((self.exact(puStop, doStop, i, i),
+                                       i, i))
+                elif rest < INFPENALTY:
+                    candidates.append((base + puPenalty +
+                                       self.stopPenalty(doStop, doTime) +
+                                       rest, i, i))
+
+            # dropoff after stops i..q-1, delayed by the pickup
+            delay = puTime + timeFromPU[i] - self.arrival[i]
+            middle = 0.0
+            surplus = float("inf")
+            for q in range(i+1, n):
+                m = plan[q-1]
+                if m.serviceTime != None:
+                    surplus = min(surplus,
+                                  self.arrival[q-1] - m.serviceTime)
+                if surplus < 0 or surplus + delay < 0:
+                    # waiting changes the delay, evaluate the rest exactly
+                    for r in range(q, n):
+                        candidates.append(
+                            (self.exact(puStop, doStop, i, r), i, r))
+                    break
+                mTime = self.departure[q-1] + delay
+                if mTime > self.end or self.load[q-1] + 1 > self.capacity:
+                    break # all later dropoffs also carry this stop
+                middle += self.stopPenalty(m, mTime)
+                doTime = self.wait(doStop, mTime + timeToDO[q-1])
+                if doTime > self.end:
+                    continue
+                rest = self.suffix(q, doTime + timeFromDO[q] -
+                                   self.arrival[q])
+                if rest == NONLINEAR:
+                    candidates.append((self.exact(puStop, doStop, i, q),
+                                       i, q))
+                elif rest < INFPENALTY:
+                    candidates.append((base + puPenalty + middle +
+                                       self.stopPenalty(doStop, doTime) +
+                                       rest, i, q))
+
+        # resolve near-ties exactly, in the order candidates were generated
+        best = (None, None, INFPENALTY)
+        candidates = [c for c in candidates if c[0] < INFPENALTY]
+        if len(candidates) == 0:
+            return best
+        bound = min(c[0] for c in candidates) + TOLERANCE
+        for (penalty, i, q) in candidates:
+            if penalty <= bound:
+                penalty = self.exact(puStop, doStop, i, q)
+                if penalty < best[2]:
+                    best = (i, q + 1, penalty)
+        return best
+
+    def bestExact(self, puStop, doStop):
+        """ return positions and penalty of the best insertion of a pickup
+        and dropoff by walking every tentative plan, in the order of
+        bestInsertion
+        (Stop, Stop) -> (int, int, float)"""
+        best = (None, None, INFPENALTY)
+        for i in range(1, self.n):
+            for q in range(i, self.n):
+                penalty = self.exact(puStop, doStop, i, q)
+                if penalty < best[2]:
+                    best = (i, q + 1, penalty)
+        return best
+
+    def exact(self, puStop, doStop, puPosition, doPosition):
+        """ return penalty of a tentative plan by walking it
+        (Stop, Stop, int, int) -> float"""
+        return self.walk(self.tentativePlan(puStop, doStop, puPosition,
+                                            doPosition))
+
+    def walk(self, plan):
+        """ return penalty of a plan starting at the current position, as
+        Vehicle.calcItineraryPenalty
+        (iterable of Stop) -> float"""
+        penalty = 0
+        nPassengers = self.countPassengers
+        runningTime = self.step
+        stops = iter(plan)
+        o = next(stops)
+        for d in stops:
+            runningTime = self.wait(d, runningTime + self.travelTime(o, d))
+            o = d
+            if runningTime > self.end:
+                return INFPENALTY
+            if d.stopType == StopType.PICKUP:
+                nPassengers += 1
+            elif d.stopType == StopType.DROPOFF:
+                nPassengers -= 1
+                penalty += self.stopPenalty(d, runningTime)
+            if nPassengers > self.capacity:
+                return INFPENALTY
+        return penalty
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+@file    simulationContext.py
+@author  Nicole Ronald
+@date    2014-03-17
+@version
+
+Defines the context of a simulation: the network, people, vehicles and
+requests of a run and the SUMO instance running it, reset and reused for
+consecutive runs in one process.
+
+SUMOoD (SUMO on Demand); see http://imod-au.info/sumood
+Copyright (C) 2014 iMoD
+SUMO, Simulation of Urban MObility; see http://sumo.sourceforge.net/
+Copyright (C) 2008-2012 DLR (http://www.dlr.de/) and contributors
+All rights reserved
+"""
+
+
+import subprocess, sys, os, math
+from xml.dom import minidom
+SUMO_HOME = os.path.realpath(
+    os.environ.get("SUMO_HOME",
+                   os.path.join(os.path.dirname(__file__),
+                                "..", "..", "..", "..")))
+sys.path.append(os.path.join(SUMO_HOME, "tools"))
+
+import traci
+import traci.constants as tc
+from network import network, Network
+from peopleCollection import PeopleCollection, peopleCollection
+from vehicleCollection import VehicleCollection, vehicleCollection
+from commandBuffer import CommandBuffer, commandBuffer
+from requestQueue import RequestQueue
+
+
+def readConfig(configFile):
+    """ return the network file and route files of a SUMO configuration,
+    relative to the current folder
+    (string) -> (string, string[])"""
+    folder = os.path.dirname(configFile)
+    config = minidom.parse(configFile)
+    netFile = None
+    for element in config.getElementsByTagName("net-file"):
+        netFile = os.path.join(folder, element.getAttribute("value").strip())
+    routeFiles = []
+    for element in config.getElementsByTagName("route-files"):
+        for routeFile in element.getAttribute("value").split(","):
+            routeFiles.append(os.path.join(folder, routeFile.strip()))
+    return (netFile, routeFiles)
+
+
+def readDepartures(routeFiles):
+    """ return sorted departure steps of the vehicles in route files
+    (string[]) -> int[]"""
+    times = []
+    for routeFile in routeFiles:
+        routes = minidom.parse(routeFile)
+        for v in routes.getElementsByTagName("vehicle"):
+            times.append(int(math.ceil(float(v.getAttribute("depart")))))
+    times.sort()
+    return times
+
+
+class Simulation:
+    """ owns the state of a run; reset clears the people, vehicles and
+    requests, while the network's cache and matrix are kept as long as the
+    street network stays the same """
+
+    def __init__(self, port, sumoBinary="sumo"):
+        self.port = port
+        self.sumoBinary = sumoBinary
+        self.network = network
+        self.people = peopleCollection
+        self.vehicles = vehicleCollection
+        self.commands = commandBuffer
+        self.process = None # SUMO process, None until loaded
+        self.netFile = None
+        self.loads = 0 # configurations loaded
+        self.reloads = 0 # of which through TraCI, without restarting SUMO
+        self.eventDriven = False # skip steps until the next event
+        self.reset()
+
+    def reset(self):
+        """ clear the state of the last run """
+        self.step = 0
+        self.requests = RequestQueue()
+        self.departures = [] # scheduled departure steps, sorted
+        self.departed = 0 # number of vehicles departed so far
+        self.people.reset()
+        self.vehicles.reset()
+        self.commands.reset()
+
+    def load(self, sumoConfig):
+        """ load a SUMO configuration: the first time by starting SUMO, then
+        through TraCI's load command where the TraCI version has it
+        (string)"""
+        (netFile, routeFiles) = readConfig(sumoConfig)
+        if netFile != self.netFile:
+            self.network.reset()
+            self.netFile = netFile
+        self.departures = readDepartures(routeFiles)
+        if getattr(traci, "inProcess", False):
+            # stand-in simulated in this process, nothing to start
+            traci.load(["-c", sumoConfig])
+        elif self.process != None and hasattr(traci, "load"):
+            traci.load(["-c", sumoConfig])
+            self.reloads += 1
+        else:
+            self.close()
+            self.process = subprocess.Popen([self.sumoBinary, "-c",
+                                             sumoConfig, "--remote-port",
+                                             str(self.port)],
+                                            stdout=sys.stdout,
+                                            stderr=sys.stderr)
+            traci.init(self.port)
+        self.loads += 1
+        # subscriptions do not survive loading
+        traci.simulation.subscribe([tc.VAR_DEPARTED_VEHICLES_IDS,
+                                    tc.VAR_ARRIVED_VEHICLES_IDS])
+
+    def close(self):
+        """ close the connection and wait for SUMO to finish """
+        if self.process != None:
+            traci.close()
+            self.process.wait()
+            self.process = None
+
+    def printStats(self):
+        """ print how often SUMO was reloaded instead of restarted """
+        print "SUMO: %d configurations loaded, %d without restarting" % \
+              (self.loads, self.reloads)
@@ -15,20 +15,52 @@ All rights reserved
 """
 
 
-class Stop:
-    """ Represents a stop in a vehicle's and passenger's plan """
+LINKS = [] # link id -> link, in order of first use
+LINK_IDS = {} # link -> link id
+
+def internLink(link):
+    """ return the integer id of a link, numbering it on first use
+    (string) -> int"""
+    linkID = LINK_IDS.get(link)
+    if linkID == None:
+        linkID = LINK_IDS[link] = len(LINKS)
+        LINKS.append(link)
+    return linkID
+
+
+class Stop(object):
+    """ Represents a stop in a vehicle's and passenger's plan; stops on a
+    link share one copy of its name, and key identifies the position in
+    the network's matrix """
+    __slots__ = ["personID", "link", "pos", "stopType", "serviceTime",
+                 "linkID", "key"]
 
     def __init__(self, personID, link, pos, stopType, serviceTime = None):
         self.personID = personID
-        self.link = link
+        self.linkID = internLink(link)
+        self.link = LINKS[self.linkID]
         self.pos = pos
+        self.key = (self.linkID, pos)
         self.stopType = stopType
         self.serviceTime = serviceTime
-            
+
+    def __getstate__(self):
+        return (self.personID, self.link, self.pos, self.stopType,
+                self.serviceTime)
+
+    def __setstate__(self, state):
+        # link ids are numbered per process
+        self.__init__(*state)
 
     def printLn(self):
         print self.personID, self.link, self.pos, self.stopType, self.serviceTime
 
+    def getFields(self):
+        """ return the stop as a list, for logging
+        () -> list"""
+        return [self.personID, self.link, self.pos, self.stopType,
+                self.serviceTime]
+
 class StopType:
     """ Represents the different type of stops """
     DEPOT = 0
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+@file    mesoRuns.py
+@author  Nicole Ronald
+@date    2014-03-17
+@version
+
+Runs sample request files on the mesoscopic stand-in with given drt.py
+flags, each set of runs in a fresh process, and compares their outputs;
+used by the tests that check an optional mode leaves the results as they
+are.
+
+SUMOoD (SUMO on Demand); see http://imod-au.info/sumood
+Copyright (C) 2014 iMoD
+SUMO, Simulation of Urban MObility; see http://sumo.sourceforge.net/
+Copyright (C) 2008-2012 DLR (http://www.dlr.de/) and contributors
+All rights reserved
+"""
+
+
+import sys, os, csv, json, multiprocessing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT) # sample inputs are relative to the repository
+
+import mesoTraci
+mesoTraci.install()
+import drt
+from batch import Job
+
+# (scenario, vehicles, demand, run), including runs where a mode once
+# changed who was picked up when
+RUNS = [("1a", 3, "L", 2), ("1b", 10, "M", 1), ("1b", 5, "M", 3),
+        ("1b", 8, "L", 2), ("1b", 8, "S", 1), ("1c", 3, "S", 1),
+        ("1c", 10, "S", 1), ("1c", 10, "L", 2), ("2", 8, "L", 1)]
+TOLERANCE = 1e-6 # relative, for floats written in a different order
+
+
+def runAll(flags, folder, runs=RUNS):
+    """ run the sample runs with drt flags, writing outputs to a folder
+    ({string: object}, string, (string, int, string, int)[])"""
+    drt.LOG_LEVEL = "off"
+    for name, value in flags.iteritems():
+        setattr(drt, name, value)
+    drt.REQUEST_FOLDER = os.path.join(ROOT, "SampleInput/Requests/%s/")
+    drt.OUTPUT_FOLDER = folder
+    stdout = sys.stdout
+    with open(os.path.join(folder, "runs.log"), 'w') as log:
+        sys.stdout = log
+        try:
+            for (scenario, vehicles, demand, run) in runs:
+                job = Job(scenario, vehicles, demand, run, drt.PORT)
+                job.folder = os.path.join(folder, "")
+                drt.SCENARIO = scenario
+                drt.SUMO_CONFIG = job.writeConfig()
+                drt.run(job.runId)
+        finally:
+            sys.stdout = stdout
+
+
+def runIsolated(flags, folder, runs=RUNS):
+    """ runAll in a fresh process, so that no state is shared between
+    sets of flags
+    ({string: object}, string, (string, int, string, int)[])"""
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+    # not a pool, whose daemonic process could not start WORKERS
+    process = multiprocessing.Process(target=runAll,
+                                      args=(flags, folder, runs))
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        raise RuntimeError("runs with %s failed, see the traceback above" %
+                           flags)
+
+
+def readRows(filename):
+    """ return the rows of a CSV output in sorted order, as written in the
+    order people and vehicles finish in some modes
+    (string) -> list[]"""
+    with open(filename, 'rb') as csvfile:
+        rows = list(csv.reader(csvfile, delimiter=','))
+    return rows[:1] + sorted(rows[1:])
+
+
+def sameValue(a, b):
+    """ return whether two CSV values are equal, floats up to TOLERANCE
+    (string, string) -> bool"""
+    if a == b:
+        return True
+    try:
+        x = float(a)
+        y = float(b)
+    except ValueError:
+        return False
+    return abs(x - y) <= TOLERANCE * max(1.0, abs(x), abs(y))
+
+
+def compareOutputs(folder1, folder2):
+    """ return the names of the output files that differ between two
+    folders, or exist in only one
+    (string, string) -> string[]"""
+    names = [n for n in sorted(set(os.listdir(folder1)) |
+                               set(os.listdir(folder2)))
+             if n.endswith(".out.csv")]
+    differ = []
+    for name in names:
+        if not os.path.exists(os.path.join(folder1, name)) or \
+           not os.path.exists(os.path.join(folder2, name)):
+            differ.append(name)
+            continue
+        rows1 = readRows(os.path.join(folder1, name))
+        rows2 = readRows(os.path.join(folder2, name))
+        if len(rows1) != len(rows2) or \
+           not all(len(r1) == len(r2) and all(map(sameValue, r1, r2))
+                   for (r1, r2) in zip(rows1, rows2)):
+            differ.append(name)
+    return differ
+
+
+def readAllocations(folder, runs=RUNS):
+    """ return the (person, vehicle) of each allocation in the traces of
+    runs made with TRACE, by run id
+    (string, (string, int, string, int)[]) -> {string: (string, string)[]}"""
+    allocations = {}
+    for (scenario, vehicles, demand, run) in runs:
+        runId = Job(scenario, vehicles, demand, run, drt.PORT).runId
+        events = []
+        with open(os.path.join(folder, runId + "-trace.jsonl")) as trace:
+            for line in trace:
+                event = json.loads(line)
+                if event["event"] == "allocated":
+                    events.append((event["person"], event["vehicle"]))
+        allocations[runId] = events
+    return allocations
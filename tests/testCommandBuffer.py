@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+@file    testCommandBuffer.py
+@author  Nicole Ronald
+@date    2014-03-17
+@version
+
+Tests that the command buffer sends commands one by one unless batching,
+that the errors of a batch are those of the commands at the positions of
+the failed statuses in SUMO's answer, and that the profiler counts the
+commands of a batch by kind. The message access of traci, which the
+stand-in lacks, is replaced by a connection that records what is sent and
+answers with given statuses.
+
+python -m unittest discover -s tests -p "test*.py"
+
+SUMOoD (SUMO on Demand); see http://imod-au.info/sumood
+Copyright (C) 2014 iMoD
+SUMO, Simulation of Urban MObility; see http://sumo.sourceforge.net/
+Copyright (C) 2008-2012 DLR (http://www.dlr.de/) and contributors
+All rights reserved
+"""
+
+
+import unittest, struct
+import mesoRuns
+import traci
+import traci.constants as tc
+from commandBuffer import CommandBuffer, CommandError, canBatch, \
+     commandBuffer
+from profiler import profiler
+
+# values of traci.constants used to build commands
+CONSTANTS = {"CMD_SET_VEHICLE_VARIABLE": 0xc4, "CMD_CHANGETARGET": 0x31,
+             "CMD_STOP": 0x12, "TYPE_BYTE": 0x08, "TYPE_INTEGER": 0x09,
+             "TYPE_DOUBLE": 0x0B, "TYPE_STRING": 0x0C, "TYPE_COMPOUND": 0x0F}
+
+
+class Message:
+    """ a message being built, as traci._message """
+
+    def __init__(self):
+        self.string = ""
+        self.queue = []
+
+
+class Storage:
+    """ an answer being read, as traci.Storage """
+
+    def __init__(self, content):
+        self.content = content
+        self.position = 0
+
+    def read(self, format):
+        size = struct.calcsize(format)
+        self.position += size
+        return struct.unpack(format,
+                             self.content[self.position-size:self.position])
+
+    def readString(self):
+        length = self.read("!i")[0]
+        return self.read("!%ss" % length)[0]
+
+
+class Connection:
+    """ records the messages sent and answers them with the statuses set """
+
+    def __init__(self):
+        self.sent = []
+        self.statuses = [] # (status, description) per command
+
+    def send(self, data):
+        self.sent.append(data)
+
+    def answer(self):
+        content = ""
+        for (status, description) in self.statuses:
+            content += struct.pack("!BBBi", 1+1+1+4+len(description),
+                                   tc.CMD_SET_VEHICLE_VARIABLE, status,
+                                   len(description)) + description
+        return Storage(content)
+
+
+class CommandBufferTest(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = Connection()
+        self.message = Message()
+        self.calls = [] # (function, vehicleID) of commands sent one by one
+        self.saved = dict((name, getattr(traci.vehicle, name))
+                          for name in ["changeTarget", "setStop"])
+        for name, value in CONSTANTS.iteritems():
+            setattr(tc, name, value)
+        traci._message = self.message
+        traci._socket = self.connection
+        traci._recvExact = self.connection.answer
+        traci._beginMessage = self.beginMessage
+        traci.vehicle.changeTarget = \
+            lambda vehicleID, link: self.calls.append(("changeTarget",
+                                                       vehicleID))
+        traci.vehicle.setStop = \
+            lambda vehicleID, *args: self.calls.append(("setStop", vehicleID))
+        self.buffer = CommandBuffer()
+
+    def tearDown(self):
+        for name in ["_message", "_socket", "_recvExact", "_beginMessage"]:
+            delattr(traci, name)
+        for name in CONSTANTS:
+            delattr(tc, name)
+        for name, function in self.saved.iteritems():
+            setattr(traci.vehicle, name, function)
+
+    def beginMessage(self, cmdID, varID, objID, length=0):
+        self.message.queue.append(cmdID)
+        self.message.string += struct.pack("!BBBi", 1+1+1+4+len(objID)+length,
+                                           cmdID, varID, len(objID)) + objID
+
+    def addCommands(self):
+        self.buffer.changeTarget("0", "a")
+        self.buffer.setStop("1", "b", 10.0, 0, 0)
+        self.buffer.setStop("2", "c", 20.0, 0, 100)
+
+    def testUnbatched(self):
+        self.assertTrue(canBatch())
+        self.addCommands()
+        self.assertEqual(self.calls, [("changeTarget", "0"), ("setStop", "1"),
+                                      ("setStop", "2")])
+        self.assertEqual(self.connection.sent, [])
+        self.assertEqual(self.buffer.messages, 3)
+
+    def testBatched(self):
+        self.buffer.batched = True
+        self.addCommands()
+        self.assertEqual(self.connection.sent, [])
+        self.connection.statuses = [(0, "")] * 3
+        self.buffer.flush()
+        self.assertEqual(self.calls, [])
+        self.assertEqual(len(self.connection.sent), 1)
+        self.assertEqual(self.buffer.messages, 1)
+        self.assertEqual((self.message.string, self.message.queue), ("", []))
+
+    def testBatchErrors(self):
+        self.buffer.batched = True
+        self.addCommands()
+        # the failed command is found by its position, whatever SUMO's
+        # description names
+        self.connection.statuses = [(0, ""), (0xff, "vehicle 2 unknown"),
+                                    (0xff, "")]
+        try:
+            self.buffer.flush()
+            self.fail("no CommandError")
+        except CommandError, e:
+            self.assertEqual(e.errors, [("1", "setStop", "vehicle 2 unknown"),
+                                        ("2", "setStop", "")])
+        self.assertEqual(len(self.connection.sent), 1)
+        self.assertEqual((self.message.string, self.message.queue), ("", []))
+
+    def testProfile(self):
+        profiler.reset()
+        profiler.instrument()
+        try:
+            commandBuffer.batched = True
+            self.buffer = commandBuffer
+            self.addCommands()
+            self.connection.statuses = [(0, "")] * 3
+            commandBuffer.flush()
+        finally:
+            profiler.restore()
+            commandBuffer.batched = False
+            commandBuffer.reset()
+        self.assertEqual(profiler.calls["vehicle.changeTarget"][0], 1)
+        self.assertEqual(profiler.calls["vehicle.setStop"][0], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
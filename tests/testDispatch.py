@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+@file    testDispatch.py
+@author  Nicole Ronald
+@date    2014-03-17
+@version
+
+Tests that pruning vehicles by a lower bound during dispatch allocates
+every person to the same vehicle as evaluating them all.
+
+python -m unittest discover -s tests -p "test*.py"
+
+SUMOoD (SUMO on Demand); see http://imod-au.info/sumood
+Copyright (C) 2014 iMoD
+SUMO, Simulation of Urban MObility; see http://sumo.sourceforge.net/
+Copyright (C) 2008-2012 DLR (http://www.dlr.de/) and contributors
+All rights reserved
+"""
+
+
+import unittest, tempfile, shutil, os
+import mesoRuns
+
+
+class PruningTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def checkPruning(self, flags):
+        """ run with and without pruning, and compare the allocations
+        ({string: object})"""
+        plain = os.path.join(self.folder, "plain")
+        pruned = os.path.join(self.folder, "pruned")
+        flags = dict(flags, TRACE=True, LOG_LEVEL="info")
+        mesoRuns.runIsolated(dict(flags, PRUNE=False), plain)
+        mesoRuns.runIsolated(dict(flags, PRUNE=True), pruned)
+        self.assertEqual(mesoRuns.readAllocations(plain),
+                         mesoRuns.readAllocations(pruned))
+        self.assertEqual(mesoRuns.compareOutputs(plain, pruned), [])
+
+    def testSerial(self):
+        self.checkPruning({"VECTORIZED": False})
+
+    def testVectorized(self):
+        self.checkPruning({"MATRIX": True, "VECTORIZED": True})
+
+
+if __name__ == "__main__":
+    unittest.main()
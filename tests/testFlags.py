@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+@file    testFlags.py
+@author  Nicole Ronald
+@date    2014-03-17
+@version
+
+Tests that each optional mode of drt.py, and all of --fast together,
+writes the same outputs as running with every mode off.
+
+python -m unittest discover -s tests -p "test*.py"
+
+SUMOoD (SUMO on Demand); see http://imod-au.info/sumood
+Copyright (C) 2014 iMoD
+SUMO, Simulation of Urban MObility; see http://sumo.sourceforge.net/
+Copyright (C) 2008-2012 DLR (http://www.dlr.de/) and contributors
+All rights reserved
+"""
+
+
+import unittest, tempfile, shutil, os
+import mesoRuns
+
+OFF = {"MATRIX": False, "CACHE_SIZE": 0, "VECTORIZED": False, "WORKERS": 0,
+       "PRUNE": False, "ODOMETER": False, "BATCHED": False,
+       "EVENT_DRIVEN": False, "SELECTIVE": False}
+
+
+class FlagTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.folder = tempfile.mkdtemp()
+        cls.reference = os.path.join(cls.folder, "off")
+        mesoRuns.runIsolated(OFF, cls.reference)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.folder)
+
+    def checkFlags(self, name, flags):
+        """ run with flags on top of every mode off, and compare the
+        outputs with those of the reference runs
+        (string, {string: object})"""
+        folder = os.path.join(self.folder, name)
+        mesoRuns.runIsolated(dict(OFF, **flags), folder)
+        self.assertEqual(mesoRuns.compareOutputs(self.reference, folder), [])
+
+    def testMatrix(self):
+        self.checkFlags("matrix", {"MATRIX": True})
+
+    def testCache(self):
+        self.checkFlags("cache", {"CACHE_SIZE": 100000})
+
+    def testVectorized(self):
+        self.checkFlags("vectorized", {"MATRIX": True, "VECTORIZED": True})
+
+    def testWorkers(self):
+        self.checkFlags("workers", {"WORKERS": 2})
+
+    def testPrune(self):
+        self.checkFlags("prune", {"PRUNE": True})
+
+    def testOdometer(self):
+        self.checkFlags("odometer", {"ODOMETER": True})
+
+    def testBatched(self):
+        self.checkFlags("batched", {"BATCHED": True})
+
+    def testEventDriven(self):
+        self.checkFlags("eventDriven", {"EVENT_DRIVEN": True,
+                                        "ODOMETER": True})
+
+    def testSelective(self):
+        self.checkFlags("selective", {"SELECTIVE": True, "ODOMETER": True})
+
+    def testFast(self):
+        self.checkFlags("fast", dict((name, True)
+                                     for name in mesoRuns.drt.FAST_MODES))
+
+
+if __name__ == "__main__":
+    unittest.main()
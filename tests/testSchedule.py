@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+@file    testSchedule.py
+@author  Nicole Ronald
+@date    2014-03-17
+@version
+
+Tests that Schedule.bestInsertion finds the insertion that evaluating
+every tentative plan as calcItineraryPenalty does finds, for plans with
+unreachable legs.
+
+python -m unittest discover -s tests -p "test*.py"
+
+SUMOoD (SUMO on Demand); see http://imod-au.info/sumood
+Copyright (C) 2014 iMoD
+SUMO, Simulation of Urban MObility; see http://sumo.sourceforge.net/
+Copyright (C) 2008-2012 DLR (http://www.dlr.de/) and contributors
+All rights reserved
+"""
+
+
+import unittest
+import mesoRuns
+import numpy
+from network import network, UNREACHABLE
+from peopleCollection import peopleCollection
+from person import Person
+from schedule import Schedule, INFPENALTY
+from stop import Stop, StopType
+
+END = 3660
+CAPACITY = 10
+LEG = 60 # seconds between any two stops but the unreachable ones
+
+
+def itineraryPenalty(plan, step, countPassengers):
+    """ return the penalty of a plan as Vehicle.calcItineraryPenalty
+    (Stop[], int, int) -> float"""
+    penalty = 0
+    nPassengers = countPassengers
+    runningTime = step
+    for i in range(0, len(plan)-1):
+        d = plan[i+1]
+        runningTime += int(network.getTime(plan[i], d))
+        if d.serviceTime != None and runningTime < d.serviceTime:
+            runningTime = d.serviceTime
+        if runningTime > END:
+            return INFPENALTY
+        if d.stopType == StopType.PICKUP:
+            nPassengers += 1
+        elif d.stopType == StopType.DROPOFF:
+            nPassengers -= 1
+            penalty += peopleCollection.estimatePenalty(d.personID,
+                                                        runningTime)
+        if nPassengers > CAPACITY:
+            return INFPENALTY
+    return penalty
+
+
+class ScheduleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = (network.stopIndex, network.timeMatrix)
+        for personID in ["1", "2", "3"]:
+            person = Person(personID)
+            person.setCallTime(0)
+            person.directTime = float(LEG)
+            peopleCollection.addPerson(person)
+        self.current = Stop(-1, "c", 0.0, StopType.CURRENT)
+        self.plan = [self.current,
+                     Stop("1", "d1", 0.0, StopType.DROPOFF),
+                     Stop("2", "p2", 0.0, StopType.PICKUP, 100),
+                     Stop("2", "d2", 0.0, StopType.DROPOFF),
+                     Stop(-1, "out", 0.0, StopType.DEPOT, END)]
+        self.pu = Stop("3", "p3", 0.0, StopType.PICKUP, 0)
+        self.do = Stop("3", "d3", 0.0, StopType.DROPOFF)
+        stops = self.plan + [self.pu, self.do]
+        network.stopIndex = dict((s.key, k) for (k, s) in enumerate(stops))
+        network.timeMatrix = numpy.ones((len(stops), len(stops))) * LEG
+
+    def tearDown(self):
+        (network.stopIndex, network.timeMatrix) = self.saved
+        peopleCollection.reset()
+
+    def setUnreachable(self, origin, destination):
+        network.timeMatrix[network.getIndex(origin),
+                           network.getIndex(destination)] = UNREACHABLE
+
+    def checkBest(self, expectFeasible):
+        """ compare bestInsertion with evaluating every tentative plan
+        (bool)"""
+        schedule = Schedule(self.plan, 0, 1, CAPACITY, END)
+        best = (None, None, INFPENALTY)
+        n = len(self.plan)
+        for i in range(1, n):
+            for q in range(i, n):
+                plan = self.plan[:i] + [self.pu] + self.plan[i:q] + \
+                       [self.do] + self.plan[q:]
+                penalty = itineraryPenalty(plan, 0, 1)
+                if penalty < best[2]:
+                    best = (i, q + 1, penalty)
+        self.assertEqual(best[2] < INFPENALTY, expectFeasible)
+        self.assertEqual(schedule.bestInsertion(self.pu, self.do), best)
+
+    def testUnreachableLegs(self):
+        # two unreachable legs, made reachable only by going through the
+        # new pickup and dropoff
+        self.setUnreachable(self.plan[1], self.plan[2])
+        self.setUnreachable(self.plan[2], self.plan[3])
+        schedule = Schedule(self.plan, 0, 1, CAPACITY, END)
+        self.assertEqual(schedule.getPenalty(), INFPENALTY)
+        self.checkBest(True)
+
+    def testUnreachableRequest(self):
+        # the new stops cannot be reached from the current position
+        self.setUnreachable(self.current, self.pu)
+        self.setUnreachable(self.current, self.do)
+        self.checkBest(True)
+
+    def testUnreachableFromPickup(self):
+        for stop in self.plan + [self.do]:
+            self.setUnreachable(self.pu, stop)
+        self.checkBest(False)
+
+
+if __name__ == "__main__":
+    unittest.main()
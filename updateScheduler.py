@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+@file    updateScheduler.py
+@author  Nicole Ronald
+@date    2014-03-17
+@version
+
+Defines the schedule of vehicle updates: each vehicle is updated only at
+the step it could next reach a stop, or once its plan has changed.
+
+SUMOoD (SUMO on Demand); see http://imod-au.info/sumood
+Copyright (C) 2014 iMoD
+SUMO, Simulation of Urban MObility; see http://sumo.sourceforge.net/
+Copyright (C) 2008-2012 DLR (http://www.dlr.de/) and contributors
+All rights reserved
+"""
+
+
+import heapq
+
+
+class UpdateScheduler:
+    """ priority queue of vehicles ordered by the step they are next due;
+    rescheduling leaves the old entry in the heap, where it is skipped as
+    it no longer matches the vehicle's due step """
+
+    def __init__(self):
+        self.heap = []
+        self.due = {} # vehicleID -> step the vehicle is due
+        self.updated = 0
+        self.skipped = 0
+
+    def schedule(self, vehicleID, step):
+        """ set the step a vehicle is next due, None to never update it
+        (string, int)"""
+        if step == None:
+            self.remove(vehicleID)
+            return
+        if self.due.get(vehicleID) != step:
+            self.due[vehicleID] = step
+            heapq.heappush(self.heap, (step, vehicleID))
+
+    def wake(self, vehicleID, step):
+        """ make a vehicle due no later than a step
+        (string, int)"""
+        due = self.due.get(vehicleID)
+        if due == None or step < due:
+            self.schedule(vehicleID, step)
+
+    def remove(self, vehicleID):
+        """ stop updating a vehicle
+        (string)"""
+        if vehicleID in self.due:
+            del self.due[vehicleID]
+
+    def popDue(self, step):
+        """ remove and return all vehicles due at or before a step
+        (int) -> string[]"""
+        due = []
+        while len(self.heap) > 0 and self.heap[0][0] <= step:
+            (dueStep, vehicleID) = heapq.heappop(self.heap)
+            if self.due.get(vehicleID) == dueStep:
+                del self.due[vehicleID]
+                due.append(vehicleID)
+        return due
+
+    def nextStep(self):
+        """ return the step the next vehicle is due, None if none is
+        () -> int"""
+        while len(self.heap) > 0 and \
+              self.due.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+        if len(self.heap) > 0:
+            return self.heap[0][0]
+        return None
+
+    def printStats(self):
+        """ print how many vehicle updates were made and skipped """
+        print "Vehicle updates: %d made, %d skipped" % (self.updated,
+                                                        self.skipped)
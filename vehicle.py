@@ -15,7 +15,7 @@ All rights reserved
 """
 
 
-import subprocess, random, sys, os
+import subprocess, random, sys, os, math
 SUMO_HOME = os.path.realpath(
     os.environ.get("SUMO_HOME",
                    os.path.join(os.path.dirname(__file__),
@@ -27,15 +27,31 @@ import traci.constants as tc
 from stop import Stop, StopType
 from peopleCollection import PeopleCollection, peopleCollection
 from network import network, Network
+from schedule import Schedule, INFPENALTY
+from commandBuffer import CommandBuffer, commandBuffer
+from eventLog import EventLog, eventLog, DEBUG, INFO
 import csv
 
 DWELLTIME = 2000
 MILLISECONDS = 1000
 M2KM = 1000
 LARGEDIST = 1000000
-INFPENALTY = 1000000
 STOP_OFFSET = 20.0
 PARK_OFFSET = 60.0
+PARK_TOLERANCE = 1.0 # m from the parking position taken as standing there
+DISTANCE_TOLERANCE = 1e-6 # m, for rounding in the sums of distances
+# variables subscribed for each vehicle, delivered to update every step;
+# ODOMETER_SUBSCRIPTION adds the distance driven, for odometer accounting,
+# and is None where TraCI predates VAR_DISTANCE
+SUBSCRIPTION = [tc.VAR_ROAD_ID, tc.VAR_LANEPOSITION]
+VAR_DISTANCE = getattr(tc, "VAR_DISTANCE", None)
+ODOMETER_SUBSCRIPTION = None
+if VAR_DISTANCE != None:
+    ODOMETER_SUBSCRIPTION = SUBSCRIPTION + [VAR_DISTANCE]
+SCHEDULE_DEVIATION = 30 # seconds late before the cached schedule is dropped
+SPEED_MARGIN = 1.2 # allows for vehicles exceeding the speed limit
+DEPOT_LINK = "out"
+DEPOT_POS = 0
 
 class VehicleState:
     """ state of the vehicle """
@@ -58,30 +74,43 @@ class Vehicle:
     num = 0
 
 
-    def __init__(self, name):
+    def __init__(self, name, currentLink, currentPos, odometer=None):
         self.name = name
         self.plan = []
         self.operatingState = VehicleState.vsNotStarted
         self.currentStatus = VehicleStatus.PARKED
-        currentLink = str(traci.vehicle.getRoadID(self.name))
+        currentLink = str(currentLink)
         self.lastLink = currentLink
-        currentPos = float(traci.vehicle.getLanePosition(self.name))
+        self.currentLink = currentLink
+        currentPos = float(currentPos)
         self.lastPos = currentPos
+        self.currentPos = currentPos
+        self.lastOdometer = odometer # None unless odometer accounting
         self.visited = []
         self.visited.append(Stop(-1, currentLink, currentPos, StopType.DEPOT))
         self.totalPassengers = 0
         self.totalDistance = 0
         self.nextUpdate = None
+        self.currentStop = None # reused by getCurrentPos
+        self.schedule = None # cached schedule of the current plan
+        self.packed = None # cached arrays of the plan, see fleetEvaluator.py
+        self.goHomeTime = None # when parked, time to leave for the depot
+        self.parkedUntil = None # when parked, earliest end of the parking stop
+        self.stationary = False # not moved since the previous update
+        self.sentTarget = None # last target sent to SUMO
+        self.sentStop = None # (link, pos) of last next stop sent to SUMO
+        self.sentCommands = 0
+        self.suppressedCommands = 0 # not sent as unchanged
         self.itineraryPenalty = 0
         self.countPassengers = 0
         self.capacity = 10
-        self.currentPassengers = []
+        self.currentPassengers = set() # people on board
         self.end = 3660
         self.parkedLink = currentLink
         self.parkedPos = currentPos
         self.occupancyTime = 0
-        depotStop = Stop(-1, "out", 0, StopType.DEPOT, self.end)
-        traci.vehicle.setStop(self.name, currentLink, currentPos, 0,
+        depotStop = Stop(-1, DEPOT_LINK, DEPOT_POS, StopType.DEPOT, self.end)
+        commandBuffer.setStop(self.name, currentLink, currentPos, 0,
                               self.end*MILLISECONDS)
         self.plan.append(depotStop)
         self.actualEnd = self.end
@@ -97,20 +126,95 @@ class Vehicle:
     def changeTarget(self, link):
         """ change current route to aim for a new target
         (Stop)"""
-        traci.vehicle.changeTarget(self.name, link)
+        commandBuffer.changeTarget(self.name, link)
         self.nextUpdate = link
 
     def addStop(self, link, pos):
         """ add a stop, dwell time currently 5s
         (string, float) """
-        traci.vehicle.setStop(self.name, link, pos, 0, DWELLTIME)
+        commandBuffer.setStop(self.name, link, pos, 0, DWELLTIME)
+
+    def sendTarget(self, link):
+        """ change current route to aim for link, unless it is already the
+        target
+        (string)"""
+        if link == self.sentTarget:
+            self.suppressedCommands += 1
+            return
+        commandBuffer.changeTarget(self.name, link)
+        self.sentTarget = link
+        self.sentCommands += 1
+
+    def sendStop(self, stop):
+        """ set a stop at the next stop in the plan, unless already set
+        (Stop)"""
+        if (stop.link, stop.pos) == self.sentStop:
+            self.suppressedCommands += 1
+            return
+        commandBuffer.setStop(self.name, stop.link, stop.pos, 0, DWELLTIME)
+        self.sentStop = (stop.link, stop.pos)
+        self.sentCommands += 1
+
+    def sendParking(self, duration):
+        """ set (duration > 0) or lift (duration 0) the parking stop; only
+        called when the parking state flips
+        (int)"""
+        commandBuffer.setStop(self.name, self.parkedLink, self.parkedPos, 0,
+                              duration)
+        self.sentCommands += 1
 
     def stop(self, step):
         """ stop vehicle once it leaves simulation
         i.e., no longer available """
-        self.operatingStatus = VehicleState.vsStopped
+        self.operatingState = VehicleState.vsStopped
         self.actualEnd =  step
 
+    def getNextEventStep(self, step):
+        """ return the earliest step at which update may have something to
+        do: reaching the next stop (within STOP_OFFSET), leaving a parking
+        position, or leaving the simulation; None if nothing is expected
+        (int) -> int"""
+        if self.operatingState == VehicleState.vsNotStarted:
+            return self.end # parked at the start until the end
+        if self.operatingState != VehicleState.vsRunning:
+            # going home, or stopped once it has left the simulation
+            if self.operatingState == VehicleState.vsStopped:
+                return None
+            return step + 1
+        if self.currentStatus == VehicleStatus.PARKED:
+            if not self.isAtParking():
+                # goHomeTime is recomputed from the position of every step
+                # until the vehicle stands at its parking position
+                return step + 1
+            # it may drive on once the parking stop, which lasts until the
+            # goHomeTime of where it parked, ends
+            return max(step + 1, int(math.ceil(min(self.goHomeTime,
+                                                   self.parkedUntil))))
+        nextStop = self.getNextStop()
+        if nextStop == None or nextStop.stopType == StopType.DEPOT:
+            return step + 1
+        # a lower bound on the distance, without routing queries: a stop on
+        # another link is only reached after the rest of the current one,
+        # and through no route shorter than the straight line
+        if nextStop.link == self.currentLink:
+            distance = nextStop.pos - self.currentPos
+        else:
+            distance = max(network.getEdgeLength(self.currentLink) -
+                           self.currentPos + nextStop.pos,
+                           network.getStraightDistance(self.currentLink,
+                                                       self.currentPos,
+                                                       nextStop.link,
+                                                       nextStop.pos))
+        return step + max(1, int((distance - STOP_OFFSET) /
+                                 (network.getMaxSpeed() * SPEED_MARGIN)))
+
+
+    def isAtParking(self):
+        """ return whether the vehicle stood still at its parking position
+        since the previous update
+        () -> bool"""
+        return self.stationary and self.currentLink == self.parkedLink and \
+               abs(self.currentPos - self.parkedPos) <= PARK_TOLERANCE
 
     def addPerson(self, person, puPosition, doPosition, penalty):
         """ add a person to a vehicle's plan, insert stops at specified places
@@ -129,37 +233,30 @@ class Vehicle:
                                           StopType.PICKUP, request))
         self.plan.insert(doPosition, Stop(personID, link2, pos2,
                                           StopType.DROPOFF))
-        print "Person " + str(personID) + " now waiting at " + link1 + "," + \
-              str(pos1) + " going to " + link2 + "," + str(pos2) + \
-              " waiting for " + self.name
-
-        print self.name, "plan:"
-        for i in range(0, len(self.plan)):
-            self.plan[i].printLn()
+        self.invalidateSchedule()
+        if eventLog.isEnabled("vehicle", INFO):
+            eventLog.write("vehicle", INFO, "allocated", person=personID,
+                           vehicle=self.name, origin=[link1, pos1],
+                           destination=[link2, pos2])
+        if eventLog.isEnabled("vehicle", DEBUG):
+            eventLog.write("vehicle", DEBUG, "plan", vehicle=self.name,
+                           plan=[s.getFields() for s in self.plan])
 
         # set person to allocated
         person.allocated()
 
         # reroute vehicle as plan is updated
-        self.currentLink = network.getVehicleCurrentEdge(self.name)
-        self.currentPos = network.getVehicleCurrentPosition(self.name)
         if self.currentStatus == VehicleStatus.PARKED:
             self.currentStatus = VehicleStatus.BOOKED
-            if self.operatingState != VehicleState.vsRunning:
-                # raise from parking position at depot
-                print self.parkedLink, self.parkedPos
-                traci.vehicle.setStop(self.name, self.parkedLink,
-                                      self.parkedPos, 0, 0)
-            else:
-                # raise from parking position
-                traci.vehicle.setStop(self.name, self.parkedLink,
-                                      self.parkedPos, 0, 0) 
+            # raise from parking position, at the depot or not
+            self.sendParking(0)
+        # only sent if the next stop has changed
         myNextStop = self.plan[0]
-        traci.vehicle.changeTarget(self.name, myNextStop.link)
-        traci.vehicle.setStop(self.name, myNextStop.link, myNextStop.pos, 0,
-                              DWELLTIME)
-        print self.name, " heading for ", myNextStop.personID, " at", \
-              myNextStop.link, myNextStop.pos
+        self.sendTarget(myNextStop.link)
+        self.sendStop(myNextStop)
+        if eventLog.isEnabled("vehicle", DEBUG):
+            eventLog.write("vehicle", DEBUG, "heading", vehicle=self.name,
+                           stop=myNextStop.getFields())
 
         self.operatingState = VehicleState.vsRunning
 
@@ -168,13 +265,19 @@ class Vehicle:
         """ return current position """
 
         if self.currentStatus != VehicleStatus.PARKED:
-            currentLink = network.getVehicleCurrentEdge(self.name)
-            currentPos = network.getVehicleCurrentPosition(self.name)
+            # as subscribed for this step
+            currentLink = self.currentLink
+            currentPos = self.currentPos
         else:
             currentLink = self.lastLink
             currentPos = self.lastPos
 
-        currentStop = Stop(-1, currentLink, currentPos, StopType.CURRENT)
+        currentStop = self.currentStop
+        if currentStop == None or currentStop.link != currentLink or \
+           currentStop.pos != currentPos:
+            # reused while the vehicle stays put
+            currentStop = Stop(-1, currentLink, currentPos, StopType.CURRENT)
+            self.currentStop = currentStop
         return currentStop # Stop
         
 
@@ -182,35 +285,18 @@ class Vehicle:
         """ calculate penalty for tentative passenger by iterating through
         possibilities
         (int, int, int)"""
-        currentPlan = list(self.plan)
         offset = 1
-        # insert current position at start
-        currentPlan.insert(0,self.getCurrentPos()) 
-        
-        bestPickupPosition = None
-        bestDropoffPosition = None
-        minPenalty = INFPENALTY
+        # current position at start
+        schedule = self.getSchedule(step)
 
-        penalty = 0
+        if eventLog.isEnabled("vehicle", DEBUG):
+            eventLog.write("vehicle", DEBUG, "tentative", vehicle=self.name,
+                           plan=[s.getFields() for s in schedule.plan])
 
-        for c in currentPlan:
-            print self.name, c.link, c.pos, c.stopType
-
-        # need (len(currentPlan) + 1) so stop could be added at end,
-        # removed as DEPOT now at end
-        # start with pickup stop
-        for puIteration in range(offset, len(currentPlan)):
-            currentPlan.insert(puIteration, puLink)
-            # dropoff stop can be any position after the pickup
-            for doIteration in range(puIteration + 1, len(currentPlan)):
-                currentPlan.insert(doIteration, doLink)
-                penalty = self.calcItineraryPenalty(currentPlan, step)
-                if penalty < minPenalty:
-                    bestPickupPosition = puIteration
-                    bestDropoffPosition = doIteration
-                    minPenalty = penalty  
-                currentPlan.pop(doIteration)
-            currentPlan.pop(puIteration)
+        # pickup can be inserted before any stop but the current position,
+        # dropoff at any position after the pickup; DEPOT stays at end
+        (bestPickupPosition, bestDropoffPosition, minPenalty) = \
+            schedule.bestInsertion(puLink, doLink)
 
         if minPenalty < INFPENALTY:
             # -offset due to adding the current position 
@@ -218,18 +304,47 @@ class Vehicle:
         else:
             return (None, None, INFPENALTY)
 
+    def getSchedule(self, step):
+        """ return schedule of the current plan, starting at the current
+        position; the plan is copied behind the current position once per
+        schedule, the tentative plans are then walked over that copy, and
+        the vectorized evaluator reads the arrays packed on the vehicle
+        (int) -> Schedule"""
+        currentPlan = [self.getCurrentPos()] + self.plan
+        return Schedule(currentPlan, step, self.countPassengers,
+                        self.capacity, self.end)
+
+    def invalidateSchedule(self):
+        """ drop the cached schedule and packed plan once the plan changes """
+        self.schedule = None
+        self.packed = None
+
+    def getCachedSchedule(self, step):
+        """ return the cached schedule if it still holds at this step, None
+        if it has to be rebuilt or the vehicle is servicing an action
+        (int) -> Schedule"""
+        if self.nextUpdate != None:
+            return None
+        # no longer holds if running late for the next stop; checked here
+        # as the vehicle may not have been updated every step
+        nextStop = self.getNextStop()
+        if self.schedule != None and nextStop != None and \
+           nextStop.stopType != StopType.DEPOT and \
+           step > self.schedule.arrival[1] + SCHEDULE_DEVIATION:
+            self.schedule = None # the plan, and its packing, still hold
+        return self.schedule
+
     def calcCurrentItineraryPenalty(self, step):
-        """ calculate penalty for tentative passenger by iterating through
-        possibilities
-        (int, int, int)"""
-        currentPlan = list(self.plan)
-        offset = 1
-        # if already servicing an action, add that back in
-        if self.nextUpdate != None: 
-            currentPlan.insert(0, self.nextUpdate)
-            offset += 1
-        # insert current position at start
-        currentPlan.insert(0,self.getCurrentPos()) 
+        """ calculate penalty for the current plan; taken from the cached
+        schedule, which holds while the vehicle keeps to it
+        (int) -> float"""
+        if self.nextUpdate == None:
+            if self.getCachedSchedule(step) == None:
+                self.schedule = self.getSchedule(step)
+            return self.schedule.getPenalty()
+        # already servicing an action, so add that back in after the
+        # current position
+        currentPlan = [self.getCurrentPos(), self.nextUpdate] + self.plan
         return self.calcItineraryPenalty(currentPlan, step)                
 
     def calcItineraryPenalty(self, plan, step):
@@ -237,7 +352,6 @@ class Vehicle:
         (Stop[], int)"""
         penalty = 0
         nPassengers = self.countPassengers
-        currentPassengers = list(self.currentPassengers)
         runningTime = step
 
         for i in range(0, len(plan)-1):
@@ -254,12 +368,10 @@ class Vehicle:
             # if pickup, update passengers
             if d.stopType == StopType.PICKUP:
                 nPassengers += 1
-                currentPassengers.append(d.personID)
             # if dropoff, determine penalty to that passenger given dropoff
             # time
             elif d.stopType == StopType.DROPOFF:
                 nPassengers -= 1
-                currentPassengers.remove(d.personID)
                 penalty += peopleCollection.estimatePenalty(d.personID,
                                                             runningTime)
             # if over capacity, return infinity
@@ -276,8 +388,8 @@ class Vehicle:
     def newRouteStop(self, stop):
         """ reroute vehicle 
         (Stop)"""
-        traci.vehicle.changeTarget(self.name, stop.link)
-        traci.vehicle.setStop(self.name, stop.link, stop.pos, 0, DWELLTIME)
+        self.sendTarget(stop.link)
+        self.sendStop(stop)
         self.nextUpdate = stop
         self.currentStatus = VehicleStatus.BOOKED
 
@@ -287,22 +399,60 @@ class Vehicle:
         (bool) -> Stop"""
         if delete:
             self.plan.pop(0)
+            self.invalidateSchedule()
+            self.sentStop = None # served, so a stop here must be sent again
         if len(self.plan) > 0:
             return self.plan[0]
         else:
             return None
 
-    def update(self, step):
-        """ update plan at a time step 
-        (int)"""
+    def chargeDistance(self, distMoved):
+        """ add distance moved to the vehicle, its passengers and its
+        shared/deadheading totals
+        (float)"""
+        self.totalDistance += distMoved
+        # update passengers
+        for p in self.currentPassengers:
+            peopleCollection.incrementPersonDistance(p, distMoved)
+        # update shared/deadheading
+        if self.countPassengers >= 2:
+            self.shared += distMoved
+        if self.countPassengers == 0:
+            self.deadheading += distMoved
+
+    def isDrivingToPark(self, currentLink, currentPos):
+        """ return whether the vehicle is parked but has moved since the
+        last step, i.e. is still driving to its parking position; its
+        position while parked is the one of its last update, so it must
+        be updated every step until it stops
+        (string, float) -> bool"""
+        return self.currentStatus == VehicleStatus.PARKED and \
+               (currentLink, currentPos) != (self.currentLink, self.currentPos)
+
+    def setPosition(self, currentLink, currentPos):
+        """ record the current position without updating the plan; the
+        distance since the last update is charged at the next update
+        (string, float)"""
+        self.currentLink = currentLink
+        self.currentPos = currentPos
+
+    def update(self, step, currentLink, currentPos, odometer=None):
+        """ update plan at a time step, given the current position and, if
+        subscribed, the distance driven from the vehicle's subscription
+        (int, string, float, float)"""
         global peopleCollection
 
         # determine current position
-        self.currentLink = network.getVehicleCurrentEdge(self.name)
-        self.currentPos = network.getVehicleCurrentPosition(self.name)
+        self.currentLink = currentLink
+        self.currentPos = currentPos
 
         # distance travelled
-        if self.lastLink != None: # has started moving
+        if odometer != None:
+            # charge the distance driven since the last update
+            if self.lastOdometer != None and odometer > self.lastOdometer:
+                self.chargeDistance(odometer - self.lastOdometer)
+            self.lastOdometer = odometer
+        elif self.lastLink != None: # has started moving
             # if has moved since last update, ignore if vehicle parked
             if not(self.lastLink == self.currentLink and \
                    self.lastPos == self.currentPos) or \
@@ -311,15 +461,7 @@ class Vehicle:
                                                     self.currentLink,
                                                     self.currentPos)
                 if distMoved < LARGEDIST: # ignore large numbers
-                    self.totalDistance += distMoved
-                    # update passengers
-                    for p in self.currentPassengers:
-                        peopleCollection.incrementPersonDistance(p, distMoved)
-                    # update shared/deadheading
-                    if self.countPassengers >= 2:
-                        self.shared += distMoved
-                    if self.countPassengers == 0:
-                        self.deadheading += distMoved
+                    self.chargeDistance(distMoved)
                         
         nextUpdate = self.getNextStop()
         # if at target and not depot; "at target" considered to be within
@@ -328,16 +470,22 @@ class Vehicle:
         while nextUpdate != None and nextUpdate.stopType != StopType.DEPOT and \
             nextUpdate.link == self.currentLink and \
             nextUpdate.pos - self.currentPos < STOP_OFFSET:
-            print step, self.name, nextUpdate.link, nextUpdate.pos, \
-                  nextUpdate.stopType, self.currentLink, self.currentPos, \
-                  nextUpdate.serviceTime
+            if eventLog.isEnabled("vehicle", DEBUG):
+                eventLog.write("vehicle", DEBUG, "reached", step=step,
+                               vehicle=self.name,
+                               stop=nextUpdate.getFields(),
+                               position=[self.currentLink, self.currentPos])
             # if target is a pickup
             if nextUpdate.stopType == StopType.PICKUP:
                 peopleCollection.updatePersonPickup(nextUpdate.personID, step)
                 self.countPassengers += 1
                 self.currentStatus = VehicleStatus.BOOKED
-                self.currentPassengers.append(nextUpdate.personID)
-                print self.name, self.countPassengers, " on board"
+                self.currentPassengers.add(nextUpdate.personID)
+                if eventLog.isEnabled("vehicle", INFO):
+                    eventLog.write("vehicle", INFO, "pickup", step=step,
+                                   vehicle=self.name,
+                                   person=nextUpdate.personID,
+                                   onBoard=self.countPassengers)
                 nextUpdate = self.getNextStop(True)
             # else if target is a dropoff
             elif nextUpdate.stopType == StopType.DROPOFF:
@@ -347,9 +495,12 @@ class Vehicle:
                 self.currentPassengers.remove(nextUpdate.personID)
                 self.occupancyTime += \
                     peopleCollection.getTravelTime(nextUpdate.personID)
-                print self.name, self.countPassengers, " on board"
+                if eventLog.isEnabled("vehicle", INFO):
+                    eventLog.write("vehicle", INFO, "dropoff", step=step,
+                                   vehicle=self.name,
+                                   person=nextUpdate.personID,
+                                   onBoard=self.countPassengers)
                 nextUpdate = self.getNextStop(True)
-            
 
         # update route
         if nextUpdate != None:
@@ -360,40 +511,44 @@ class Vehicle:
                     currentStop = self.getCurrentPos()
                     goHomeTime = self.end - network.getTime(currentStop,
                                                             nextUpdate)
+                    self.goHomeTime = goHomeTime
                     if step < goHomeTime: # not time to go home yet
                         if self.currentStatus != VehicleStatus.PARKED:
                             self.currentStatus = VehicleStatus.PARKED
-                            print self.name, "waiting", goHomeTime
+                            if eventLog.isEnabled("vehicle", INFO):
+                                eventLog.write("vehicle", INFO, "parked",
+                                               step=step, vehicle=self.name,
+                                               until=goHomeTime)
                             self.parkedLink = self.currentLink
                             self.parkedPos = self.currentPos + PARK_OFFSET
+                            self.parkedUntil = goHomeTime
                             # !! was 60+5*self.i
                             # if many vehicles and few set stops, then parking
                             # somewhere else reduces delay to other vehicles
-                            traci.vehicle.setStop(self.name, self.parkedLink,
-                                                  self.parkedPos, 0,
-                                                  (goHomeTime - step)*MILLISECONDS)
+                            self.sendParking((goHomeTime - step)*MILLISECONDS)
                     else:
                         # raise from parking position and go home
-                        traci.vehicle.setStop(self.name, self.parkedLink,
-                                              self.parkedPos, 0, 0) 
+                        self.sendParking(0)
                         self.operatingState = VehicleState.vsGoingHome
-                        traci.vehicle.changeTarget(self.name, nextUpdate.link)
+                        self.sendTarget(nextUpdate.link)
                         self.currentStatus = VehicleStatus.BOOKED
-                        print self.name, "moving to depot"
+                        if eventLog.isEnabled("vehicle", INFO):
+                            eventLog.write("vehicle", INFO, "goingHome",
+                                           step=step, vehicle=self.name)
                 #elif self.operatingState == VehicleState.vsNotStarted:
                     # waiting at start
-            else: # update route for next pickup/dropoff
-                traci.vehicle.changeTarget(self.name, nextUpdate.link)
-                traci.vehicle.setStop(self.name, nextUpdate.link,
-                                      nextUpdate.pos, 0, DWELLTIME)
+            else: # update route for next pickup/dropoff, if changed
+                self.sendTarget(nextUpdate.link)
+                self.sendStop(nextUpdate)
                 if self.currentStatus == VehicleStatus.PARKED:
                     # raise from parking position if parked
-                    traci.vehicle.setStop(self.name, self.parkedLink,
-                                          self.parkedPos, 0, 0) 
+                    self.sendParking(0)
                 self.currentStatus = VehicleStatus.BOOKED
             
 
         # store last known link
+        self.stationary = self.lastLink == self.currentLink and \
+                          self.lastPos == self.currentPos
         self.lastLink = self.currentLink
         self.lastPos = self.currentPos
 
@@ -414,12 +569,15 @@ class Vehicle:
         """ print details of vehicle """
         # check that distance travelled with 0 and 2+ passengers is less
         # than total distance travelled
-        assert self.totalDistance >= self.deadheading + self.shared
+        assert self.totalDistance >= self.deadheading + self.shared - \
+               DISTANCE_TOLERANCE
+        # a vehicle that never left the depot has no distance
+        distance = max(float(self.totalDistance), 1e-9)
         return [self.name, self.totalPassengers, self.totalDistance,
                 self.occupancyTime / float(self.actualEnd),
-                self.totalPassengers/float(self.totalDistance)*M2KM,
-                self.shared / float(self.totalDistance),
-                self.deadheading / float(self.totalDistance),
+                self.totalPassengers/distance*M2KM,
+                self.shared / distance,
+                self.deadheading / distance,
                 self.shared, self.deadheading]
         
 
@@ -25,26 +25,112 @@ sys.path.append(os.path.join(SUMO_HOME, "tools"))
 import traci
 import traci.constants as tc
 from stop import Stop, StopType
-from vehicle import VehicleState
+from vehicle import Vehicle, VehicleState
+from schedule import INFPENALTY
+from network import network
+from updateScheduler import UpdateScheduler
+from eventLog import EventLog, eventLog, DEBUG
 import csv
 
+BOUND_SLACK = 1 # second per leg, allows for truncating travel times
+VEHICLE_COLUMNS = ["vehicleID","totalPassengers","totalDistance",
+                   "avOccupancy","trips/VKT","sharedProp","deadheadProp",
+                   "shared","deadhead"]
+
 class VehicleCollection:
     """ collection of vehicles """
     fleet = {}
 
     def __init__(self):
         self.fleet = {}
+        self.evaluator = None # FleetEvaluator, None to evaluate serially
+        self.pruned = 0 # vehicles skipped as they cannot beat the best
+        self.unreachable = 0 # vehicles that cannot serve before their end
+        self.scheduler = UpdateScheduler()
+        self.selective = False # True updates only vehicles due for an event
+        self.prune = False # skip vehicles by a lower bound on the penalty
+        self.outputFile = None # streamed output, see openOutput
+        self.writer = None
+        self.table = None # ResultTable written instead of CSV, if any
+        self.summaryTable = None # and of the summary
+        self.resetSummary()
+
+    def reset(self):
+        """ remove all vehicles and statistics, before another run """
+        self.fleet = {}
+        self.evaluator = None
+        self.pruned = 0
+        self.unreachable = 0
+        self.scheduler = UpdateScheduler()
+        Vehicle.num = 0
+        self.closeOutput()
+        self.resetSummary()
+        self.table = None
+        self.summaryTable = None
+
+    def resetSummary(self):
+        """ clear the running totals of the vehicles written """
+        self.summary = {"passengers" :0, "distance": 0.0, "tripsVKT": 0.0}
+        self.written = set() # vehicles written
+
+    def openOutput(self, folder="./", code="0", flushInterval=300):
+        """ write vehicles to *-vehicle.out.csv once they have left the
+        simulation, rather than all at the end of the run
+        (string, string, int)"""
+        self.closeOutput()
+        self.writer = self.openWriter(folder, code)
+        self.flushInterval = flushInterval
+        self.lastFlush = 0
+
+    def openWriter(self, folder, code):
+        """ return the table if set, otherwise a CSV writer of
+        *-vehicle.out.csv with its header written
+        (string, string) -> csv.writer"""
+        if self.table != None:
+            return self.table
+        self.outputFile = open(folder + code + '-vehicle.out.csv', 'wb')
+        writer = csv.writer(self.outputFile, delimiter=',')
+        writer.writerow(VEHICLE_COLUMNS)
+        return writer
+
+    def closeOutput(self):
+        """ close the output, if any """
+        if self.outputFile != None:
+            self.outputFile.close()
+            self.outputFile = None
+        self.writer = None
+
+    def flushOutput(self, step):
+        """ flush the streamed output once per flush interval
+        (int)"""
+        if self.outputFile != None and \
+           step - self.lastFlush >= self.flushInterval:
+            self.outputFile.flush()
+            self.lastFlush = step
+
+    def writeVehicle(self, vehicle):
+        """ write a vehicle and add it to the running totals
+        (Vehicle)"""
+        vehOutput = vehicle.getOutput()
+        self.writer.writerow(vehOutput)
+        self.summary["passengers"] += vehOutput[1]
+        self.summary["distance"] += vehOutput[2]
+        self.written.add(vehicle.name)
 
     def addVehicle(self, vehicle):
         """ add a vehicle to the collection 
         (Vehicle)"""
         self.fleet[vehicle.name] = vehicle
+        self.scheduler.wake(vehicle.name, 0)
 
     def stopVehicle(self, vehicleID, step):
         """ list a vehicle as stopped once it has left the simulation
         (string, int)"""
         if vehicleID in self.fleet:
             self.fleet[vehicleID].stop(step)
+            self.scheduler.remove(vehicleID)
+            if self.writer != None:
+                self.writeVehicle(self.fleet[vehicleID])
 
     def getValues(self):
         """ return a list of vehicles
@@ -56,6 +142,42 @@ class VehicleCollection:
         (string) -> Vehicle """
         return self.fleet[vehicleID]
 
+    def update(self, step, moveNodes):
+        """ update the vehicles due at a step, given (vehicleID, link, pos,
+        odometer) of every vehicle; the others only record their position
+        (int, (string, string, float, float)[])"""
+        if not self.selective:
+            for vehicleID, edge, pos, odometer in moveNodes:
+                self.fleet[vehicleID].update(step, edge, pos, odometer)
+            return
+        due = set(self.scheduler.popDue(step))
+        for vehicleID, edge, pos, odometer in moveNodes:
+            vehicle = self.fleet[vehicleID]
+            if vehicleID in due or vehicle.isDrivingToPark(edge, pos):
+                due.discard(vehicleID)
+                vehicle.update(step, edge, pos, odometer)
+                self.scheduler.schedule(vehicleID,
+                                        vehicle.getNextEventStep(step))
+                self.scheduler.updated += 1
+            else:
+                vehicle.setPosition(edge, pos)
+                self.scheduler.skipped += 1
+        # due, but not reported this step
+        for vehicleID in due:
+            self.scheduler.wake(vehicleID, step + 1)
+
+    def getNextEventStep(self, step):
+        """ return the earliest step at which any vehicle needs updating,
+        None if none expects anything
+        (int) -> int"""
+        if self.selective:
+            return self.scheduler.nextStep()
+        events = [v.getNextEventStep(step) for v in self.fleet.values()]
+        events = [e for e in events if e != None]
+        if len(events) == 0:
+            return None
+        return min(events)
+
     def removeVehicles(self, step):
         for v in self.fleet:
             if self.fleet[v].parked == 900 or self.fleet[v].end == step:
@@ -64,33 +186,74 @@ class VehicleCollection:
 
     def output(self, folder="./", code="0"):
         """ print details of all vehicles, to vehicle.out.csv in an
-        optionally-specified folder """
-        summary = {"passengers" :0, "distance": 0.0, "tripsVKT": 0.0}
-        with open(folder + code + '-vehicle.out.csv', 'wb') as csvfile:
-            vehicleWriter = csv.writer(csvfile, delimiter=',')
-            vehicleWriter.writerow(["vehicleID","totalPassengers",
-                                    "totalDistance","avOccupancy",
-                                    "trips/VKT","sharedProp","deadheadProp",
-                                    "shared","deadhead"])
-            for vehicle in self.fleet.values():
-                vehOutput = vehicle.getOutput()
-                vehicleWriter.writerow(vehOutput)
-                summary["passengers"] += vehOutput[1]
-                summary["distance"] += vehOutput[2]
-                
+        optionally-specified folder, and the summary from the running
+        totals, or to the tables if set; if output is streamed, the
+        vehicles not yet written are added to it """
+        if self.writer == None:
+            self.resetSummary()
+            self.writer = self.openWriter(folder, code)
+        for vehicle in self.fleet.values():
+            if vehicle.name not in self.written:
+                self.writeVehicle(vehicle)
+        self.closeOutput()
 
+        summary = self.summary
+        output = []
+        output.append(len(self.fleet.values()))
+        output.append(summary["passengers"])
+        output.append(summary["distance"])
+        output.append(summary["passengers"]/summary["distance"]*1000)
+        if self.summaryTable != None:
+            self.summaryTable.writerow(output)
+            return
         with open(folder + code + '-vehicle-summary.out.csv', 'wb') as csvfile:
             vehicleWriter = csv.writer(csvfile, delimiter=',')
             vehicleWriter.writerow(["numVehicles","passengersCarried",
                                     "totalDistance", "trips/VKT"])
-            output = []
-            output.append(len(self.fleet.values()))
-            output.append(summary["passengers"])
-            output.append(summary["distance"])
-            output.append(summary["passengers"]/summary["distance"]*1000)
             vehicleWriter.writerow(output)
                 
 
+    def printCommandStats(self):
+        """ print how many route commands were sent and suppressed """
+        sent = sum(v.sentCommands for v in self.fleet.values())
+        suppressed = sum(v.suppressedCommands for v in self.fleet.values())
+        print "Route commands: %d sent, %d suppressed" % (sent, suppressed)
+
+    def printPruningStats(self):
+        """ print how many vehicles were not evaluated during dispatch """
+        print "Dispatch: %d vehicles pruned, %d unreachable" % \
+              (self.pruned, self.unreachable)
+
+    def getBound(self, veh, person, puLink, step):
+        """ return a lower bound on the incremental penalty of adding a
+        person to a vehicle, None if it cannot drop them off before its
+        end, without routing queries or building a schedule. The passenger
+        cannot be dropped off before the vehicle covers the straight line
+        to the pickup and then drives directly to the dropoff, less
+        BOUND_SLACK per leg of the tentative plan, as each leg is truncated.
+        The other stops can only be delayed from the schedule cached on the
+        vehicle, or be reached as much earlier as its next stop is
+        (Vehicle, Person, Stop, int) -> float"""
+        schedule = veh.getCachedSchedule(step)
+        if schedule == None or schedule.getPenalty() >= INFPENALTY:
+            # evaluated, which caches the schedule for the next request;
+            # an infeasible plan may be bridged by the new stops
+            return float("-inf")
+        current = veh.getCurrentPos()
+        toPickup = network.getStraightTime(current.link, current.pos,
+                                           puLink.link, puLink.pos)
+        earliest = step + toPickup + person.directTime - \
+                   BOUND_SLACK * (schedule.n + 1)
+        if earliest > veh.end:
+            return None
+        bound = person.estimatePenalty(earliest)
+        if schedule.n > 1 and schedule.arrival[1] > step:
+            # each stop is at most as much earlier as the next one
+            rate = schedule.rate[1] + \
+                   schedule.penaltyRate(schedule.plan[schedule.n-1])
+            bound -= (schedule.arrival[1] - step) * rate
+        return bound
+
     def addBookingToOptimumItinerary(self, person, step):
         """ determine best vehicle for person and add them to it
         (Person, int)"""
@@ -115,28 +278,65 @@ class VehicleCollection:
         puLink = Stop(personID, link1, pos1, StopType.PICKUP)
         doLink = Stop(personID, link2, pos2, StopType.DROPOFF)
 
-        # iterate over all vehicles
+        candidates = []
+        index = 0
         for veh in self.fleet.values():
             if veh.getState() <= VehicleState.vsRunning: # only if not stopped
-                (puPosition, doPosition, penalty) = \
-                    veh.calcTentativeItineraryPenalty(puLink, doLink, step)
-                print veh.name, penalty, penalty - \
-                      veh.calcCurrentItineraryPenalty(step)
-                if penalty < 900000:
-                    incrPenalty = penalty - \
-                                  veh.calcCurrentItineraryPenalty(step)
-                    # update if best incremental penalty
-                    if incrPenalty < bestIncrPenalty:
-                        bestVehicle = veh
-                        bestIncrPenalty = incrPenalty
-                        bestVehiclePenalty = penalty
-                        bestDropoffPosition = doPosition
-                        bestPickupPosition = puPosition
+                bound = None
+                if self.prune:
+                    bound = self.getBound(veh, person, puLink, step)
+                if self.prune and bound == None:
+                    self.unreachable += 1
+                else:
+                    candidates.append((bound, index, veh))
+                index += 1
+
+        if self.evaluator != None:
+            # evaluated together, so only unreachable vehicles are skipped
+            tentative = self.evaluator.evaluate([c[2] for c in candidates],
+                                                puLink, doLink, step)
+        else:
+            # evaluated one by one, in bound order if pruning, until no
+            # vehicle left can beat the best found so far
+            if self.prune:
+                candidates.sort()
+            tentative = [None] * len(candidates)
+
+        bestIndex = None
+        for c in range(0, len(candidates)):
+            (bound, index, veh) = candidates[c]
+            if tentative[c] == None:
+                if bound != None and bound > bestIncrPenalty:
+                    self.pruned += len(candidates) - c
+                    break
+                tentative[c] = veh.calcTentativeItineraryPenalty(puLink,
+                                                                 doLink, step)
+            (puPosition, doPosition, penalty) = tentative[c]
+            currentPenalty = veh.calcCurrentItineraryPenalty(step)
+            if eventLog.isEnabled("dispatch", DEBUG):
+                eventLog.write("dispatch", DEBUG, "evaluated", step=step,
+                               person=personID, vehicle=veh.name,
+                               penalty=penalty,
+                               increase=penalty - currentPenalty)
+            if penalty < 900000:
+                incrPenalty = penalty - currentPenalty
+                # update if best incremental penalty, ties go to the vehicle
+                # first in the fleet as without pruning
+                if incrPenalty < bestIncrPenalty or \
+                   (incrPenalty == bestIncrPenalty and index < bestIndex):
+                    bestVehicle = veh
+                    bestIndex = index
+                    bestIncrPenalty = incrPenalty
+                    bestVehiclePenalty = penalty
+                    bestDropoffPosition = doPosition
+                    bestPickupPosition = puPosition
 
         # add person to best vehicle
         if bestVehicle != None:
             bestVehicle.addPerson(person, bestPickupPosition,
                                   bestDropoffPosition, bestVehiclePenalty)
+            # plan changed, so its next event may be sooner
+            self.scheduler.wake(bestVehicle.name, step + 1)
             return 0
         else:
             return -1